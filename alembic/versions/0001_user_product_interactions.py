@@ -0,0 +1,75 @@
+"""Histórico em user_product_interactions em vez da posse de produtos
+
+Cria a tabela de interações com o índice (user_id, created_at), indexa
+products.user_id e copia a posse atual (products.user_id) como interações
+"purchase". Parte do esquema criado por `create_tables()` (users, products,
+recommendations) e pode rodar sobre um banco em que a aplicação já criou a
+tabela nova: cada passo verifica o que já existe.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "user_product_interactions"
+USER_CREATED_AT_INDEX = "ix_user_product_interactions_user_id_created_at"
+PRODUCT_INDEX = "ix_user_product_interactions_product_id"
+PRODUCTS_USER_INDEX = "ix_products_user_id"
+
+
+def _index_names(inspector, table: str) -> set:
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table(TABLE):
+        op.create_table(
+            TABLE,
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id"), nullable=False),
+            sa.Column("event_type", sa.String(), nullable=False, server_default="purchase"),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        )
+        inspector = sa.inspect(op.get_bind())
+
+    indexes = _index_names(inspector, TABLE)
+    if USER_CREATED_AT_INDEX not in indexes:
+        op.create_index(USER_CREATED_AT_INDEX, TABLE, ["user_id", "created_at"])
+    if PRODUCT_INDEX not in indexes:
+        op.create_index(PRODUCT_INDEX, TABLE, ["product_id"])
+    if PRODUCTS_USER_INDEX not in _index_names(inspector, "products"):
+        op.create_index(PRODUCTS_USER_INDEX, "products", ["user_id"])
+
+    # Uma interação por produto com dono que ainda não tenha a sua; a ordem dos IDs
+    # preserva a ordem cronológica usada até aqui (produtos mais novos = IDs maiores).
+    op.execute(
+        f"""
+        INSERT INTO {TABLE} (user_id, product_id, event_type, created_at)
+        SELECT p.user_id, p.id, 'purchase', CURRENT_TIMESTAMP
+        FROM products p
+        WHERE p.user_id IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM {TABLE} i WHERE i.product_id = p.id AND i.user_id = p.user_id
+          )
+        ORDER BY p.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(PRODUCTS_USER_INDEX, table_name="products")
+    op.drop_index(PRODUCT_INDEX, table_name=TABLE)
+    op.drop_index(USER_CREATED_AT_INDEX, table_name=TABLE)
+    op.drop_table(TABLE)
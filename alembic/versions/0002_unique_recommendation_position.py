@@ -0,0 +1,45 @@
+"""Uma recomendação gravada por (usuário, posição)
+
+Remove as linhas duplicadas deixadas por gravações concorrentes (mantém a mais
+nova de cada posição) e cria a restrição única em recommendations(user_id,
+position). Cada passo verifica o que já existe.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "recommendations"
+CONSTRAINT = "uq_recommendations_user_id_position"
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(TABLE):
+        return
+    if CONSTRAINT in {c["name"] for c in inspector.get_unique_constraints(TABLE)}:
+        return
+
+    op.execute(
+        f"""
+        DELETE FROM {TABLE}
+        WHERE id NOT IN (SELECT MAX(id) FROM {TABLE} GROUP BY user_id, position)
+        """
+    )
+    # batch_alter_table: o SQLite não aceita ALTER TABLE ... ADD CONSTRAINT.
+    with op.batch_alter_table(TABLE) as batch:
+        batch.create_unique_constraint(CONSTRAINT, ["user_id", "position"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table(TABLE) as batch:
+        batch.drop_constraint(CONSTRAINT, type_="unique")
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.agents.fast_recommender import get_fast_recommender
+from app.agents.history import attach_recent_histories, format_user_products_info, user_history
+from app.agents.recommendation_agent import RecommendationAgent
+from app.agents.retrieval import get_product_index_loader
+from app.core.config import settings
+from app.models import User as UserModel
+from app.schemas import BatchRecommendationResult
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def offline_agent() -> AsyncIterator[RecommendationAgent]:
+    """
+    Agente para os processos fora da API (`batch_recommendations.py`,
+    `refresh_recommendations.py`): carrega o índice de produtos e o recomendador rápido
+    antes da primeira geração, como o lifespan da API, e os mantém atualizados.
+    """
+    index_loader = get_product_index_loader()
+    fast_recommender = get_fast_recommender()
+    if settings.RETRIEVAL_ENABLED:
+        await index_loader.start(wait=True)
+    if settings.FAST_RECOMMENDER_ENABLED:
+        await fast_recommender.start(wait=True)
+    agent = RecommendationAgent()
+    try:
+        yield agent
+    finally:
+        await agent.stop()
+        await fast_recommender.stop()
+        await index_loader.stop()
+
+
+def load_users_with_products(
+    db: Session,
+    user_ids: Optional[Iterable[int]] = None,
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> List[UserModel]:
+    """
+    Carrega os usuários e seus históricos recentes com consultas em conjunto.
+
+    Cada bloco de `chunk_size` usuários custa duas consultas (usuários + as últimas
+    HISTORY_RECENT_LIMIT interações de cada um), independentemente do tamanho do
+    histórico completo.
+    """
+    chunk_size = chunk_size or settings.BATCH_LOAD_CHUNK_SIZE
+    base_query = db.query(UserModel).order_by(UserModel.id)
+    users: List[UserModel] = []
+
+    def load(query) -> List[UserModel]:
+        chunk = query.all()
+        attach_recent_histories(db, chunk)
+        users.extend(chunk)
+        return chunk
+
+    if user_ids is not None:
+        ids = sorted(set(user_ids))
+        for i in range(0, len(ids), chunk_size):
+            load(base_query.filter(UserModel.id.in_(ids[i:i + chunk_size])))
+        return users
+
+    last_id = start_id - 1
+    while True:
+        chunk = load(base_query.filter(UserModel.id > last_id, UserModel.id <= end_id).limit(chunk_size))
+        if len(chunk) < chunk_size:
+            return users
+        last_id = chunk[-1].id
+
+
+async def generate_batch(
+    agent: RecommendationAgent,
+    users: List[UserModel],
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[BatchRecommendationResult]:
+    """
+    Gera as recomendações de vários usuários com concorrência limitada.
+
+    Um pool de `concurrency` workers consome a lista de usuários e os resultados são
+    emitidos na ordem em que terminam. Uma falha de um usuário resulta em
+    recomendações de fallback apenas para ele, sem interromper o lote.
+    """
+    async def generate_one(user: UserModel) -> BatchRecommendationResult:
+        try:
+            result = await agent.generate(user, format_user_products_info(user_history(user)))
+            return BatchRecommendationResult(
+                user_id=user.id,
+                username=user.username,
+                recommendations=result.recommendations,
+                fallback=result.degraded,
+            )
+        except Exception as e:
+            logger.warning(f"Falha no lote para o usuário {user.username}: {str(e)}. Usando fallback.")
+            return BatchRecommendationResult(
+                user_id=user.id,
+                username=user.username,
+                recommendations=agent.fast_recommendations(user),
+                fallback=True,
+                error=str(e) or type(e).__name__,
+            )
+
+    results: asyncio.Queue = asyncio.Queue()
+    pending = iter(users)
+
+    async def worker():
+        for user in pending:
+            await results.put(await generate_one(user))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency or settings.BATCH_CONCURRENCY)]
+    try:
+        for _ in range(len(users)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
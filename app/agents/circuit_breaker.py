@@ -0,0 +1,101 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import LLM_CIRCUIT_STATE, LLM_CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Valor do gauge `llm_circuit_breaker_state` para cada estado.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Disjuntor em volta das chamadas ao LLM.
+
+    Fechado, deixa todas as chamadas passarem; `failure_threshold` falhas seguidas o
+    abrem. Aberto, recusa as chamadas na hora (`allow()` devolve False) durante
+    `reset_timeout` segundos e então passa a meio-aberto, em que uma única chamada de
+    teste passa: se ela der certo o disjuntor fecha, se falhar volta a abrir.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        name: str = "llm",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._clock = clock
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        LLM_CIRCUIT_TRANSITIONS.inc(from_state=self._state, to_state=state)
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Disjuntor '{self.name}': {self._state} -> {state}.")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = self._clock()
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Indica se uma chamada pode ser feita agora (no meio-aberto, reserva a chamada de teste)."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record(self, success: Optional[bool]) -> None:
+        """
+        Registra o resultado de uma chamada autorizada por `allow()`; None indica que ela
+        terminou sem resultado (cancelada ou recusada pela fila) e só libera a chamada de teste.
+        """
+        if success is None:
+            self._trial_in_flight = False
+        elif success:
+            self._consecutive_failures = 0
+            self._transition(CLOSED)
+        else:
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "short_circuited": self.short_circuited,
+        }
+
+
+def build_circuit_breaker() -> Optional[CircuitBreaker]:
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return None
+    breaker = CircuitBreaker(settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD, settings.CIRCUIT_BREAKER_RESET_SECONDS)
+    LLM_CIRCUIT_STATE.set_function(lambda: STATE_VALUES[breaker.state])
+    return breaker
@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.agents.retrieval import HashingEmbedder, product_text, tokenize
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import Product, UserProductInteraction
+from app.schemas import Recommendation
+
+logger = logging.getLogger(__name__)
+
+# Pesos da similaridade item-item combinada e do desempate por popularidade.
+COOCCURRENCE_WEIGHT = 1.0
+CONTENT_WEIGHT = 0.5
+POPULARITY_WEIGHT = 0.05
+
+# Candidatos da similaridade de conteúdo: cada termo aponta para no máximo
+# CONTENT_POSTINGS_LIMIT itens (os mais populares que o contêm), e cada item compara seu
+# embedding só com os CONTENT_CANDIDATES_PER_NEIGHBOR * `neighbors` itens com mais termos
+# em comum. O custo da construção cresce linearmente com o catálogo.
+CONTENT_POSTINGS_LIMIT = 64
+CONTENT_CANDIDATES_PER_NEIGHBOR = 4
+
+POPULARITY_REASON = "Um dos produtos mais populares entre os usuários."
+
+ProductRow = Tuple[int, Optional[str], Optional[str], Optional[int]]
+
+
+def item_key(name: Optional[str]) -> str:
+    """
+    Chave do item no catálogo.
+
+    Cada linha de `products` pertence a um usuário, então o mesmo produto aparece em
+    várias linhas; linhas com o mesmo nome normalizado são tratadas como um só item.
+    """
+    normalized = unicodedata.normalize("NFKD", (name or "").lower()).encode("ascii", "ignore").decode("ascii")
+    return " ".join(normalized.split())
+
+
+class Neighbor(NamedTuple):
+    item: int
+    score: float
+    co_purchased: bool
+
+
+def _cooccurrence_rows(baskets: Sequence[Sequence[int]], n_items: int) -> List[Dict[int, float]]:
+    """
+    Contagem de co-ocorrência item-item (C = XᵀX sem a diagonal), em linhas esparsas.
+
+    Usa `scipy.sparse` quando disponível; caso contrário, conta os pares por usuário.
+    """
+    try:
+        import scipy.sparse as sp
+    except ImportError:
+        sp = None
+
+    if sp is not None:
+        rows = np.repeat(np.arange(len(baskets)), [len(b) for b in baskets])
+        cols = np.fromiter((i for b in baskets for i in b), dtype=np.int64, count=len(rows))
+        x = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(baskets), n_items))
+        c = (x.T @ x).tocsr()
+        c.setdiag(0)
+        c.eliminate_zeros()
+        return [
+            dict(zip(c.indices[c.indptr[i]:c.indptr[i + 1]].tolist(), c.data[c.indptr[i]:c.indptr[i + 1]].tolist()))
+            for i in range(n_items)
+        ]
+
+    counts: List[Dict[int, float]] = [defaultdict(float) for _ in range(n_items)]
+    for basket in baskets:
+        for a in basket:
+            for b in basket:
+                if a != b:
+                    counts[a][b] += 1.0
+    return counts
+
+
+def _content_postings(item_terms: Sequence[Iterable[str]], popularity: np.ndarray, limit: int) -> Dict[str, np.ndarray]:
+    """Índice invertido termo -> itens, limitado aos `limit` itens mais populares de cada termo."""
+    postings: Dict[str, List[int]] = defaultdict(list)
+    for item, terms in enumerate(item_terms):
+        for term in terms:
+            postings[term].append(item)
+    bounded: Dict[str, np.ndarray] = {}
+    for term, items in postings.items():
+        items = np.asarray(items, dtype=np.int64)
+        if len(items) > limit:
+            items = items[np.argsort(-popularity[items], kind="stable")[:limit]]
+        bounded[term] = items
+    return bounded
+
+
+class FastRecommenderModel:
+    """
+    Modelo clássico pré-computado (sem LLM) a partir das tabelas `users`/`products`.
+
+    Para cada item guarda os `neighbors` vizinhos mais similares, combinando
+    co-ocorrência entre usuários (cosseno sobre a matriz usuário x item) e similaridade
+    de conteúdo (embeddings locais de nome e descrição), além do ranking de
+    popularidade. Os vizinhos de cada item são escolhidos entre os itens comprados pelos
+    mesmos usuários e os que compartilham termos com ele (ver CONTENT_POSTINGS_LIMIT),
+    nunca entre todos os pares. Uma recomendação soma as listas de vizinhos do histórico
+    do usuário, então a consulta não depende do tamanho do catálogo.
+    """
+
+    def __init__(self, rows: Iterable[ProductRow], embedder: HashingEmbedder, neighbors: int):
+        started = time.perf_counter()
+        self._index: Dict[str, int] = {}
+        self.product_ids: List[int] = []
+        self.names: List[str] = []
+        descriptions: List[str] = []
+        user_items: Dict[int, set] = defaultdict(set)
+
+        for product_id, name, description, user_id in rows:
+            key = item_key(name)
+            if not key:
+                continue
+            item = self._index.get(key)
+            if item is None:
+                item = self._index[key] = len(self.product_ids)
+                self.product_ids.append(product_id)
+                self.names.append(name)
+                descriptions.append(description or "")
+            elif product_id < self.product_ids[item]:
+                self.product_ids[item] = product_id
+            if user_id is not None:
+                user_items[user_id].add(item)
+
+        n_items = len(self.product_ids)
+        baskets = [sorted(items) for items in user_items.values()]
+        self.popularity = np.zeros(n_items, dtype=np.float32)
+        for basket in baskets:
+            self.popularity[basket] += 1.0
+        self.popular_items: List[int] = np.argsort(-self.popularity, kind="stable").tolist()
+        max_popularity = float(self.popularity.max()) if n_items else 0.0
+        popularity_bonus = POPULARITY_WEIGHT * self.popularity / max_popularity if max_popularity else self.popularity
+
+        cooccurrence = _cooccurrence_rows(baskets, n_items)
+        embeddings = np.stack([embedder.embed(product_text(n, d)) for n, d in zip(self.names, descriptions)]) \
+            if n_items else np.zeros((0, embedder.dim), dtype=np.float32)
+
+        item_terms = [set(tokenize(product_text(n, d))) for n, d in zip(self.names, descriptions)]
+        postings = _content_postings(item_terms, self.popularity, CONTENT_POSTINGS_LIMIT)
+        no_items = np.zeros(0, dtype=np.int64)
+
+        self.neighbors: List[List[Neighbor]] = []
+        k = min(neighbors, n_items - 1)
+        max_content_candidates = CONTENT_CANDIDATES_PER_NEIGHBOR * max(k, 1)
+        for i in range(n_items):
+            if k <= 0:
+                self.neighbors.append([])
+                continue
+            shared = [postings[term] for term in item_terms[i]]
+            content = no_items
+            if shared:
+                content, overlap = np.unique(np.concatenate(shared), return_counts=True)
+                if len(content) > max_content_candidates:
+                    content = content[np.argpartition(-overlap, max_content_candidates - 1)[:max_content_candidates]]
+            co = cooccurrence[i]
+            co_items = np.fromiter(co.keys(), dtype=np.int64, count=len(co))
+            candidates = np.union1d(content, co_items)
+            candidates = candidates[candidates != i]
+            if not len(candidates):
+                self.neighbors.append([])
+                continue
+
+            scores = CONTENT_WEIGHT * (embeddings[candidates] @ embeddings[i])
+            if co:
+                counts = np.fromiter(co.values(), dtype=np.float32, count=len(co))
+                scores[np.searchsorted(candidates, co_items)] += (
+                    COOCCURRENCE_WEIGHT * counts / np.sqrt(self.popularity[i] * self.popularity[co_items])
+                )
+            m = min(k, len(candidates))
+            top = np.argpartition(-scores, m - 1)[:m]
+            top = top[np.argsort(-scores[top])]
+            self.neighbors.append([
+                Neighbor(j, float(scores[t] + popularity_bonus[j]), j in co)
+                for t, j in zip(top.tolist(), candidates[top].tolist()) if scores[t] > 0
+            ])
+
+        self.build_seconds = time.perf_counter() - started
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def recommend(self, history_names: Iterable[Optional[str]], k: int = 3) -> List[Recommendation]:
+        history = {self._index[key] for key in map(item_key, history_names) if key in self._index}
+        scores: Dict[int, float] = defaultdict(float)
+        best: Dict[int, Tuple[float, int, bool]] = {}
+        for source in history:
+            for neighbor in self.neighbors[source]:
+                if neighbor.item in history:
+                    continue
+                scores[neighbor.item] += neighbor.score
+                if neighbor.item not in best or neighbor.score > best[neighbor.item][0]:
+                    best[neighbor.item] = (neighbor.score, source, neighbor.co_purchased)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+        recommendations = []
+        for item in ranked:
+            _, source, co_purchased = best[item]
+            if co_purchased:
+                reason = f"Frequentemente escolhido por quem também tem \"{self.names[source]}\"."
+            else:
+                reason = f"Semelhante a \"{self.names[source]}\", do seu histórico."
+            recommendations.append(self._recommendation(item, reason))
+
+        for item in self.popular_items:
+            if len(recommendations) >= k:
+                break
+            if item not in history and item not in scores:
+                recommendations.append(self._recommendation(item, POPULARITY_REASON))
+        return recommendations
+
+    def _recommendation(self, item: int, reason: str) -> Recommendation:
+        return Recommendation(product_id=self.product_ids[item], product_name=self.names[item], reason=reason)
+
+
+def load_product_rows(db: Session, chunk_size: int = 5000) -> List[ProductRow]:
+    """
+    Lê apenas as colunas necessárias de `products`, em blocos por chave, com uma linha
+    por usuário que interagiu com o produto (`user_id` None se ninguém interagiu).
+    """
+    rows: List[ProductRow] = []
+    last_id = 0
+    while True:
+        chunk = (
+            db.query(Product.id, Product.name, Product.description)
+            .filter(Product.id > last_id)
+            .order_by(Product.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return rows
+        users_by_product: Dict[int, List[int]] = defaultdict(list)
+        for product_id, user_id in (
+            db.query(UserProductInteraction.product_id, UserProductInteraction.user_id)
+            .filter(UserProductInteraction.product_id > last_id, UserProductInteraction.product_id <= chunk[-1][0])
+            .distinct()
+        ):
+            users_by_product[product_id].append(user_id)
+        for product_id, name, description in chunk:
+            for user_id in users_by_product.get(product_id) or [None]:
+                rows.append((product_id, name, description, user_id))
+        last_id = chunk[-1][0]
+
+
+class FastRecommender:
+    """
+    Recomendador de baixa latência usado como nível de fallback do LLM e no `mode=fast`.
+
+    O modelo é reconstruído periodicamente em uma thread e trocado atomicamente;
+    as consultas sempre leem o último modelo completo.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self.model: Optional[FastRecommenderModel] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.model is not None
+
+    def refresh(self) -> FastRecommenderModel:
+        db = self.session_factory()
+        try:
+            rows = load_product_rows(db)
+        finally:
+            db.close()
+        model = FastRecommenderModel(
+            rows,
+            HashingEmbedder(settings.RETRIEVAL_EMBEDDING_DIM),
+            neighbors=settings.FAST_RECOMMENDER_NEIGHBORS,
+        )
+        self.model = model
+        logger.info(f"Recomendador rápido reconstruído: {len(model)} itens em {model.build_seconds:.2f}s.")
+        return model
+
+    def recommend(self, history_names: Iterable[Optional[str]], k: int = 3) -> List[Recommendation]:
+        model = self.model
+        if model is None:
+            return []
+        return model.recommend(history_names, k)
+
+    async def _build(self) -> None:
+        try:
+            await asyncio.to_thread(self.refresh)
+        except Exception as e:
+            logger.error(f"Falha ao construir o recomendador rápido: {str(e)}", exc_info=True)
+
+    async def _refresh_loop(self, interval: float, build_first: bool):
+        if build_first:
+            await self._build()
+        while True:
+            await asyncio.sleep(interval)
+            await self._build()
+
+    async def start(self, wait: bool = False):
+        """
+        Constrói o modelo e agenda sua reconstrução periódica. Por padrão (lifespan da
+        aplicação) a primeira construção também roda em segundo plano e, até ela terminar,
+        `recommend` devolve uma lista vazia (o agente completa com os fallbacks genéricos);
+        com `wait`, aguarda a primeira construção (CLIs de lote).
+        """
+        if self._refresh_task is not None:
+            return
+        if wait:
+            await self._build()
+        self._refresh_task = asyncio.create_task(
+            self._refresh_loop(settings.FAST_RECOMMENDER_REFRESH_SECONDS, build_first=not wait)
+        )
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+_fast_recommender: Optional[FastRecommender] = None
+
+def get_fast_recommender() -> FastRecommender:
+    """Retorna a instância única do recomendador rápido no processo."""
+    global _fast_recommender
+    if _fast_recommender is None:
+        _fast_recommender = FastRecommender()
+    return _fast_recommender
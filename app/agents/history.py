@@ -0,0 +1,195 @@
+import hashlib
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.agents.fast_recommender import item_key
+from app.core.config import settings
+from app.models import Product, User, UserProductInteraction
+
+EMPTY_HISTORY = "nenhum histórico de produtos relevante"
+
+# Estimativa local de tokens: palavras quebradas em pedaços de até 4 caracteres e cada
+# pontuação como um token, próximo do que o tokenizador do Llama faz com texto em português.
+_TOKEN_ESTIMATE_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Número aproximado de tokens de `text`, sem carregar o tokenizador do modelo."""
+    return len(_TOKEN_ESTIMATE_PATTERN.findall(text))
+
+
+class HistoryItem(NamedTuple):
+    """Uma interação do histórico com apenas as colunas usadas no prompt e na recuperação."""
+    product_id: int
+    name: Optional[str]
+    event_type: str
+    created_at: datetime
+    interaction_id: int
+
+    @property
+    def id(self) -> int:
+        return self.product_id
+
+    @property
+    def cursor(self) -> Tuple[datetime, int]:
+        return self.created_at, self.interaction_id
+
+
+def _history_columns():
+    return (
+        UserProductInteraction.product_id,
+        Product.name,
+        UserProductInteraction.event_type,
+        UserProductInteraction.created_at,
+        UserProductInteraction.id,
+    )
+
+
+def load_recent_history(
+    db: Session,
+    user_id: int,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[datetime, int]] = None,
+) -> List[HistoryItem]:
+    """
+    Página do histórico do usuário, da interação mais recente para a mais antiga.
+
+    Usa o índice (user_id, created_at) com paginação por chave: `before` é o `cursor`
+    do último item da página anterior. Lê no máximo `limit` linhas (HISTORY_RECENT_LIMIT
+    por padrão), então o custo não cresce com o tamanho do histórico completo.
+    """
+    limit = settings.HISTORY_RECENT_LIMIT if limit is None else limit
+    query = (
+        select(*_history_columns())
+        .join(Product, Product.id == UserProductInteraction.product_id)
+        .where(UserProductInteraction.user_id == user_id)
+        .order_by(UserProductInteraction.created_at.desc(), UserProductInteraction.id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        created_at, interaction_id = before
+        query = query.where(or_(
+            UserProductInteraction.created_at < created_at,
+            and_(UserProductInteraction.created_at == created_at, UserProductInteraction.id < interaction_id),
+        ))
+    return [HistoryItem(*row) for row in db.execute(query)]
+
+
+def load_recent_histories(db: Session, user_ids: Sequence[int], limit: Optional[int] = None) -> Dict[int, List[HistoryItem]]:
+    """
+    Históricos recentes de vários usuários em uma só consulta (as `limit` interações
+    mais recentes de cada um, via ROW_NUMBER), do mais recente para o mais antigo.
+    """
+    limit = settings.HISTORY_RECENT_LIMIT if limit is None else limit
+    histories: Dict[int, List[HistoryItem]] = {user_id: [] for user_id in user_ids}
+    if not histories:
+        return histories
+    position = func.row_number().over(
+        partition_by=UserProductInteraction.user_id,
+        order_by=(UserProductInteraction.created_at.desc(), UserProductInteraction.id.desc()),
+    ).label("position")
+    ranked = (
+        select(UserProductInteraction.user_id, *_history_columns(), position)
+        .join(Product, Product.id == UserProductInteraction.product_id)
+        .where(UserProductInteraction.user_id.in_(list(histories)))
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked)
+        .where(ranked.c.position <= limit)
+        .order_by(ranked.c.user_id, ranked.c.position)
+    )
+    for user_id, *columns, _ in rows:
+        histories[user_id].append(HistoryItem(*columns))
+    return histories
+
+
+def attach_recent_histories(db: Session, users: Sequence[User], limit: Optional[int] = None) -> None:
+    """Carrega e anexa `recent_history` a cada usuário (uma consulta para todos)."""
+    histories = load_recent_histories(db, [u.id for u in users], limit)
+    for user in users:
+        user.recent_history = histories[user.id]
+
+
+def user_history(user: User) -> List:
+    """
+    Histórico do usuário em ordem cronológica (mais antigo primeiro): o `recent_history`
+    carregado das interações ou, se ausente, os produtos do relacionamento `products`.
+    """
+    if user.recent_history is not None:
+        return list(reversed(user.recent_history))
+    products = list(user.products)
+    if all(p.id is not None for p in products):
+        products.sort(key=lambda p: p.id)
+    return products
+
+
+def select_history(products: Iterable[Product], max_items: int = 0, token_budget: int = 0) -> Tuple[List[str], int]:
+    """
+    Escolhe os nomes de produtos do histórico (em ordem cronológica, ver `user_history`)
+    que vão para o prompt.
+
+    Percorre do mais recente para o mais antigo, ignora nomes repetidos e dá
+    preferência a produtos de "tipos" ainda não vistos (primeira palavra do nome), até
+    `max_items` itens e `token_budget` tokens estimados (0 = sem limite). Os escolhidos
+    são devolvidos na ordem original do histórico, com quantos produtos distintos
+    ficaram de fora.
+    """
+    products = list(reversed(list(products)))
+
+    seen_keys = set()
+    seen_kinds = set()
+    distinct: List[str] = []
+    repeated_kind: List[int] = []
+    for product in products:
+        key = item_key(product.name)
+        if not key or key in seen_keys:
+            continue
+        seen_keys.add(key)
+        kind = key.split(" ", 1)[0]
+        if kind in seen_kinds:
+            repeated_kind.append(len(distinct))
+        seen_kinds.add(kind)
+        distinct.append(product.name.strip())
+
+    repeated = set(repeated_kind)
+    order = [i for i in range(len(distinct)) if i not in repeated] + repeated_kind
+    chosen: List[int] = []
+    used = 0
+    for index in order:
+        if max_items and len(chosen) >= max_items:
+            break
+        cost = estimate_tokens(distinct[index]) + 1  # + separador
+        if token_budget and used + cost > token_budget:
+            continue
+        chosen.append(index)
+        used += cost
+
+    return [distinct[i] for i in sorted(chosen, reverse=True)], len(distinct) - len(chosen)
+
+
+def format_user_products_info(
+    products: Iterable[Product], max_items: Optional[int] = None, token_budget: Optional[int] = None
+) -> str:
+    """
+    Formata o histórico de produtos do usuário como texto para o prompt, limitado a
+    HISTORY_MAX_ITEMS itens e HISTORY_TOKEN_BUDGET tokens estimados (ver `select_history`).
+    """
+    names, omitted = select_history(
+        products,
+        settings.HISTORY_MAX_ITEMS if max_items is None else max_items,
+        settings.HISTORY_TOKEN_BUDGET if token_budget is None else token_budget,
+    )
+    if not names:
+        return EMPTY_HISTORY
+    info = ", ".join(names)
+    return f"{info} (e mais {omitted} produtos)" if omitted else info
+
+
+def history_fingerprint(user_products_info: str, version: str = "") -> str:
+    """Hash estável do histórico formatado (e da versão do modelo/prompt)."""
+    return hashlib.sha256(f"{version}\n{user_products_info}".encode("utf-8")).hexdigest()
@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import LLM_QUEUE_WAIT
+
+
+# Execuções no executor iniciadas dentro do slot atual (ver `LLMScheduler.slot`).
+_slot_runs: ContextVar[Optional[List[Future]]] = ContextVar("llm_slot_runs", default=None)
+
+
+class LLMOverloadedError(Exception):
+    """O LLM não pode aceitar a requisição agora; o cliente deve tentar novamente depois."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMQueueFullError(LLMOverloadedError):
+    """A fila de espera por um slot do LLM está cheia."""
+
+
+class LLMQueueTimeoutError(LLMOverloadedError):
+    """O prazo da requisição expirou antes de conseguir um slot do LLM."""
+
+
+class LLMScheduler:
+    """
+    Limita a concorrência de chamadas ao LLM.
+
+    No máximo `max_concurrency` chamadas executam ao mesmo tempo (em um executor
+    dedicado, separado do pool padrão do asyncio); até `max_queue_size` chamadas
+    aguardam um slot por no máximo `queue_timeout` segundos. Além disso, as
+    requisições são rejeitadas imediatamente com `LLMQueueFullError`.
+
+    Uma thread do executor não pode ser cancelada: se o chamador deixar de esperar por
+    ela (prazo da chamada ou cancelamento), o slot só é devolvido quando a thread termina.
+    Assim o executor nunca recebe mais trabalho que `max_concurrency`, e as chamadas
+    admitidas não ficam presas na fila dele atrás de execuções abandonadas.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue_size: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiting = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._abandoned = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._run_time_total = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+        return self._executor
+
+    def _retry_after(self) -> int:
+        avg_run_time = self._run_time_total / self._completed if self._completed else self.queue_timeout
+        estimate = avg_run_time * (self._waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(estimate))
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Reserva um slot do LLM para o bloco, respeitando a fila e o prazo."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self._waiting >= self.max_queue_size:
+            self._rejected += 1
+            raise LLMQueueFullError("Fila do LLM cheia", retry_after=self._retry_after())
+
+        self._waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout if timeout is not None else self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise LLMQueueTimeoutError("Tempo de espera por um slot do LLM esgotado", retry_after=self._retry_after())
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - started
+        LLM_QUEUE_WAIT.observe(waited)
+        self._wait_time_total += waited
+        self._wait_time_max = max(self._wait_time_max, waited)
+        self._active += 1
+        run_started = time.monotonic()
+        runs: List[Future] = []
+        token = _slot_runs.set(runs)
+        try:
+            yield waited
+        finally:
+            _slot_runs.reset(token)
+            self._active -= 1
+            self._completed += 1
+            self._run_time_total += time.monotonic() - run_started
+            pending = [run for run in runs if not run.done()]
+            if pending:
+                self._hold_until_done(semaphore, pending)
+            else:
+                semaphore.release()
+
+    def _hold_until_done(self, semaphore: asyncio.Semaphore, runs: List[Future]) -> None:
+        """Devolve o slot ao semáforo só quando as threads abandonadas terminarem."""
+        loop = asyncio.get_running_loop()
+        self._abandoned += 1
+        remaining = len(runs)
+
+        def release() -> None:
+            nonlocal remaining
+            remaining -= 1
+            if remaining == 0:
+                self._abandoned -= 1
+                semaphore.release()
+
+        def on_done(_: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(release)
+            except RuntimeError:
+                # Loop já encerrado: não há mais ninguém esperando pelo slot.
+                pass
+
+        for run in runs:
+            run.add_done_callback(on_done)
+
+    async def run(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Executa `func(*args)` (bloqueante) no executor do LLM assim que houver um slot."""
+        async with self.slot(timeout=timeout):
+            return await self.run_in_executor(func, *args)
+
+    async def run_in_executor(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Executa `func(*args)` no executor do LLM; o chamador já deve ter reservado um slot."""
+        future = self._get_executor().submit(functools.partial(func, *args))
+        runs = _slot_runs.get()
+        if runs is not None:
+            runs.append(future)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_capacity": self.max_queue_size,
+            "queue_depth": self._waiting,
+            "active": self._active,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "abandoned_running": self._abandoned,
+            "avg_wait_seconds": self._wait_time_total / self._completed if self._completed else 0.0,
+            "max_wait_seconds": self._wait_time_max,
+            "avg_run_seconds": self._run_time_total / self._completed if self._completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def build_llm_scheduler(backends: int = 1) -> LLMScheduler:
+    """Scheduler do agente; LLM_MAX_CONCURRENCY vale por instância do Ollama no pool."""
+    return LLMScheduler(
+        max_concurrency=settings.LLM_MAX_CONCURRENCY * max(1, backends),
+        max_queue_size=settings.LLM_MAX_QUEUE_SIZE,
+        queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+    )
@@ -0,0 +1,234 @@
+"""
+Pool de instâncias do Ollama (OLLAMA_BASE_URL com várias URLs separadas por vírgula).
+
+Cada geração vai para a instância disponível com menos gerações em andamento. A saúde
+de cada instância é acompanhada de duas formas:
+
+- passiva: OLLAMA_BACKEND_FAILURE_THRESHOLD falhas seguidas de geração afastam a
+  instância por OLLAMA_BACKEND_EJECTION_SECONDS; depois desse prazo ela volta a
+  receber gerações, e uma nova falha a afasta de novo;
+- ativa: a sonda de prontidão (`check_health`, via `/api/tags`) tira de circulação as
+  instâncias inacessíveis ou sem o modelo e readmite as que voltaram.
+
+Com OLLAMA_HEDGE_ENABLED, uma geração que passa do p95 recente de latência (ou que
+falha antes disso) é repetida em uma segunda instância, e vale a primeira resposta.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import LLM_BACKEND_EJECTIONS, LLM_BACKEND_REQUESTS, LLM_HEDGED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latências recentes usadas no p95 do hedge, e quantas são necessárias antes de usá-lo.
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+
+def parse_backend_urls(value: str) -> List[str]:
+    """Lista de URLs do Ollama a partir de OLLAMA_BASE_URL ("http://a:11434,http://b:11434")."""
+    urls = [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+    return list(dict.fromkeys(urls))
+
+
+def _percentile(values: Iterable[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+class OllamaBackend:
+    """Uma instância do Ollama com o seu cliente LangChain e o estado de saúde."""
+
+    def __init__(self, url: str, llm: Any):
+        self.url = url
+        self.llm = llm
+        # Saudável até a primeira sonda dizer o contrário.
+        self.healthy = True
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": time.monotonic() < self.ejected_until,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+        }
+
+
+class OllamaPool:
+    def __init__(
+        self,
+        urls: List[str],
+        llm_factory: Callable[[str], Any],
+        failure_threshold: Optional[int] = None,
+        ejection_seconds: Optional[float] = None,
+        hedge_enabled: Optional[bool] = None,
+    ):
+        if not urls:
+            raise ValueError("OLLAMA_BASE_URL não contém nenhuma URL")
+        self.backends = [OllamaBackend(url, llm_factory(url)) for url in urls]
+        self.failure_threshold = settings.OLLAMA_BACKEND_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.ejection_seconds = settings.OLLAMA_BACKEND_EJECTION_SECONDS if ejection_seconds is None else ejection_seconds
+        self.hedge_enabled = settings.OLLAMA_HEDGE_ENABLED if hedge_enabled is None else hedge_enabled
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def acquire(self, exclude: Iterable[OllamaBackend] = (), available_only: bool = False) -> Optional[OllamaBackend]:
+        """
+        Instância disponível com menos gerações em andamento. Se nenhuma estiver disponível,
+        usa a que sai do afastamento primeiro (a geração é tentada em vez de falhar de
+        imediato), exceto com `available_only`.
+        """
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude]
+        available = [b for b in candidates if b.available(now)]
+        if available:
+            return min(available, key=lambda b: (b.in_flight, b.requests))
+        if available_only or not candidates:
+            return None
+        return min(candidates, key=lambda b: (not b.healthy, b.ejected_until, b.in_flight))
+
+    def record_success(self, backend: OllamaBackend, elapsed: float) -> None:
+        backend.requests += 1
+        backend.consecutive_failures = 0
+        self.latencies.append(elapsed)
+        LLM_BACKEND_REQUESTS.inc(backend=backend.url, outcome="ok")
+
+    def record_failure(self, backend: OllamaBackend, error: BaseException) -> None:
+        backend.requests += 1
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        LLM_BACKEND_REQUESTS.inc(backend=backend.url, outcome="error")
+        if backend.consecutive_failures >= self.failure_threshold and len(self.backends) > 1:
+            self._eject(backend, "failures", f"{backend.consecutive_failures} falhas seguidas ({str(error) or type(error).__name__})")
+
+    def _eject(self, backend: OllamaBackend, reason: str, detail: str) -> None:
+        backend.ejected_until = time.monotonic() + self.ejection_seconds
+        backend.ejections += 1
+        LLM_BACKEND_EJECTIONS.inc(backend=backend.url, reason=reason)
+        logger.warning(f"Instância do Ollama {backend.url} afastada por {self.ejection_seconds:.0f}s: {detail}.")
+
+    @asynccontextmanager
+    async def lease(self, backend: Optional[OllamaBackend] = None):
+        """Reserva uma instância (a menos carregada, se `backend` não for dado) para o bloco."""
+        backend = backend or self.acquire()
+        backend.in_flight += 1
+        started = time.perf_counter()
+        try:
+            yield backend
+        except Exception as e:
+            self.record_failure(backend, e)
+            raise
+        else:
+            self.record_success(backend, time.perf_counter() - started)
+        finally:
+            backend.in_flight -= 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes de repetir a geração em outra instância: o p95 recente, com um piso."""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(settings.OLLAMA_HEDGE_MIN_DELAY_SECONDS, _percentile(self.latencies, settings.OLLAMA_HEDGE_PERCENTILE))
+
+    async def _attempt(self, backend: OllamaBackend, call: Callable[[OllamaBackend], Awaitable[T]]) -> T:
+        async with self.lease(backend):
+            return await call(backend)
+
+    async def invoke(self, call: Callable[[OllamaBackend], Awaitable[T]]) -> T:
+        """
+        Executa `call(backend)` na instância menos carregada. Com hedge, se a chamada não
+        terminar em `hedge_delay()` segundos (ou falhar antes disso), repete-a em outra
+        instância disponível e devolve o primeiro resultado bem-sucedido.
+        """
+        delay = self.hedge_delay() if self.hedge_enabled and len(self.backends) > 1 else None
+        first = self.acquire()
+        if delay is None:
+            return await self._attempt(first, call)
+
+        tasks = [asyncio.ensure_future(self._attempt(first, call))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done and tasks[0].exception() is None:
+                return tasks[0].result()
+            second = self.acquire(exclude=(first,), available_only=True)
+            if second is not None:
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(self._attempt(second, call)))
+
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            winner = "hedge" if task is tasks[1] else "primary"
+                            self.hedge_wins += winner == "hedge"
+                            LLM_HEDGED_REQUESTS.inc(winner=winner)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+
+    async def _probe(self, backend: OllamaBackend, model_name: str, timeout: float) -> bool:
+        try:
+            async with httpx.AsyncClient(base_url=backend.url, timeout=timeout) as client:
+                response = await client.get("/api/tags")
+                response.raise_for_status()
+            models = {m.get("name") for m in response.json().get("models", [])}
+            if model_name not in models:
+                logger.warning(f"Ollama acessível em {backend.url}, mas o modelo '{model_name}' não foi puxado.")
+                return False
+            return True
+        except Exception as e:
+            logger.warning(f"Ollama indisponível em {backend.url}: {str(e)}")
+            return False
+
+    async def check_health(self, model_name: str, timeout: Optional[float] = None) -> bool:
+        """Sonda ativa de todas as instâncias; indica se ao menos uma está saudável."""
+        timeout = settings.OLLAMA_HEALTHCHECK_TIMEOUT_SECONDS if timeout is None else timeout
+        results = await asyncio.gather(*[self._probe(b, model_name, timeout) for b in self.backends])
+        for backend, healthy in zip(self.backends, results):
+            if healthy != backend.healthy and len(self.backends) > 1:
+                if healthy:
+                    logger.info(f"Instância do Ollama {backend.url} readmitida pela sonda de saúde.")
+                else:
+                    LLM_BACKEND_EJECTIONS.inc(backend=backend.url, reason="probe")
+                    logger.warning(f"Instância do Ollama {backend.url} fora de circulação até a próxima sonda bem-sucedida.")
+            backend.healthy = healthy
+        return any(results)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": [b.stats() for b in self.backends],
+            "hedge_enabled": self.hedge_enabled,
+            "hedge_delay_s": self.hedge_delay(),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
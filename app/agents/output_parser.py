@@ -0,0 +1,113 @@
+import re
+from typing import List, Optional, Set
+
+from app.schemas import Recommendation, RecommendationList
+
+# Marcações de markdown que os modelos costumam colocar em volta dos rótulos (`**Name:**`).
+_MARKDOWN = re.compile(r"\*\*|__|`")
+_RECORD_START = re.compile(r"product\s*id", re.IGNORECASE)
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+# Aplicados a partir de "Product ID" (nunca com `search` sobre o texto inteiro), em uma única
+# linha. O nome não é capturado por regex: ele vai até o primeiro separador seguido do rótulo
+# "Reason". Cada trecho de espaços é percorrido no máximo uma vez, então o custo é linear no
+# tamanho da linha mesmo com longas sequências de espaços (um `(.+?)\s*` seria quadrático).
+RECORD_HEAD_PATTERN = re.compile(
+    r"product\s*id\s*[:#=-]?\s*(\d+)\s*[,;|\-–]\s*name\s*[:=-]\s*",
+    re.IGNORECASE
+)
+REASON_LABEL_PATTERN = re.compile(r"[,;|\-–]\s*reason\s*[:=-]", re.IGNORECASE)
+
+
+def parse_recommendation_line(line: str) -> Optional[Recommendation]:
+    """
+    Analisa uma única linha no formato `Product ID: ..., Name: ..., Reason: ...`.
+
+    Tolera marcadores de lista, numeração, negrito/código em markdown e texto antes do
+    registro (`1. **Product ID:** 7 | Name: ...`).
+    """
+    start = _RECORD_START.search(line)
+    if start is None:
+        return None
+    record = _MARKDOWN.sub("", line[start.start():])
+    head = RECORD_HEAD_PATTERN.match(record)
+    if head is None:
+        return None
+    label = REASON_LABEL_PATTERN.search(record, head.end())
+    if label is None:
+        return None
+    name = record[head.end():label.start()].strip()
+    reason = record[label.end():].strip()
+    if not name or not reason:
+        return None
+    return Recommendation(product_id=int(head.group(1)), product_name=name, reason=reason)
+
+
+class RecommendationStreamParser:
+    """
+    Parser incremental da saída do LLM.
+
+    Recebe pedaços de texto (tokens) via `feed` e devolve cada recomendação assim
+    que a linha correspondente termina; `close` processa a última linha sem quebra.
+    Cada caractere é examinado uma única vez na busca por quebras de linha, e IDs de
+    produto repetidos são descartados (`dedupe=True`).
+    """
+
+    def __init__(self, dedupe: bool = True):
+        self._pending: List[str] = []
+        self._seen: Optional[Set[int]] = set() if dedupe else None
+
+    def _accept(self, line: str, out: List[Recommendation]) -> None:
+        recommendation = parse_recommendation_line(line)
+        if recommendation is None:
+            return
+        if self._seen is not None:
+            if recommendation.product_id in self._seen:
+                return
+            self._seen.add(recommendation.product_id)
+        out.append(recommendation)
+
+    def feed(self, chunk: str) -> List[Recommendation]:
+        out: List[Recommendation] = []
+        start = 0
+        while True:
+            end = chunk.find("\n", start)
+            if end < 0:
+                if start < len(chunk):
+                    self._pending.append(chunk[start:])
+                return out
+            self._pending.append(chunk[start:end])
+            line, self._pending = "".join(self._pending), []
+            self._accept(line, out)
+            start = end + 1
+
+    def close(self) -> List[Recommendation]:
+        out: List[Recommendation] = []
+        line, self._pending = "".join(self._pending), []
+        self._accept(line, out)
+        return out
+
+
+def parse_recommendations(text: str, dedupe: bool = True) -> List[Recommendation]:
+    """Extrai todas as recomendações de uma saída completa do LLM."""
+    parser = RecommendationStreamParser(dedupe=dedupe)
+    return parser.feed(text) + parser.close()
+
+
+
+def parse_structured_recommendations(text: str) -> List[Recommendation]:
+    """
+    Valida a saída JSON do LLM contra `RecommendationList` (sem regex).
+
+    Aceita o JSON dentro de um bloco de código markdown e descarta IDs repetidos;
+    levanta `pydantic.ValidationError` se o JSON for inválido ou fora do esquema.
+    """
+    result = RecommendationList.model_validate_json(_CODE_FENCE.sub("", text))
+    seen: Set[Optional[int]] = set()
+    recommendations = []
+    for recommendation in result.recommendations:
+        if recommendation.product_id is not None and recommendation.product_id in seen:
+            continue
+        seen.add(recommendation.product_id)
+        recommendations.append(recommendation)
+    return recommendations
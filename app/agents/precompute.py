@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.agents.batch import generate_batch, load_users_with_products
+from app.agents.history import format_user_products_info, history_fingerprint, load_recent_history, user_history
+from app.agents.llm_scheduler import LLMOverloadedError
+from app.agents.recommendation_agent import RecommendationAgent
+from app.core.config import settings
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import StoredRecommendation, User as UserModel, UserProductInteraction
+from app.schemas import Recommendation
+
+logger = logging.getLogger(__name__)
+
+# Usuários com uma atualização em segundo plano em andamento neste processo.
+_refreshing: Set[int] = set()
+
+# Tamanho das listas geradas pelo agente; a leitura nunca devolve mais que isso.
+STORED_RECOMMENDATIONS = 3
+
+
+def get_stored_recommendations(db: Session, user_id: int) -> List[StoredRecommendation]:
+    return (
+        db.query(StoredRecommendation)
+        .filter(StoredRecommendation.user_id == user_id)
+        .order_by(StoredRecommendation.position)
+        .limit(STORED_RECOMMENDATIONS)
+        .all()
+    )
+
+
+def to_recommendations(rows: List[StoredRecommendation]) -> List[Recommendation]:
+    return [Recommendation(product_id=r.product_id, product_name=r.product_name, reason=r.reason) for r in rows]
+
+
+def _is_stale(fingerprint: str, model_version: str, generated_at: datetime, current_fingerprint: str, version: str) -> bool:
+    if generated_at.tzinfo is None:
+        generated_at = generated_at.replace(tzinfo=timezone.utc)
+    max_age = timedelta(seconds=settings.RECOMMENDATION_MAX_AGE_SECONDS)
+    return (
+        fingerprint != current_fingerprint
+        or model_version != version
+        or datetime.now(timezone.utc) - generated_at > max_age
+    )
+
+
+def is_stale(rows: List[StoredRecommendation], current_fingerprint: str, version: str) -> bool:
+    """Indica se as recomendações gravadas não refletem mais o histórico, o modelo ou a idade máxima."""
+    if not rows:
+        return True
+    row = rows[0]
+    return _is_stale(row.history_fingerprint, row.model_version, row.generated_at, current_fingerprint, version)
+
+
+def store_recommendations(
+    db: Session,
+    user_id: int,
+    recommendations: List[Recommendation],
+    fingerprint: str,
+    version: str,
+) -> None:
+    """
+    Substitui as recomendações gravadas do usuário pelas novas.
+
+    A linha do usuário é travada antes da troca: gravações concorrentes para o mesmo
+    usuário (duas abas, a atualização em segundo plano e o `refresh_recommendations.py`)
+    são serializadas, e a que vem depois apaga as linhas já confirmadas pela primeira.
+    """
+    generated_at = datetime.now(timezone.utc)
+    db.execute(select(UserModel.id).where(UserModel.id == user_id).with_for_update())
+    db.query(StoredRecommendation).filter(StoredRecommendation.user_id == user_id).delete(synchronize_session=False)
+    db.add_all([
+        StoredRecommendation(
+            user_id=user_id,
+            position=position,
+            product_id=r.product_id,
+            product_name=r.product_name,
+            reason=r.reason,
+            history_fingerprint=fingerprint,
+            model_version=version,
+            generated_at=generated_at,
+        )
+        for position, r in enumerate(recommendations)
+    ])
+    db.commit()
+
+
+async def refresh_user_recommendations(
+    agent: RecommendationAgent,
+    user_id: int,
+    session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+) -> None:
+    """Regera e grava as recomendações de um usuário (usado como tarefa em segundo plano)."""
+    if user_id in _refreshing:
+        return
+    _refreshing.add(user_id)
+    try:
+        async with session_factory() as db:
+            user = (await db.execute(select(UserModel).where(UserModel.id == user_id))).scalar_one_or_none()
+            if user is None:
+                return
+            user.recent_history = await db.run_sync(load_recent_history, user_id)
+            user_products_info = format_user_products_info(user_history(user))
+            # Versão lida antes da geração: a do momento em que os candidatos foram escolhidos.
+            version = agent.cache_version
+            result = await agent.generate(user, user_products_info)
+            if not result.degraded:
+                fingerprint = history_fingerprint(user_products_info, version)
+                await db.run_sync(store_recommendations, user_id, result.recommendations, fingerprint, version)
+    except LLMOverloadedError:
+        logger.info(f"Atualização das recomendações do usuário {user_id} adiada: LLM sobrecarregado.")
+    except Exception as e:
+        logger.error(f"Erro ao atualizar as recomendações do usuário {user_id}: {str(e)}", exc_info=True)
+    finally:
+        _refreshing.discard(user_id)
+
+
+def find_stale_users(
+    db: Session,
+    version: str,
+    after_id: int = 0,
+    limit: Optional[int] = None,
+) -> Tuple[List[UserModel], Optional[int]]:
+    """
+    Uma página (paginação por chave, IDs acima de `after_id`) dos usuários cujas
+    recomendações gravadas estão ausentes ou desatualizadas, com o histórico recente carregado.
+
+    O SQL pré-seleciona os candidatos sem ler os históricos: sem recomendações, de outra
+    versão do modelo, mais antigas que RECOMMENDATION_MAX_AGE_SECONDS ou com alguma
+    interação posterior à geração (pelo índice (user_id, created_at)). Só para esses o
+    fingerprint do histórico é recalculado. Devolve também o último ID candidato lido,
+    ou None quando não há mais páginas.
+    """
+    limit = limit or settings.BATCH_LOAD_CHUNK_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.RECOMMENDATION_MAX_AGE_SECONDS)
+    latest_interaction = (
+        select(func.max(UserProductInteraction.created_at))
+        .where(UserProductInteraction.user_id == UserModel.id)
+        .correlate(UserModel)
+        .scalar_subquery()
+    )
+    candidate_ids = db.execute(
+        select(UserModel.id)
+        .outerjoin(StoredRecommendation, and_(
+            StoredRecommendation.user_id == UserModel.id,
+            StoredRecommendation.position == 0,
+        ))
+        .where(UserModel.id > after_id)
+        .where(or_(
+            StoredRecommendation.id.is_(None),
+            StoredRecommendation.model_version != version,
+            StoredRecommendation.generated_at < cutoff,
+            latest_interaction > StoredRecommendation.generated_at,
+        ))
+        .order_by(UserModel.id)
+        .limit(limit)
+    ).scalars().all()
+    if not candidate_ids:
+        return [], None
+
+    stored: Dict[int, tuple] = {
+        user_id: (fingerprint, model_version, generated_at)
+        for user_id, fingerprint, model_version, generated_at in db.query(
+            StoredRecommendation.user_id,
+            StoredRecommendation.history_fingerprint,
+            StoredRecommendation.model_version,
+            StoredRecommendation.generated_at,
+        ).filter(StoredRecommendation.position == 0, StoredRecommendation.user_id.in_(candidate_ids))
+    }
+    stale = []
+    for user in load_users_with_products(db, user_ids=candidate_ids):
+        current = history_fingerprint(format_user_products_info(user_history(user)), version)
+        previous = stored.get(user.id)
+        if previous is None or _is_stale(*previous, current, version):
+            stale.append(user)
+    return stale, candidate_ids[-1] if len(candidate_ids) == limit else None
+
+
+async def refresh_stale_recommendations(
+    agent: RecommendationAgent,
+    session_factory: Callable[[], Session] = SessionLocal,
+    concurrency: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Regera as recomendações apenas dos usuários cujo histórico mudou desde a última geração,
+    uma página de candidatos por vez. As consultas e gravações (síncronas) rodam em uma
+    thread, sem bloquear o event loop das gerações.
+    """
+    db = session_factory()
+    try:
+        version = agent.cache_version
+        stale = refreshed = skipped = 0
+        after_id: Optional[int] = 0
+        while after_id is not None:
+            stale_users, after_id = await asyncio.to_thread(find_stale_users, db, version, after_id)
+            stale += len(stale_users)
+            users_by_id = {u.id: u for u in stale_users}
+            async for result in generate_batch(agent, stale_users, concurrency=concurrency):
+                if result.fallback:
+                    skipped += 1
+                    continue
+                user = users_by_id[result.user_id]
+                fingerprint = history_fingerprint(format_user_products_info(user_history(user)), version)
+                await asyncio.to_thread(store_recommendations, db, result.user_id, result.recommendations, fingerprint, version)
+                refreshed += 1
+        return {"stale": stale, "refreshed": refreshed, "skipped": skipped}
+    finally:
+        db.close()
@@ -1,43 +1,448 @@
-from typing import List, Optional
-import re
+from typing import AsyncIterator, List, Optional
 import asyncio
+import importlib
 import logging
+import math
 import os
+import sys
+from contextlib import aclosing
 
-from crewai import Agent, Task, Crew
-from langchain_community.chat_models import ChatOllama
-from langchain_core.messages import HumanMessage 
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import ValidationError
 
-from app.schemas import Recommendation
+from app.agents.circuit_breaker import build_circuit_breaker
+from app.agents.fast_recommender import get_fast_recommender
+from app.agents.history import EMPTY_HISTORY, history_fingerprint, user_history
+from app.agents.output_parser import (
+    RecommendationStreamParser,
+    parse_recommendations,
+    parse_structured_recommendations,
+)
+from app.agents.llm_scheduler import LLMOverloadedError, build_llm_scheduler
+from app.agents.ollama_pool import OllamaPool, parse_backend_urls
+from app.agents.retrieval import Candidate, get_product_index
+from app.agents.recommendation_cache import RecommendationCache, get_recommendation_cache
+from app.agents.single_flight import SingleFlight
+from app.schemas import Recommendation, RecommendationList, RecommendationResult
 from app.models import User as UserModel
 from app.core.config import settings
+from app.core.metrics import (
+    LLM_ACTIVE,
+    LLM_CALL_TIMEOUTS,
+    LLM_GENERATION_DURATION,
+    LLM_OUTPUT_PARSES,
+    LLM_PARSE_DURATION,
+    LLM_QUEUE_DEPTH,
+    LLM_TOKENS,
+    RECOMMENDATION_FALLBACKS,
+    RECOMMENDATION_GENERATIONS,
+    RECOMMENDATION_LINES,
+)
 
 logger = logging.getLogger(__name__)
 
+# Dependências pesadas (o CrewAI sozinho leva segundos para importar), carregadas no
+# primeiro uso: `ChatOllama` ao criar o agente e o CrewAI na primeira execução do motor
+# "crew" (ou em segundo plano no `start`). Ficam como atributos do módulo, então
+# `patch("app.agents.recommendation_agent.ChatOllama")` continua funcionando.
+_LAZY_IMPORTS = {
+    "ChatOllama": ("langchain_community.chat_models", "ChatOllama"),
+    "Agent": ("crewai", "Agent"),
+    "Task": ("crewai", "Task"),
+    "Crew": ("crewai", "Crew"),
+}
+
+
+def _use_pysqlite3() -> None:
+    """O ChromaDB (dependência do CrewAI) exige um SQLite recente; usa o `pysqlite3` se instalado."""
+    try:
+        import pysqlite3
+    except ImportError:
+        return
+    sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
+
+
+def _lazy(name: str):
+    value = globals().get(name)
+    if value is None:
+        module_name, attribute = _LAZY_IMPORTS[name]
+        if module_name == "crewai" and module_name not in sys.modules:
+            _use_pysqlite3()
+        value = getattr(importlib.import_module(module_name), attribute)
+        globals()[name] = value
+    return value
+
+
+def __getattr__(name: str):
+    if name in _LAZY_IMPORTS:
+        return _lazy(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_crewai() -> None:
+    """Importa o CrewAI (usado no `start` para tirar o custo da primeira requisição)."""
+    for name in ("Agent", "Task", "Crew"):
+        _lazy(name)
+
+# Incrementar sempre que o prompt mudar, para invalidar resultados em cache.
+PROMPT_VERSION = "v3"
+
+AGENT_ROLE = 'Especialista em Recomendação de Produtos'
+AGENT_GOAL = 'Fornecer recomendações de produtos personalizadas e relevantes baseadas no perfil e histórico do usuário'
+AGENT_BACKSTORY = (
+    'Você é um especialista em análise de comportamento do usuário e histórico de compras/interações '
+    'para gerar recomendações de produtos altamente relevantes. Use as informações do usuário e '
+    'seu histórico de produtos para criar as melhores sugestões.'
+)
+
+# Os prompts começam com o trecho estático (objetivo, formato e exemplo) e terminam com os
+# dados do usuário: assim o prefixo é idêntico entre requisições e o Ollama reaproveita o
+# cache de KV dele em vez de reavaliá-lo a cada geração.
+TASK_OBJECTIVE = '''**Seu objetivo é gerar EXATAMENTE 3 (três) recomendações de produtos únicas, personalizadas e variadas que o usuário descrito ao final provavelmente se interessaria, baseando-se no histórico fornecido.**
+
+'''
+
+TEXT_OUTPUT_INSTRUCTIONS = '''**FORMATO DE SAÍDA OBRIGATÓRIO (MUITO IMPORTANTE):**
+Cada recomendação DEVE ser uma linha separada e formatada EXATAMENTE assim:
+`Product ID: <um número inteiro único>, Name: <o nome do produto>, Reason: <a razão detalhada para a recomendação>`
+
+**REGRAS RÍGIDAS DE FORMATAÇÃO:**
+1.  NÃO INCLUA NENHUM TEXTO INTRODUTÓRIO OU CONCLUSIVO. APENAS AS 3 LINHAS FORMATADAS.
+2.  Garanta que cada `Product ID` seja um número inteiro.
+3.  O `Name` e `Reason` podem conter qualquer texto, mas devem estar na mesma linha que "Product ID".
+
+**EXEMPLO DE SAÍDA PERFEITA (SIGA ESTE FORMATO EXATAMENTE):**
+Product ID: 101, Name: Tênis de Corrida Leve, Reason: Ideal para iniciantes, com bom amortecimento para corridas diárias.
+Product ID: 102, Name: Livro "A Arte de Persuadir", Reason: Útil para desenvolvimento profissional e habilidades de comunicação.
+Product ID: 103, Name: Cafeteira Expresso Compacta, Reason: Perfeita para amantes de café que buscam praticidade e qualidade.
+'''
+
+JSON_OUTPUT_INSTRUCTIONS = '''**Responda APENAS com um objeto JSON, sem nenhum texto antes ou depois, neste formato:**
+{{"recommendations": [{{"product_id": <inteiro>, "product_name": "<nome do produto>", "reason": "<razão da recomendação>"}}]}}
+A lista "recommendations" deve ter EXATAMENTE 3 itens, com valores de "product_id" diferentes.
+'''
+
+USER_CONTEXT_TEMPLATE = '''
+**Usuário:** {username} (ID: {user_id}, Email: {email}).
+**Histórico de produtos do usuário:** {user_products_info}.
+{candidates_section}
+Responda agora seguindo EXATAMENTE o formato acima.
+'''
+
+TASK_DESCRIPTION_TEMPLATE = TASK_OBJECTIVE + TEXT_OUTPUT_INSTRUCTIONS + USER_CONTEXT_TEMPLATE
+
+TASK_EXPECTED_OUTPUT = '''Lista de 3 recomendações formatadas exatamente como:
+Product ID: <id>, Name: <nome>, Reason: <razão>
+'''
+
+SYSTEM_MESSAGE = f"Você é um {AGENT_ROLE}. {AGENT_BACKSTORY} Seu objetivo: {AGENT_GOAL}."
+
+# Prompt do modo "direct": mesmo conteúdo da Task do CrewAI, montado uma única vez.
+DIRECT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_MESSAGE),
+    ("human", TASK_DESCRIPTION_TEMPLATE),
+])
+
+# Variante do modo "direct" com saída JSON (RECOMMENDATION_OUTPUT_FORMAT = json/schema).
+STRUCTURED_TASK_TEMPLATE = TASK_OBJECTIVE + JSON_OUTPUT_INSTRUCTIONS + USER_CONTEXT_TEMPLATE
+
+STRUCTURED_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_MESSAGE),
+    ("human", STRUCTURED_TASK_TEMPLATE),
+])
+
+# Versão compacta (RECOMMENDATION_PROMPT_VARIANT = compact): mesmas regras, sem o bloco
+# de instruções repetidas e com um único exemplo, para reduzir os tokens de prompt.
+COMPACT_TASK_OBJECTIVE = "Recomende EXATAMENTE 3 produtos diferentes que combinem com o histórico do usuário abaixo.\n"
+
+COMPACT_USER_CONTEXT_TEMPLATE = '''Usuário: {username} (ID {user_id}). Histórico de produtos: {user_products_info}.
+{candidates_section}'''
+
+COMPACT_TASK_TEMPLATE = COMPACT_TASK_OBJECTIVE + '''Responda só com 3 linhas, sem outro texto, no formato:
+Product ID: <inteiro>, Name: <nome>, Reason: <razão curta>
+''' + COMPACT_USER_CONTEXT_TEMPLATE
+
+COMPACT_STRUCTURED_TASK_TEMPLATE = COMPACT_TASK_OBJECTIVE + '''Responda só com um objeto JSON, sem outro texto:
+{{"recommendations": [{{"product_id": <inteiro>, "product_name": "<nome>", "reason": "<razão curta>"}}]}} com 3 itens.
+''' + COMPACT_USER_CONTEXT_TEMPLATE
+
+COMPACT_SYSTEM_MESSAGE = f"Você é um {AGENT_ROLE}."
+
+TASK_TEMPLATES = {"full": TASK_DESCRIPTION_TEMPLATE, "compact": COMPACT_TASK_TEMPLATE}
+
+PROMPTS = {
+    ("full", False): DIRECT_PROMPT,
+    ("full", True): STRUCTURED_PROMPT,
+    ("compact", False): ChatPromptTemplate.from_messages([
+        ("system", COMPACT_SYSTEM_MESSAGE), ("human", COMPACT_TASK_TEMPLATE),
+    ]),
+    ("compact", True): ChatPromptTemplate.from_messages([
+        ("system", COMPACT_SYSTEM_MESSAGE), ("human", COMPACT_STRUCTURED_TASK_TEMPLATE),
+    ]),
+}
+
+REPAIR_MESSAGE = (
+    "A resposta anterior não é válida: {error}\n"
+    "Responda novamente APENAS com o objeto JSON corrigido, com exatamente 3 recomendações."
+)
+
+
+CANDIDATES_HEADER = (
+    "\n**Produtos candidatos do catálogo** (escolha as 3 recomendações APENAS entre eles, "
+    "usando o Product ID exato):\n"
+)
+
+
+def _format_candidates(candidates: List[Candidate]) -> str:
+    if not candidates:
+        return ""
+    lines = [f"- ID {c.product_id}: {c.name}" + (f" ({c.description[:80]})" if c.description else "") for c in candidates]
+    return CANDIDATES_HEADER + "\n".join(lines) + "\n"
+
+
+def _keep_alive(value):
+    """O Ollama aceita durações ("30m") ou números de segundos (-1 = sempre); "-1" vindo do .env vira número."""
+    text = str(value).strip()
+    return int(text) if text.lstrip("-").isdigit() else text
+
+
+def _http_timeout() -> Optional[int]:
+    """Timeout HTTP do ChatOllama: o mesmo LLM_CALL_TIMEOUT_SECONDS, para que a thread do kickoff também desista."""
+    timeout = settings.LLM_CALL_TIMEOUT_SECONDS
+    return math.ceil(timeout) if timeout > 0 else None
+
+
+async def _with_timeout(awaitable, engine: str):
+    """
+    Aguarda uma chamada ao LLM por no máximo LLM_CALL_TIMEOUT_SECONDS (0 = sem limite).
+
+    Deve envolver a chamada dentro do `lease` da instância (cada tentativa do pool), para
+    que o tempo esgotado chegue ao pool como falha da instância, e não como cancelamento.
+    """
+    timeout = settings.LLM_CALL_TIMEOUT_SECONDS
+    if timeout <= 0:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        LLM_CALL_TIMEOUTS.inc(engine=engine)
+        raise TimeoutError(f"Chamada ao LLM ({engine}) excedeu {timeout:g}s") from None
+
+
+async def _stream_with_timeout(stream: AsyncIterator, engine: str) -> AsyncIterator:
+    """
+    Repassa um fluxo de tokens do LLM com um prazo total de LLM_CALL_TIMEOUT_SECONDS.
+
+    O timeout HTTP do ChatOllama vale para cada leitura, então uma instância que segue
+    enviando tokens aos poucos nunca o atinge; aqui o prazo vale para o fluxo inteiro e
+    seu fim levanta `TimeoutError`, como `_with_timeout`. Fecha o fluxo ao terminar.
+    """
+    timeout = settings.LLM_CALL_TIMEOUT_SECONDS
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    async with aclosing(stream):
+        while True:
+            try:
+                if timeout <= 0:
+                    chunk = await stream.__anext__()
+                else:
+                    chunk = await asyncio.wait_for(stream.__anext__(), max(0.0, deadline - loop.time()))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                LLM_CALL_TIMEOUTS.inc(engine=engine)
+                raise TimeoutError(f"Chamada ao LLM ({engine}) excedeu {timeout:g}s") from None
+            yield chunk
+
+
+def _prompt_variables(user_model: UserModel, user_products_info: str, candidates: List[Candidate] = ()) -> dict:
+    return {
+        "username": user_model.username,
+        "user_id": user_model.id,
+        "email": user_model.email,
+        "user_products_info": user_products_info,
+        "candidates_section": _format_candidates(candidates),
+    }
+
 class RecommendationAgent:
-    def __init__(self):
-        """Inicializa o agente de recomendação com configurações do Ollama."""
-        self.ollama_base_url = settings.OLLAMA_BASE_URL
+    def __init__(self, cache: Optional[RecommendationCache] = None):
+        """Inicializa o agente de recomendação com configurações do Ollama.
+
+        A conexão com o Ollama não é testada aqui: a verificação é feita pela
+        sonda de prontidão (`check_connection`/`start`), fora do caminho da requisição.
+        Com várias URLs em OLLAMA_BASE_URL, as gerações são distribuídas pelo `OllamaPool`.
+        """
+        self.backend_urls = parse_backend_urls(settings.OLLAMA_BASE_URL)
+        self.ollama_base_url = self.backend_urls[0]
         self.model_name = "llama2:7b-chat-q2_K" 
+        self.is_ready = False
+        self.cache = cache if cache is not None else (get_recommendation_cache() if settings.RECOMMENDATION_CACHE_ENABLED else None)
+        self.output_format = settings.RECOMMENDATION_OUTPUT_FORMAT
+        self.prompt_variant = settings.RECOMMENDATION_PROMPT_VARIANT
+        self._base_cache_version = f"{self.model_name}:{PROMPT_VERSION}"
+        if self.prompt_variant != "full":
+            self._base_cache_version += f":{self.prompt_variant}"
+        if self.output_format != "text":
+            self._base_cache_version += f":{self.output_format}"
+        self._single_flight = SingleFlight()
+        self.scheduler = build_llm_scheduler(len(self.backend_urls))
+        self.breaker = build_circuit_breaker()
+        LLM_QUEUE_DEPTH.set_function(lambda: self.scheduler.stats()["queue_depth"])
+        LLM_ACTIVE.set_function(lambda: self.scheduler.stats()["active"])
+        self.engine = settings.RECOMMENDATION_ENGINE
+        self.token_usage = {
+            engine: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0} for engine in ("crew", "direct")
+        }
+        self._probe_task: Optional[asyncio.Task] = None
+        self._warm_task: Optional[asyncio.Task] = None
+        self._import_task: Optional[asyncio.Task] = None
 
         try:
             os.environ["OLLAMA_BASE_URL"] = self.ollama_base_url
-            self.ollama_llm_instance = ChatOllama(
-                base_url=self.ollama_base_url,
-                model=self.model_name,
-                temperature=0.7,
-                ollama_url=self.ollama_base_url
-            )
-            test_message = "Hello, check Ollama connection."
-            test_output = self.ollama_llm_instance.invoke([HumanMessage(content=test_message)])
-            logger.info(f"Ollama connection test successful. Input: '{test_message}'. Output snippet: '{test_output.content[:50]}...'")
+            self.pool = OllamaPool(self.backend_urls, self._build_llm)
+            # Cliente da primeira instância (a única, no caso comum de um só Ollama).
+            self.ollama_llm_instance = self.pool.backends[0].llm
         except Exception as e:
-            logger.error(f"Falha ao inicializar ou conectar ao Ollama LLM: {str(e)}. Verifique se o serviço 'ollama' está rodando e o modelo '{self.model_name}' foi puxado.", exc_info=True)
+            logger.error(f"Falha ao inicializar o Ollama LLM: {str(e)}.", exc_info=True)
             raise 
 
+    @property
+    def cache_version(self) -> str:
+        """
+        Versão das recomendações (modelo, prompt e formato) para o cache e a tabela
+        `recommendations`. Com a recuperação ativa, muda quando o índice de produtos fica
+        pronto: o que foi gerado sem candidatos do catálogo passa a ser regerado.
+        """
+        if settings.RETRIEVAL_ENABLED and get_product_index().is_ready:
+            return f"{self._base_cache_version}:grounded"
+        return self._base_cache_version
+
+    def _build_llm(self, base_url: str):
+        return _lazy("ChatOllama")(
+            base_url=base_url,
+            model=self.model_name,
+            temperature=0.7,
+            keep_alive=_keep_alive(settings.OLLAMA_KEEP_ALIVE),
+            num_ctx=settings.OLLAMA_NUM_CTX,
+            num_thread=settings.OLLAMA_NUM_THREAD,
+            num_predict=settings.OLLAMA_NUM_PREDICT,
+            timeout=_http_timeout(),
+            ollama_url=base_url
+        )
+
+    async def check_connection(self) -> bool:
+        """
+        Verifica se o Ollama está acessível e se o modelo configurado foi puxado em ao
+        menos uma instância (é também a verificação de saúde ativa do pool).
+
+        Usa o endpoint `/api/tags`, que não executa o modelo, em vez de uma geração completa.
+        """
+        ready = await self.pool.check_health(self.model_name)
+
+        if ready != self.is_ready:
+            logger.info(f"Estado de prontidão do Ollama alterado: {self.is_ready} -> {ready}")
+        self.is_ready = ready
+        return ready
+
+    async def _readiness_probe_loop(self, interval: float):
+        while True:
+            await self.check_connection()
+            await asyncio.sleep(interval)
+
+    async def keep_model_loaded(self) -> bool:
+        """
+        Pede a cada instância do Ollama para carregar o modelo (ou renovar seu `keep_alive`)
+        sem gerar texto: `/api/generate` sem prompt apenas carrega o modelo na memória.
+        """
+        return any(await asyncio.gather(*[self._load_model(b.url) for b in self.pool.backends]))
+
+    async def _load_model(self, base_url: str) -> bool:
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=settings.OLLAMA_WARMUP_TIMEOUT_SECONDS) as client:
+                response = await client.post("/api/generate", json={
+                    "model": self.model_name, "keep_alive": _keep_alive(settings.OLLAMA_KEEP_ALIVE),
+                })
+                response.raise_for_status()
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao manter o modelo '{self.model_name}' carregado em {base_url}: {str(e)}")
+            return False
+
+    async def warm_up(self) -> bool:
+        """
+        Aquece o modelo: carrega-o na memória e avalia o prefixo estático do prompt (gerando
+        um único token), para que a primeira requisição real não pague a carga do modelo nem
+        a avaliação das instruções.
+        """
+        started = asyncio.get_running_loop().time()
+        if not await self.keep_model_loaded():
+            return False
+        messages = PROMPTS[self.prompt_variant, self.output_format != "text"].format_messages(
+            username="", user_id="", email="", user_products_info=EMPTY_HISTORY, candidates_section=""
+        )
+        warmed = 0
+        for backend in self.pool.backends:
+            try:
+                async with self.scheduler.slot():
+                    await backend.llm.ainvoke(messages, num_predict=1)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Falha ao aquecer o prefixo do prompt em {backend.url}: {str(e)}")
+        if not warmed:
+            return False
+        logger.info("Modelo %s aquecido em %.1fs.", self.model_name, asyncio.get_running_loop().time() - started)
+        return True
+
+    async def _keep_warm_loop(self, warm_up: bool, interval: float):
+        """Aquece o modelo assim que o Ollama estiver pronto e depois o mantém carregado."""
+        if warm_up:
+            while not ((self.is_ready or await self.check_connection()) and await self.warm_up()):
+                await asyncio.sleep(settings.OLLAMA_HEALTHCHECK_INTERVAL_SECONDS)
+        while interval > 0:
+            await asyncio.sleep(interval)
+            # Com gerações em andamento o keep_alive já é renovado por elas.
+            if self.is_ready and self.scheduler.stats()["active"] == 0:
+                await self.keep_model_loaded()
+
+    async def start(self, warm_up: bool = False):
+        """
+        Inicia a sonda de prontidão em segundo plano (chamado no lifespan da aplicação) e,
+        opcionalmente, o aquecimento do modelo seguido do ping que o mantém carregado
+        (a cada OLLAMA_KEEP_WARM_INTERVAL_SECONDS). Com o motor "crew", o CrewAI é
+        importado em uma thread, sem atrasar o início do atendimento.
+        """
+        if self._import_task is None and self.engine == "crew":
+            self._import_task = asyncio.create_task(asyncio.to_thread(load_crewai))
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(
+                self._readiness_probe_loop(settings.OLLAMA_HEALTHCHECK_INTERVAL_SECONDS)
+            )
+        interval = settings.OLLAMA_KEEP_WARM_INTERVAL_SECONDS
+        if self._warm_task is None and (warm_up or interval > 0):
+            self._warm_task = asyncio.create_task(self._keep_warm_loop(warm_up, interval))
+
+    async def stop(self):
+        """Cancela as tarefas em segundo plano do agente."""
+        for task in (self._probe_task, self._warm_task, self._import_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"Falha ao importar o CrewAI em segundo plano: {str(e)}")
+        self._probe_task = None
+        self._warm_task = None
+        self._import_task = None
+        self.scheduler.shutdown()
+
     async def generate_recommendations(self, user_model: UserModel, user_products_info: str) -> List[Recommendation]:
         """
-        Gera recomendações de produtos personalizadas para o usuário usando CrewAI e Ollama.
+        Gera recomendações de produtos personalizadas para o usuário usando Ollama,
+        via CrewAI ou chamada direta ao LLM, conforme `settings.RECOMMENDATION_ENGINE`.
 
         Args:
             user_model: Objeto UserModel contendo informações do usuário (do DB).
@@ -46,106 +451,332 @@ class RecommendationAgent:
         Returns:
             Lista de recomendações de produtos
         """
+        return (await self.generate(user_model, user_products_info)).recommendations
+
+    async def generate(self, user_model: UserModel, user_products_info: str) -> RecommendationResult:
+        """
+        Como `generate_recommendations`, mas indica se o resultado é de fallback (`degraded`).
+
+        Resultados são servidos do cache enquanto o histórico do usuário não mudar, e
+        chamadas concorrentes para o mesmo usuário e histórico compartilham uma única execução.
+        """
+        version = self.cache_version
+        if self.cache is not None:
+            cached = self.cache.get(user_model.id, user_products_info, version)
+            if cached is not None:
+                return RecommendationResult(recommendations=cached)
+
+        key = (user_model.id, history_fingerprint(user_products_info, version))
+        return await self._single_flight.do(
+            key, lambda: self._generate_and_cache(user_model, user_products_info, version)
+        )
+
+    async def stream_recommendations(self, user_model: UserModel, user_products_info: str) -> AsyncIterator[Recommendation]:
+        """
+        Gera as recomendações em streaming, emitindo cada uma assim que sua linha termina.
+
+        Usa sempre a chamada direta ao LLM (o CrewAI não expõe o fluxo de tokens). Se o
+        fluxo terminar com menos de 3 recomendações válidas, completa com fallbacks; com o
+        disjuntor aberto, emite na hora as recomendações sem LLM (`fast_recommendations`).
+        """
+        version = self.cache_version
+        if self.cache is not None:
+            cached = self.cache.get(user_model.id, user_products_info, version)
+            if cached is not None:
+                for recommendation in cached:
+                    yield recommendation
+                return
+
+        if self.breaker is not None and not self.breaker.allow():
+            RECOMMENDATION_GENERATIONS.inc(engine="stream", outcome="short_circuited")
+            for recommendation in self.fast_recommendations(user_model):
+                yield recommendation
+            return
+
+        candidates = await self._retrieve_candidates(user_model)
+        candidate_ids = {c.product_id for c in candidates}
+        messages = PROMPTS[self.prompt_variant, False].format_messages(**_prompt_variables(user_model, user_products_info, candidates))
+        parser = RecommendationStreamParser()
+        recommendations: List[Recommendation] = []
+        failed = False
+
+        def accept(recommendation: Recommendation) -> bool:
+            if candidate_ids and recommendation.product_id not in candidate_ids:
+                return False
+            if any(r.product_id == recommendation.product_id for r in recommendations):
+                return False
+            recommendations.append(recommendation)
+            return True
+
+        success = None
         try:
+            async with self.scheduler.slot():
+                try:
+                    async with self.pool.lease() as backend, aclosing(_stream_with_timeout(backend.llm.astream(messages), "stream")) as stream:
+                        async for chunk in stream:
+                            for recommendation in parser.feed(chunk.content):
+                                if len(recommendations) < 3 and accept(recommendation):
+                                    yield recommendation
+                            if len(recommendations) >= 3:
+                                break
+                        else:
+                            for recommendation in parser.close():
+                                if len(recommendations) < 3 and accept(recommendation):
+                                    yield recommendation
+                except Exception as e:
+                    failed = True
+                    logger.error(f"Erro no streaming de recomendações para {user_model.username}: {str(e)}", exc_info=True)
+            success = not failed
+        finally:
+            # Sem resultado (fila cheia ou cliente desconectado), apenas libera o disjuntor.
+            if self.breaker is not None:
+                self.breaker.record(success)
+
+        if len(recommendations) < 3:
+            logger.warning(f"Apenas {len(recommendations)} recomendações válidas foram emitidas no streaming. Completando.")
+            emitted = len(recommendations)
+            completed = self._fill_with_fallbacks(self._ground_in_candidates(list(recommendations), candidates))
+            for recommendation in completed[emitted:]:
+                yield recommendation
+        elif not failed and self.cache is not None:
+            self.cache.set(user_model.id, user_products_info, version, recommendations)
+
+    @property
+    def circuit_open(self) -> bool:
+        """O disjuntor está aberto: as gerações são respondidas na hora com o resultado degradado."""
+        return self.breaker is not None and self.breaker.state == "open"
+
+    async def _generate_and_cache(self, user_model: UserModel, user_products_info: str, version: str) -> RecommendationResult:
+        if self.breaker is not None and not self.breaker.allow():
+            RECOMMENDATION_GENERATIONS.inc(engine=self.engine, outcome="short_circuited")
+            return RecommendationResult(recommendations=self.fast_recommendations(user_model), degraded=True)
+
+        success = None
+        try:
+            recommendations = await self._run_engine(user_model, user_products_info)
+            success = True
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            success = False
+            logger.error(f"Erro ao gerar recomendações para {user_model.username}: {str(e)}", exc_info=True)
+            RECOMMENDATION_GENERATIONS.inc(engine=self.engine, outcome="degraded")
+            return RecommendationResult(recommendations=self.fast_recommendations(user_model), degraded=True)
+        finally:
+            if self.breaker is not None:
+                self.breaker.record(success)
+
+        RECOMMENDATION_GENERATIONS.inc(engine=self.engine, outcome="ok")
+        if self.cache is not None:
+            self.cache.set(user_model.id, user_products_info, version, recommendations)
+        return RecommendationResult(recommendations=recommendations)
+
+    async def _run_engine(self, user_model: UserModel, user_products_info: str) -> List[Recommendation]:
+        candidates = await self._retrieve_candidates(user_model)
+        if self.engine == "direct":
+            recommendations = await self._run_direct(user_model, user_products_info, candidates)
+        else:
+            recommendations = await self._run_crew(user_model, user_products_info, candidates)
+        return self._complete_with_fallbacks(recommendations, candidates)
+
+    async def _retrieve_candidates(self, user_model: UserModel) -> List[Candidate]:
+        """
+        Produtos do catálogo mais similares ao histórico do usuário (vazio se a recuperação
+        estiver desativada). A busca percorre o catálogo inteiro, então roda em uma thread
+        para não bloquear o event loop.
+        """
+        if not settings.RETRIEVAL_ENABLED:
+            return []
+        # Um produto visto e comprado aparece duas vezes no histórico.
+        history_ids = list(dict.fromkeys(p.id for p in user_history(user_model)))
+        return await asyncio.to_thread(get_product_index().candidates_for_history, history_ids, settings.RETRIEVAL_TOP_K)
+
+    def _ground_in_candidates(self, recommendations: List[Recommendation], candidates: List[Candidate]) -> List[Recommendation]:
+        """
+        Mantém apenas recomendações com IDs reais entre os candidatos e completa a lista
+        (até 3 itens) com os candidatos mais similares. Sem candidatos, devolve a lista como veio.
+        """
+        if not candidates:
+            return recommendations[:3]
+
+        candidate_ids = {c.product_id for c in candidates}
+        grounded: List[Recommendation] = []
+        for recommendation in recommendations:
+            if recommendation.product_id in candidate_ids and all(r.product_id != recommendation.product_id for r in grounded):
+                grounded.append(recommendation)
+        for candidate in candidates:
+            if len(grounded) >= 3:
+                break
+            if all(r.product_id != candidate.product_id for r in grounded):
+                grounded.append(Recommendation(
+                    product_id=candidate.product_id,
+                    product_name=candidate.name,
+                    reason="Semelhante aos produtos do seu histórico."
+                ))
+        return grounded
+
+    async def _run_crew(self, user_model: UserModel, user_products_info: str, candidates: List[Candidate] = ()) -> List[Recommendation]:
+        """
+        Executa o CrewAI para o usuário e analisa o resultado. O kickoff roda em uma thread
+        e não pode ser cancelado, então usa uma única instância do pool, sem hedge.
+        """
+        Agent, Task, Crew = _lazy("Agent"), _lazy("Task"), _lazy("Crew")
+
+        async with self.scheduler.slot(), self.pool.lease() as backend:
             recommendation_agent = Agent(
-                role='Especialista em Recomendação de Produtos',
-                goal='Fornecer recomendações de produtos personalizadas e relevantes baseadas no perfil e histórico do usuário',
-                backstory=(
-                    'Você é um especialista em análise de comportamento do usuário e histórico de compras/interações '
-                    'para gerar recomendações de produtos altamente relevantes. Use as informações do usuário e '
-                    'seu histórico de produtos para criar as melhores sugestões.'
-                ),
+                role=AGENT_ROLE,
+                goal=AGENT_GOAL,
+                backstory=AGENT_BACKSTORY,
                 allow_delegation=False, 
-                llm=self.ollama_llm_instance,
-                verbose=True 
+                llm=backend.llm,
+                verbose=settings.AGENT_VERBOSE
             )
 
             recommendation_task = Task(
-                description=f'''Analise cuidadosamente o usuário {user_model.username} (ID: {user_model.id}, Email: {user_model.email}).
-                O histórico de produtos do usuário é: {user_products_info}.
-                
-                **Seu objetivo é gerar EXATAMENTE 3 (três) recomendações de produtos únicas, personalizadas e variadas que o usuário provavelmente se interessaria, baseando-se no histórico fornecido.**
-
-                **FORMATO DE SAÍDA OBRIGATÓRIO (MUITO IMPORTANTE):**
-                Cada recomendação DEVE ser uma linha separada e formatada EXATAMENTE assim:
-                `Product ID: <um número inteiro único>, Name: <o nome do produto>, Reason: <a razão detalhada para a recomendação>`
-
-                **REGRAS RÍGIDAS DE FORMATAÇÃO:**
-                1.  NÃO INCLUA NENHUM TEXTO INTRODUTÓRIO OU CONCLUSIVO. APENAS AS 3 LINHAS FORMATADAS.
-                2.  Garanta que cada `Product ID` seja um número inteiro.
-                3.  O `Name` e `Reason` podem conter qualquer texto, mas devem estar na mesma linha que "Product ID".
-
-                **EXEMPLO DE SAÍDA PERFEITA (SIGA ESTE FORMATO EXATAMENTE):**
-                Product ID: 101, Name: Tênis de Corrida Leve, Reason: Ideal para iniciantes, com bom amortecimento para corridas diárias.
-                Product ID: 102, Name: Livro "A Arte de Persuadir", Reason: Útil para desenvolvimento profissional e habilidades de comunicação.
-                Product ID: 103, Name: Cafeteira Expresso Compacta, Reason: Perfeita para amantes de café que buscam praticidade e qualidade.
-                ''',
+                description=TASK_TEMPLATES[self.prompt_variant].format(**_prompt_variables(user_model, user_products_info, candidates)),
                 agent=recommendation_agent,
-                expected_output='''Lista de 3 recomendações formatadas exatamente como:
-                Product ID: <id>, Name: <nome>, Reason: <razão>
-                '''
+                expected_output=TASK_EXPECTED_OUTPUT
             )
 
             crew = Crew(
                 agents=[recommendation_agent],
                 tasks=[recommendation_task],
-                verbose=True 
+                verbose=settings.AGENT_VERBOSE
             )
 
-            
-            result = await asyncio.to_thread(crew.kickoff)
-            logger.info(f"CrewAI kickoff finalizado para o usuário {user_model.username}. Resultado bruto:\n{result}")
+            with LLM_GENERATION_DURATION.time(engine="crew"):
+                result = await _with_timeout(self.scheduler.run_in_executor(crew.kickoff), "crew")
+        logger.debug("CrewAI kickoff finalizado para o usuário %s. Resultado bruto:\n%s", user_model.username, result)
 
-            return self._parse_crew_result(result)
+        usage = getattr(result, "token_usage", None)
+        if usage is not None:
+            self._record_usage("crew", usage.prompt_tokens, usage.completion_tokens)
+        with LLM_PARSE_DURATION.time(engine="crew"):
+            return self._parse_crew_result(str(result))
 
-        except Exception as e:
-            logger.error(f"Erro ao gerar recomendações para {user_model.username}: {str(e)}", exc_info=True)
-            return self._get_fallback_recommendations()
+    async def _run_direct(self, user_model: UserModel, user_products_info: str, candidates: List[Candidate] = ()) -> List[Recommendation]:
+        """Gera as recomendações com uma única chamada assíncrona ao ChatOllama, sem CrewAI."""
+        if self.output_format != "text":
+            return await self._run_structured(user_model, user_products_info, candidates)
+        messages = PROMPTS[self.prompt_variant, False].format_messages(**_prompt_variables(user_model, user_products_info, candidates))
 
-    def _parse_crew_result(self, result: str) -> List[Recommendation]:
+        async with self.scheduler.slot():
+            with LLM_GENERATION_DURATION.time(engine="direct"):
+                response = await self.pool.invoke(lambda backend: _with_timeout(backend.llm.ainvoke(messages), "direct"))
+        logger.debug("Geração direta finalizada para o usuário %s. Resultado bruto:\n%s", user_model.username, response.content)
+
+        metadata = response.response_metadata or {}
+        self._record_usage("direct", metadata.get("prompt_eval_count", 0), metadata.get("eval_count", 0))
+        with LLM_PARSE_DURATION.time(engine="direct"):
+            return self._parse_crew_result(response.content)
+
+    async def _run_structured(self, user_model: UserModel, user_products_info: str, candidates: List[Candidate] = ()) -> List[Recommendation]:
         """
-        Analisa o resultado bruto do CrewAI e extrai as recomendações.
-        Este parser é mais robusto para lidar com pequenas variações do LLM.
+        Gera as recomendações em JSON (`format=json` do Ollama ou o esquema de `RecommendationList`)
+        e valida com Pydantic. Saídas inválidas são devolvidas ao modelo para correção, no máximo
+        STRUCTURED_OUTPUT_REPAIR_ATTEMPTS vezes, no mesmo slot do LLM; esgotadas as tentativas,
+        o texto é analisado pelo parser de linhas.
         """
-        recommendations = []
-
-        pattern = re.compile(
-            r"Product ID:\s*(\d+)\s*,\s*Name:\s*(.+?)\s*,\s*Reason:\s*(.+?)\s*(?=\nProduct ID:|\Z|$)",
-            re.DOTALL | re.IGNORECASE
-        )
+        messages = PROMPTS[self.prompt_variant, True].format_messages(**_prompt_variables(user_model, user_products_info, candidates))
+        output_format = RecommendationList.model_json_schema() if self.output_format == "schema" else "json"
+        attempts = 1 + max(0, settings.STRUCTURED_OUTPUT_REPAIR_ATTEMPTS)
 
-        try:
-            matches = pattern.finditer(result)
-            for match in matches:
+        async with self.scheduler.slot():
+            for attempt in range(attempts):
+                with LLM_GENERATION_DURATION.time(engine="direct"):
+                    response = await self.pool.invoke(
+                        lambda backend: _with_timeout(backend.llm.ainvoke(messages, format=output_format), "direct")
+                    )
+                metadata = response.response_metadata or {}
+                self._record_usage("direct", metadata.get("prompt_eval_count", 0), metadata.get("eval_count", 0))
                 try:
-                    product_id = int(match.group(1).strip()) 
-                    product_name = match.group(2).strip()
-                    reason = match.group(3).strip()
-                    recommendations.append(
-                        Recommendation(
-                            product_id=product_id,
-                            product_name=product_name,
-                            reason=reason
-                        )
+                    with LLM_PARSE_DURATION.time(engine="direct"):
+                        recommendations = parse_structured_recommendations(response.content)
+                except ValidationError as e:
+                    logger.info(
+                        "Saída JSON inválida do LLM para %s (tentativa %d de %d): %s",
+                        user_model.username, attempt + 1, attempts, e.errors(include_url=False)[:3],
                     )
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"Falha ao analisar uma recomendação individual do LLM. Trecho: '{match.group(0).strip()}'. Erro: {e}")
+                    messages = messages + [
+                        AIMessage(content=response.content),
+                        HumanMessage(content=REPAIR_MESSAGE.format(error=e.errors(include_url=False)[:3])),
+                    ]
+                    continue
+                LLM_OUTPUT_PARSES.inc(format=self.output_format, outcome="ok" if attempt == 0 else "repaired")
+                return recommendations
+
+        LLM_OUTPUT_PARSES.inc(format=self.output_format, outcome="failed")
+        return parse_recommendations(response.content)
+
+    def _record_usage(self, engine: str, prompt_tokens: int, completion_tokens: int):
+        usage = self.token_usage[engine]
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens or 0
+        usage["completion_tokens"] += completion_tokens or 0
+        LLM_TOKENS.inc(prompt_tokens or 0, engine=engine, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens or 0, engine=engine, kind="completion")
 
+    def _parse_crew_result(self, result: str) -> List[Recommendation]:
+        """
+        Analisa o resultado bruto do LLM e extrai as recomendações (possivelmente menos de 3;
+        ver `_complete_with_fallbacks`). O parser é linha a linha, descarta IDs repetidos e
+        tolera marcadores de lista e markdown.
+        """
+        try:
+            recommendations = parse_recommendations(result)
         except Exception as e:
-            logger.error(f"Erro inesperado ao aplicar regex no resultado do CrewAI: {e}", exc_info=True)
+            logger.error(f"Erro inesperado ao analisar o resultado do LLM: {e}", exc_info=True)
+            recommendations = []
+
+        outcome = "ok" if len(recommendations) >= 3 else "partial" if recommendations else "failed"
+        LLM_OUTPUT_PARSES.inc(format="text", outcome=outcome)
+        return recommendations
+
+    def _complete_with_fallbacks(self, recommendations: List[Recommendation], candidates: List[Candidate] = ()) -> List[Recommendation]:
+        """
+        Fecha a lista final de 3 recomendações a partir da saída do LLM: primeiro a restringe
+        aos candidatos da recuperação (completando com os mais similares), só então recorre
+        aos fallbacks genéricos. As métricas contam a origem dos itens da lista final.
+        """
+        grounded = self._ground_in_candidates(recommendations, candidates)
+        from_llm = sum(1 for r in grounded if any(r is original for original in recommendations))
+        RECOMMENDATION_LINES.inc(from_llm, source="llm")
+        if len(grounded) > from_llm:
+            RECOMMENDATION_LINES.inc(len(grounded) - from_llm, source="candidate")
 
         # Garante que sempre retornamos 3 recomendações, adicionando fallbacks se necessário
-        if len(recommendations) < 3:
-            logger.warning(f"Apenas {len(recommendations)} recomendações válidas foram extraídas do LLM. Adicionando fallbacks.")
-            fallbacks_needed = 3 - len(recommendations)
-            recommendations.extend(self._get_fallback_recommendations()[:fallbacks_needed])
+        if len(grounded) >= 3:
+            return grounded
+        logger.warning(f"Apenas {len(grounded)} recomendações válidas foram extraídas do LLM. Adicionando fallbacks.")
+        completed = self._fill_with_fallbacks(grounded)
+        RECOMMENDATION_LINES.inc(len(completed) - len(grounded), source="fallback")
+        return completed
+
+    def fast_recommendations(self, user_model: UserModel) -> List[Recommendation]:
+        """
+        Recomendações sem LLM: o recomendador rápido pré-computado (co-ocorrência,
+        conteúdo e popularidade), completado com os fallbacks genéricos se necessário.
+        """
+        recommendations: List[Recommendation] = []
+        if settings.FAST_RECOMMENDER_ENABLED:
+            try:
+                recommendations = get_fast_recommender().recommend([p.name for p in user_history(user_model)])
+            except Exception as e:
+                logger.warning(f"Falha no recomendador rápido para {user_model.username}: {str(e)}")
+        return self._fill_with_fallbacks(recommendations)
 
-        # Garante que o resultado final tenha no máximo 3 recomendações
-        return recommendations[:3]
+    def _fill_with_fallbacks(self, recommendations: List[Recommendation]) -> List[Recommendation]:
+        """Completa a lista até 3 itens com os fallbacks genéricos cujo ID ainda não está nela."""
+        if len(recommendations) >= 3:
+            return recommendations[:3]
+        present = {r.product_id for r in recommendations}
+        fallbacks = [r for r in self._get_fallback_recommendations() if r.product_id not in present]
+        return (recommendations + fallbacks)[:3]
 
     def _get_fallback_recommendations(self) -> List[Recommendation]:
         """Retorna recomendações genéricas de fallback."""
         logger.info("Retornando recomendações de fallback.")
+        RECOMMENDATION_FALLBACKS.inc()
         return [
             Recommendation(
                 product_id=901,
@@ -162,4 +793,13 @@ class RecommendationAgent:
                 product_name="Planta Decorativa para Casa (Fácil Cuidado)",
                 reason="Adiciona um toque de natureza ao ambiente e melhora a qualidade do ar, requerendo pouca manutenção."
             )
-        ]
\ No newline at end of file
+        ]
+
+_recommendation_agent: Optional[RecommendationAgent] = None
+
+def get_recommendation_agent() -> RecommendationAgent:
+    """Dependência que retorna a instância única do agente no processo."""
+    global _recommendation_agent
+    if _recommendation_agent is None:
+        _recommendation_agent = RecommendationAgent()
+    return _recommendation_agent
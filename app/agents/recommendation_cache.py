@@ -0,0 +1,175 @@
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+from app.agents.history import history_fingerprint
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import Product
+from app.schemas import Recommendation
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Interface mínima de armazenamento usada pelo `RecommendationCache`."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    def __len__(self) -> int:
+        return 0
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Backend no próprio processo, com TTL e limite LRU de entradas."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._cache.set(key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self._cache.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend compatível com Redis (Redis, KeyDB, Dragonfly, fakeredis...).
+
+    O limite de entradas fica a cargo da política `maxmemory-policy` do servidor.
+    """
+
+    def __init__(self, client: Any = None, url: Optional[str] = None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("O pacote 'redis' é necessário para RECOMMENDATION_CACHE_BACKEND=redis") from e
+            client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._client = client
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._client.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+
+class RecommendationCache:
+    """
+    Cache de resultados de `generate_recommendations`.
+
+    Guarda uma entrada por usuário com a impressão digital do histórico de produtos
+    e da versão do modelo/prompt; uma mudança em qualquer um deles é um miss.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"recommendations:{user_id}"
+
+    def get(self, user_id: int, user_products_info: str, version: str) -> Optional[List[Recommendation]]:
+        entry = None
+        try:
+            entry = self.backend.get(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"Falha ao ler o cache de recomendações: {e}")
+
+        fingerprint = history_fingerprint(user_products_info, version)
+        hit = entry is not None and entry.get("fingerprint") == fingerprint
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not hit:
+            return None
+        return [Recommendation(**r) for r in entry["recommendations"]]
+
+    def set(self, user_id: int, user_products_info: str, version: str, recommendations: List[Recommendation]) -> None:
+        value = {
+            "fingerprint": history_fingerprint(user_products_info, version),
+            "recommendations": [r.model_dump() for r in recommendations],
+        }
+        try:
+            self.backend.set(self._key(user_id), value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar no cache de recomendações: {e}")
+
+    def invalidate_user(self, user_id: int) -> None:
+        try:
+            self.backend.delete(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"Falha ao invalidar o cache de recomendações: {e}")
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses, invalidations = self.hits, self.misses, self.invalidations
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "invalidations": invalidations,
+        }
+
+
+def _build_backend() -> CacheBackend:
+    if settings.RECOMMENDATION_CACHE_BACKEND == "redis":
+        return RedisCacheBackend(url=settings.REDIS_URL)
+    return InMemoryCacheBackend(
+        max_entries=settings.RECOMMENDATION_CACHE_MAX_ENTRIES,
+        ttl=settings.RECOMMENDATION_CACHE_TTL_SECONDS,
+    )
+
+
+_recommendation_cache: Optional[RecommendationCache] = None
+
+def get_recommendation_cache() -> RecommendationCache:
+    """Retorna a instância única do cache de recomendações no processo."""
+    global _recommendation_cache
+    if _recommendation_cache is None:
+        _recommendation_cache = RecommendationCache(_build_backend(), ttl=settings.RECOMMENDATION_CACHE_TTL_SECONDS)
+    return _recommendation_cache
+
+
+@event.listens_for(Product, "after_insert")
+def _invalidate_on_new_product(mapper, connection, target: Product):
+    if target.user_id is not None:
+        get_recommendation_cache().invalidate_user(target.user_id)
@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a o e de da do das dos em no na nos nas um uma uns umas para por com sem que se ao aos "
+    "the and of for with".split()
+)
+
+
+class Candidate(NamedTuple):
+    product_id: int
+    name: str
+    description: str
+    score: float
+
+
+def tokenize(text: str) -> List[str]:
+    normalized = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    # Remove o "s" final de palavras longas: aproximação barata de singular ("livros" -> "livro").
+    return [
+        t[:-1] if len(t) > 3 and t.endswith("s") else t
+        for t in _TOKEN_PATTERN.findall(normalized)
+        if t not in STOPWORDS and len(t) > 1
+    ]
+
+
+class HashingEmbedder:
+    """
+    Embedding local (sem rede) por hashing de termos.
+
+    Unigramas e bigramas são mapeados para `dim` posições com sinal (hashing trick),
+    com TF sublinear e normalização L2, então o produto escalar é a similaridade do cosseno.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        features = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        counts: Dict[str, int] = {}
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in counts.items():
+            index, sign = self._bucket(feature)
+            vector[index] += sign * (1.0 + np.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+def product_text(name: Optional[str], description: Optional[str]) -> str:
+    # O nome pesa mais que a descrição na similaridade.
+    return f"{name or ''} {name or ''} {description or ''}"
+
+
+class ProductIndex:
+    """
+    Índice vetorial em memória do catálogo de produtos.
+
+    Guarda os embeddings em uma matriz NumPy contígua (crescimento por dobra de
+    capacidade) e responde consultas top-K com um único produto matriz-vetor.
+    Suporta inserção/atualização incremental de produtos.
+    """
+
+    def __init__(self, embedder: HashingEmbedder):
+        self.embedder = embedder
+        self._matrix = np.zeros((0, embedder.dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._names: List[str] = []
+        self._descriptions: List[str] = []
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        # Maior ID lido do banco: as atualizações incrementais buscam só os produtos acima dele.
+        self.max_id = 0
+        self.is_ready = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, needed: int) -> None:
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.zeros((new_capacity, self.embedder.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.full(new_capacity, -1, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def upsert(self, product_id: int, name: Optional[str], description: Optional[str]) -> None:
+        vector = self.embedder.embed(product_text(name, description))
+        with self._lock:
+            row = self._rows.get(product_id)
+            if row is None:
+                self._grow(self._size + 1)
+                row = self._size
+                self._rows[product_id] = row
+                self._ids[row] = product_id
+                self._names.append(name or "")
+                self._descriptions.append(description or "")
+                self._size += 1
+            else:
+                self._names[row] = name or ""
+                self._descriptions[row] = description or ""
+            self._matrix[row] = vector
+
+    def upsert_many(self, products: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> None:
+        for product_id, name, description in products:
+            self.upsert(product_id, name, description)
+
+    def build_from_db(self, db: Session, chunk_size: int = 5000, after_id: int = 0) -> int:
+        """
+        Carrega (apenas as colunas necessárias de) o catálogo no índice, a partir de
+        `after_id`; devolve quantos produtos foram lidos.
+        """
+        last_id, loaded = after_id, 0
+        while True:
+            rows = (
+                db.query(Product.id, Product.name, Product.description)
+                .filter(Product.id > last_id)
+                .order_by(Product.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                return loaded
+            self.upsert_many(rows)
+            last_id = rows[-1][0]
+            loaded += len(rows)
+            self.max_id = max(self.max_id, last_id)
+
+    def get(self, product_id: int) -> Optional[Tuple[str, str]]:
+        row = self._rows.get(product_id)
+        return None if row is None else (self._names[row], self._descriptions[row])
+
+    def history_vector(self, product_ids: Sequence[int]) -> Optional[np.ndarray]:
+        """Centroide (normalizado) dos embeddings dos produtos do histórico."""
+        rows = [self._rows[pid] for pid in product_ids if pid in self._rows]
+        if not rows:
+            return None
+        centroid = self._matrix[rows].mean(axis=0)
+        norm = np.linalg.norm(centroid)
+        return centroid / norm if norm > 0 else None
+
+    def search(self, query: np.ndarray, k: int, exclude_ids: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Retorna até `k` pares (product_id, similaridade), do mais para o menos similar."""
+        with self._lock:
+            size = self._size
+            scores = self._matrix[:size] @ query
+            ids = self._ids[:size]
+        # O histórico tem uma linha por interação: o mesmo produto pode vir repetido.
+        excluded = list({self._rows[pid] for pid in exclude_ids if pid in self._rows})
+        if excluded:
+            scores[excluded] = -np.inf
+        k = min(k, size - len(excluded))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def similar_to_history(self, history_ids: Sequence[int], k: int) -> List[Tuple[int, float]]:
+        query = self.history_vector(history_ids)
+        if query is None:
+            return []
+        return self.search(query, k, exclude_ids=history_ids)
+
+    def candidates_for_history(self, history_ids: Sequence[int], k: int) -> List[Candidate]:
+        """Os `k` produtos mais similares ao histórico, com nome e descrição para o prompt."""
+        candidates = []
+        for product_id, score in self.similar_to_history(history_ids, k):
+            name, description = self.get(product_id)
+            candidates.append(Candidate(product_id, name, description, score))
+        return candidates
+
+
+_product_index: Optional[ProductIndex] = None
+
+def get_product_index() -> ProductIndex:
+    """Retorna a instância única do índice de produtos no processo."""
+    global _product_index
+    if _product_index is None:
+        _product_index = ProductIndex(HashingEmbedder(settings.RETRIEVAL_EMBEDDING_DIM))
+    return _product_index
+
+
+def load_product_index(session_factory: Callable[[], Session] = SessionLocal) -> ProductIndex:
+    """
+    Constrói um índice novo com todo o catálogo e o coloca no lugar do atual; as
+    consultas seguem usando o índice anterior até a troca.
+    """
+    global _product_index
+    index = ProductIndex(HashingEmbedder(settings.RETRIEVAL_EMBEDDING_DIM))
+    db = session_factory()
+    try:
+        index.build_from_db(db)
+    finally:
+        db.close()
+    index.is_ready = True
+    _product_index = index
+    return index
+
+
+def refresh_product_index(session_factory: Callable[[], Session] = SessionLocal) -> int:
+    """Adiciona ao índice os produtos gravados (por qualquer processo) desde a última leitura."""
+    index = get_product_index()
+    db = session_factory()
+    try:
+        return index.build_from_db(db, after_id=index.max_id)
+    finally:
+        db.close()
+
+
+class ProductIndexLoader:
+    """
+    Mantém o índice de produtos em dia com o banco.
+
+    As gravações de produtos costumam vir de outros processos (`ingest_data.py`,
+    `populate_db.py`) por INSERTs do Core, que não passam pelo evento do ORM; por isso,
+    a cada RETRIEVAL_REFRESH_SECONDS os produtos com ID acima do maior já lido entram
+    no índice, e a cada RETRIEVAL_REBUILD_SECONDS o índice é reconstruído por inteiro
+    (pegando descrições atualizadas, produtos removidos e IDs confirmados fora de ordem).
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load(self) -> None:
+        try:
+            index = await asyncio.to_thread(load_product_index, self.session_factory)
+            logger.info(f"Índice de produtos carregado: {len(index)} produtos.")
+        except Exception as e:
+            logger.error(f"Falha ao carregar o índice de produtos: {str(e)}", exc_info=True)
+
+    async def _refresh_loop(self, interval: float, rebuild_interval: float, load_first: bool):
+        if load_first:
+            await self._load()
+        loop = asyncio.get_running_loop()
+        rebuilt_at = loop.time()
+        while interval > 0:
+            await asyncio.sleep(interval)
+            try:
+                rebuild_due = rebuild_interval > 0 and loop.time() - rebuilt_at >= rebuild_interval
+                if rebuild_due or not get_product_index().is_ready:
+                    index = await asyncio.to_thread(load_product_index, self.session_factory)
+                    rebuilt_at = loop.time()
+                    logger.info(f"Índice de produtos reconstruído: {len(index)} produtos.")
+                else:
+                    added = await asyncio.to_thread(refresh_product_index, self.session_factory)
+                    if added:
+                        logger.info(f"Índice de produtos atualizado: {added} produtos novos.")
+            except Exception as e:
+                logger.error(f"Falha ao atualizar o índice de produtos: {str(e)}", exc_info=True)
+
+    async def start(self, wait: bool = False):
+        """
+        Carrega o índice e agenda sua atualização periódica. Por padrão (lifespan da
+        aplicação) a carga também roda em segundo plano: até ela terminar as gerações saem
+        sem candidatos, com uma `cache_version` própria (ver `RecommendationAgent`), e
+        por isso são regeradas depois. Com `wait`, aguarda a carga (CLIs de lote).
+        """
+        if self._task is not None:
+            return
+        if wait:
+            await self._load()
+        self._task = asyncio.create_task(
+            self._refresh_loop(settings.RETRIEVAL_REFRESH_SECONDS, settings.RETRIEVAL_REBUILD_SECONDS, load_first=not wait)
+        )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_product_index_loader: Optional[ProductIndexLoader] = None
+
+def get_product_index_loader() -> ProductIndexLoader:
+    """Retorna a instância única do carregador do índice no processo."""
+    global _product_index_loader
+    if _product_index_loader is None:
+        _product_index_loader = ProductIndexLoader()
+    return _product_index_loader
+
+
+# Os eventos do mapper disparam no flush, antes do commit: os produtos ficam pendentes na
+# sessão e só entram no índice depois do commit, para que um rollback não deixe no índice
+# produtos que não existem no banco.
+_PENDING_PRODUCTS = "retrieval_pending_products"
+
+
+@event.listens_for(Product, "after_insert")
+@event.listens_for(Product, "after_update")
+def _collect_product(mapper, connection, target: Product):
+    session = object_session(target)
+    if settings.RETRIEVAL_ENABLED and session is not None:
+        session.info.setdefault(_PENDING_PRODUCTS, {})[target.id] = (target.name, target.description)
+
+
+@event.listens_for(Session, "after_commit")
+def _index_committed_products(session: Session):
+    pending = session.info.pop(_PENDING_PRODUCTS, None)
+    if pending:
+        get_product_index().upsert_many((pid, name, description) for pid, (name, description) in pending.items())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_products(session: Session):
+    session.info.pop(_PENDING_PRODUCTS, None)
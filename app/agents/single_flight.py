@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplica chamadas assíncronas concorrentes com a mesma chave.
+
+    A primeira chamada inicia a execução como uma `asyncio.Task`; as demais com a
+    mesma chave aguardam a mesma tarefa. Cada chamador aguarda através de
+    `asyncio.shield`, então o cancelamento de um chamador (ex.: cliente desconectou)
+    não cancela a execução compartilhada dos outros.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Execução compartilhada para a chave {key!r} terminou com erro: {task.exception()!r}")
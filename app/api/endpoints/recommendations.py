@@ -1,29 +1,174 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload 
-from typing import List
-from app.schemas import User, Recommendation
+import json
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Literal
+from app.schemas import User, Recommendation, BatchRecommendationRequest
 from app.database import get_db
-from app.core.security import get_current_user
-from app.agents.recommendation_agent import RecommendationAgent
+from app.core.config import settings
+from app.core.security import get_current_user, get_current_admin_user
+from app.agents.recommendation_agent import RecommendationAgent, get_recommendation_agent
+from app.agents.batch import generate_batch, load_users_with_products
+from app.agents.history import format_user_products_info, history_fingerprint, load_recent_history, user_history
+from app.agents.precompute import (
+    get_stored_recommendations,
+    is_stale,
+    refresh_user_recommendations,
+    store_recommendations,
+    to_recommendations,
+)
+from app.agents.llm_scheduler import LLMOverloadedError
 from app.models import User as UserModel 
 
 router = APIRouter()
 
+# Cabeçalho que sinaliza respostas degradadas (sem o LLM), mantendo o corpo no mesmo formato.
+DEGRADED_HEADER = "X-Recommendation-Degraded"
+
+async def _get_user_with_products(db: AsyncSession, user_id: int) -> UserModel:
+    result = await db.execute(select(UserModel).where(UserModel.id == user_id))
+    user = result.scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found in database.")
+    user.recent_history = await db.run_sync(load_recent_history, user.id)
+    return user
+
+def _encode_stream_item(recommendation: Recommendation, format: str) -> str:
+    payload = json.dumps(recommendation.model_dump(), ensure_ascii=False)
+    return f"data: {payload}\n\n" if format == "sse" else f"{payload}\n"
+
 @router.get("/recommendations/", response_model=List[Recommendation])
 async def get_recommendations(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    mode: Literal["llm", "fast"] = Query("llm"),
     current_user_schema: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    agent: RecommendationAgent = Depends(get_recommendation_agent)
 ):
+    """
+    Retorna as recomendações do usuário.
+
+    Com `RECOMMENDATION_STORE_ENABLED`, serve a tabela `recommendations` e, se as linhas
+    estiverem desatualizadas, agenda a regeração em segundo plano; o LLM só é chamado
+    durante a requisição quando o usuário ainda não tem recomendações gravadas.
+
+    Com `mode=fast`, responde apenas com o recomendador pré-computado, sem o LLM.
+    Respostas de fallback (LLM com erro, tempo esgotado ou disjuntor aberto) trazem o
+    cabeçalho `X-Recommendation-Degraded: true`.
+    """
     try:
-        user_from_db = db.query(UserModel).options(joinedload(UserModel.products)).filter(UserModel.id == current_user_schema.id).first()
-        if not user_from_db:
-            raise HTTPException(status_code=404, detail="User not found in database.")
+        user_from_db = await _get_user_with_products(db, current_user_schema.id)
+
+        if mode == "fast":
+            return agent.fast_recommendations(user_from_db)
 
-        user_products_info = ", ".join([p.name for p in user_from_db.products]) if user_from_db.products else "nenhum histórico de produtos relevante"
+        user_products_info = format_user_products_info(user_history(user_from_db))
 
-        agent = RecommendationAgent()
+        if not settings.RECOMMENDATION_STORE_ENABLED:
+            result = await agent.generate(user_from_db, user_products_info)
+            if result.degraded:
+                response.headers[DEGRADED_HEADER] = "true"
+            return result.recommendations
 
-        recommendations = await agent.generate_recommendations(user_from_db, user_products_info)
-        return recommendations
+        version = agent.cache_version
+        fingerprint = history_fingerprint(user_products_info, version)
+        stored = await db.run_sync(get_stored_recommendations, user_from_db.id)
+        if stored:
+            if is_stale(stored, fingerprint, version):
+                background_tasks.add_task(refresh_user_recommendations, agent, user_from_db.id)
+            return to_recommendations(stored)
+
+        result = await agent.generate(user_from_db, user_products_info)
+        if result.degraded:
+            response.headers[DEGRADED_HEADER] = "true"
+        else:
+            await db.run_sync(store_recommendations, user_from_db.id, result.recommendations, fingerprint, version)
+        return result.recommendations
+    except HTTPException:
+        raise
+    except LLMOverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Serviço de recomendação sobrecarregado, tente novamente mais tarde.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
+
+@router.get("/recommendations/stream")
+async def stream_recommendations(
+    format: Literal["ndjson", "sse"] = Query("ndjson"),
+    current_user_schema: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    agent: RecommendationAgent = Depends(get_recommendation_agent)
+):
+    """Emite cada recomendação assim que é gerada, em NDJSON ou Server-Sent Events."""
+    user_from_db = await _get_user_with_products(db, current_user_schema.id)
+
+    user_products_info = format_user_products_info(user_history(user_from_db))
+    # Com o disjuntor aberto, o fluxo é o resultado degradado, emitido sem o LLM.
+    degraded = agent.circuit_open
+    recommendations = agent.stream_recommendations(user_from_db, user_products_info)
+
+    # Obtém a primeira recomendação antes de iniciar a resposta, para ainda poder responder 503.
+    try:
+        first = await recommendations.__anext__()
+    except LLMOverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Serviço de recomendação sobrecarregado, tente novamente mais tarde.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    async def body() -> AsyncIterator[str]:
+        yield _encode_stream_item(first, format)
+        async for recommendation in recommendations:
+            yield _encode_stream_item(recommendation, format)
+        if format == "sse":
+            yield "event: end\ndata: {}\n\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    headers = {DEGRADED_HEADER: "true"} if degraded else None
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+@router.post("/recommendations/batch")
+async def batch_recommendations(
+    request: BatchRecommendationRequest,
+    admin_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db),
+    agent: RecommendationAgent = Depends(get_recommendation_agent)
+):
+    """Gera recomendações para vários usuários e emite cada resultado (NDJSON) assim que fica pronto."""
+    users = await db.run_sync(
+        lambda session: load_users_with_products(
+            session, user_ids=request.user_ids, start_id=request.start_id, end_id=request.end_id
+        )
+    )
+
+    async def body() -> AsyncIterator[str]:
+        async for result in generate_batch(agent, users):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@router.get("/recommendations/cache/stats")
+async def get_recommendation_cache_stats(
+    current_user_schema: User = Depends(get_current_user),
+    agent: RecommendationAgent = Depends(get_recommendation_agent)
+):
+    if agent.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **agent.cache.stats()}
+
+@router.get("/recommendations/scheduler/stats")
+async def get_llm_scheduler_stats(
+    current_user_schema: User = Depends(get_current_user),
+    agent: RecommendationAgent = Depends(get_recommendation_agent)
+):
+    return {
+        **agent.scheduler.stats(),
+        "ollama": agent.pool.stats(),
+        "circuit_breaker": agent.breaker.stats() if agent.breaker is not None else {"enabled": False},
+    }
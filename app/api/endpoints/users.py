@@ -1,18 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.schemas import UserCreate, User
 from app.models import User as UserModel
-from app.core.security import get_password_hash, create_access_token, get_current_user
+from app.core.security import hash_password, create_access_token, get_current_user, invalidate_cached_user
 
 router = APIRouter()
 
 @router.post("/users/", response_model=User)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = UserModel(username=user.username, email=user.email, hashed_password=get_password_hash(user.password))
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = UserModel(username=user.username, email=user.email, hashed_password=await hash_password(user.password))
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_cached_user(db_user.username)
     return db_user
 
 @router.get("/users/me/", response_model=User)
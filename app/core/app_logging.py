@@ -1,27 +1,140 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
-from app.core.config import settings 
+from typing import Dict, Optional
+from app.core.config import settings
+
+# Atributos padrão de um LogRecord; o restante veio de `extra=` e vai para o JSON.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+SENSITIVE_KEYS = frozenset({"password", "hashed_password", "token", "access_token", "secret", "secret_key", "authorization"})
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como uma linha JSON, incluindo os campos passados em `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Mantém apenas uma fração dos registros abaixo de WARNING, por prefixo de logger.
+
+    `rates` mapeia prefixos de nome de logger para a fração mantida (0.0 a 1.0); vale
+    o prefixo mais longo. Avisos e erros nunca são descartados.
+    """
+
+    def __init__(self, rates: Dict[str, float], rng: random.Random = None):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self._random = (rng or random.Random()).random
+
+    def _rate(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        return self._random() < self._rate(record.name)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Enfileira uma cópia do registro com a mensagem resolvida e os campos sensíveis
+    (senhas, hashes, tokens passados em `extra=`) mascarados; a formatação e a
+    escrita acontecem na thread do `QueueListener`.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        for key in SENSITIVE_KEYS & set(vars(record)):
+            setattr(record, key, "***")
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
 
 def setup_logging():
+    global _listener, _queue_handler
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO) 
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
 
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if _listener is not None:
+        return
+
+    formatter = _build_formatter()
 
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+    handlers = [stream_handler]
 
     if not settings.TESTING:
         try:
-            
+
             log_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "logs")
-            os.makedirs(log_directory, exist_ok=True) 
+            os.makedirs(log_directory, exist_ok=True)
             log_file_path = os.path.join(log_directory, 'app.log')
 
             file_handler = RotatingFileHandler(log_file_path, maxBytes=10000000, backupCount=5)
             file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
         except Exception as e:
-            logger.error(f"Failed to set up file logging: {e}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Failed to set up file logging: {e}", exc_info=True)
+
+    # A requisição só enfileira o registro; a E/S acontece na thread do listener.
+    queue_handler = _NonBlockingQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+    logger.addHandler(queue_handler)
+    _queue_handler = queue_handler
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Esvazia a fila e para a thread de escrita dos logs."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,7 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, SecretStr
 import os
-from typing import Optional
+from typing import Dict, List, Literal, Optional, Union
 
 class Settings(BaseSettings):
     DATABASE_URL: str = Field(
@@ -24,11 +24,306 @@ class Settings(BaseSettings):
         description="Token expiration time in minutes"
     )
     
+    PASSWORD_HASH_ROUNDS: int = Field(
+        default=29000,
+        description="PBKDF2-SHA256 iterations; stored hashes with a different cost are rehashed on login"
+    )
+
+    PASSWORD_HASH_MAX_CONCURRENCY: int = Field(
+        default=4,
+        description="Maximum password hashes/verifications running at once (worker threads)"
+    )
+
+    AUTH_CACHE_ENABLED: bool = Field(
+        default=True,
+        description="Cache verified JWT payloads and the authenticated user projection"
+    )
+
+    AUTH_CACHE_TTL_SECONDS: float = Field(
+        default=60.0,
+        description="Maximum time a cached token or user is reused (never past the token's exp)"
+    )
+
+    AUTH_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Maximum number of tokens and users kept in each authentication cache (LRU)"
+    )
+
     OLLAMA_BASE_URL: str = Field(
         default="http://mock-ollama:11434",
-        description="Ollama server base URL"
+        description="Ollama server base URL, or a comma-separated list of URLs to spread generations across several instances"
+    )
+
+    OLLAMA_BACKEND_FAILURE_THRESHOLD: int = Field(
+        default=3,
+        description="Consecutive generation failures that eject an Ollama instance from the pool"
+    )
+
+    OLLAMA_BACKEND_EJECTION_SECONDS: float = Field(
+        default=30.0,
+        description="How long an ejected Ollama instance receives no generations before being tried again"
+    )
+
+    OLLAMA_HEDGE_ENABLED: bool = Field(
+        default=False,
+        description="Repeat a slow direct generation on a second Ollama instance and keep the first answer (needs 2+ instances)"
+    )
+
+    OLLAMA_HEDGE_PERCENTILE: float = Field(
+        default=95.0,
+        description="Latency percentile of recent generations after which a generation is hedged"
+    )
+
+    OLLAMA_HEDGE_MIN_DELAY_SECONDS: float = Field(
+        default=1.0,
+        description="Minimum wait before hedging a generation"
+    )
+
+    OLLAMA_HEALTHCHECK_INTERVAL_SECONDS: float = Field(
+        default=30.0,
+        description="Interval between background Ollama readiness probes"
+    )
+
+    OLLAMA_HEALTHCHECK_TIMEOUT_SECONDS: float = Field(
+        default=5.0,
+        description="Timeout of each Ollama readiness probe"
     )
     
+    OLLAMA_KEEP_ALIVE: Union[int, str] = Field(
+        default="30m",
+        description="How long Ollama keeps the model loaded after each request (Go duration such as '30m', or -1 for forever)"
+    )
+
+    OLLAMA_NUM_CTX: Optional[int] = Field(
+        default=None,
+        description="Context window size in tokens (None = Ollama default)"
+    )
+
+    OLLAMA_NUM_THREAD: Optional[int] = Field(
+        default=None,
+        description="CPU threads used by Ollama for inference (None = Ollama detects; usually the number of physical cores)"
+    )
+
+    OLLAMA_NUM_PREDICT: Optional[int] = Field(
+        default=256,
+        description="Maximum tokens generated per call; bounds rambling outputs (None = Ollama default)"
+    )
+
+    OLLAMA_WARMUP_ON_STARTUP: bool = Field(
+        default=True,
+        description="Load the model and evaluate the static prompt prefix in the background at startup"
+    )
+
+    OLLAMA_KEEP_WARM_INTERVAL_SECONDS: float = Field(
+        default=600.0,
+        description="Interval of the background ping that keeps the model loaded (0 disables; keep it below OLLAMA_KEEP_ALIVE)"
+    )
+
+    OLLAMA_WARMUP_TIMEOUT_SECONDS: float = Field(
+        default=300.0,
+        description="Timeout of the model load request, which may read the whole model from disk"
+    )
+
+    RECOMMENDATION_ENGINE: Literal["crew", "direct"] = Field(
+        default="crew",
+        description="Generation engine: full CrewAI Agent/Task/Crew or a single direct ChatOllama call"
+    )
+
+    RECOMMENDATION_OUTPUT_FORMAT: Literal["text", "json", "schema"] = Field(
+        default="text",
+        description="Output of the direct engine: 'Product ID:' lines, Ollama JSON mode (format=json) or JSON constrained to the RecommendationList schema"
+    )
+
+    STRUCTURED_OUTPUT_REPAIR_ATTEMPTS: int = Field(
+        default=1,
+        description="Extra LLM calls asking the model to fix invalid JSON before falling back to the line parser"
+    )
+
+    RECOMMENDATION_PROMPT_VARIANT: Literal["full", "compact"] = Field(
+        default="full",
+        description="Task prompt: the full instruction block with examples or a compact version with fewer prompt tokens"
+    )
+
+    HISTORY_RECENT_LIMIT: int = Field(
+        default=100,
+        description="Most recent interactions loaded per user from user_product_interactions (keyset-paginated, newest first)"
+    )
+
+    HISTORY_MAX_ITEMS: int = Field(
+        default=30,
+        description="Maximum number of history products put in the prompt (0 = no limit)"
+    )
+
+    HISTORY_TOKEN_BUDGET: int = Field(
+        default=256,
+        description="Estimated token budget of the history section of the prompt (0 = no limit)"
+    )
+
+    RETRIEVAL_ENABLED: bool = Field(
+        default=True,
+        description="Ground generation on the top-K catalog products most similar to the user's history"
+    )
+
+    RETRIEVAL_TOP_K: int = Field(
+        default=10,
+        description="Number of catalog candidates given to the LLM"
+    )
+
+    RETRIEVAL_EMBEDDING_DIM: int = Field(
+        default=256,
+        description="Dimension of the local hashed product embeddings"
+    )
+
+    RETRIEVAL_REFRESH_SECONDS: float = Field(
+        default=60.0,
+        description="Interval between incremental loads of new products (by ID) into the retrieval index (0 = never)"
+    )
+
+    RETRIEVAL_REBUILD_SECONDS: float = Field(
+        default=3600.0,
+        description="Interval between full rebuilds of the retrieval index, picking up edited and deleted products (0 = never)"
+    )
+
+    FAST_RECOMMENDER_ENABLED: bool = Field(
+        default=True,
+        description="Use the precomputed co-occurrence/popularity/content recommender as the LLM fallback tier"
+    )
+
+    FAST_RECOMMENDER_REFRESH_SECONDS: float = Field(
+        default=900.0,
+        description="Interval between rebuilds of the fast recommender model"
+    )
+
+    FAST_RECOMMENDER_NEIGHBORS: int = Field(
+        default=20,
+        description="Number of precomputed similar items kept per item by the fast recommender"
+    )
+
+    LLM_CALL_TIMEOUT_SECONDS: float = Field(
+        default=120.0,
+        description="Hard limit for each LLM call (CrewAI kickoff, direct call or whole stream); also the Ollama HTTP timeout (0 = no limit)"
+    )
+
+    CIRCUIT_BREAKER_ENABLED: bool = Field(
+        default=True,
+        description="Wrap LLM generations in a circuit breaker that answers with degraded recommendations while open"
+    )
+
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = Field(
+        default=5,
+        description="Consecutive failed or timed-out LLM generations that open the circuit breaker"
+    )
+
+    CIRCUIT_BREAKER_RESET_SECONDS: float = Field(
+        default=30.0,
+        description="How long the circuit breaker stays open before letting a single trial generation through"
+    )
+
+    LLM_MAX_CONCURRENCY: int = Field(
+        default=1,
+        description="Maximum concurrent LLM generations per Ollama instance (match Ollama's OLLAMA_NUM_PARALLEL)"
+    )
+
+    LLM_MAX_QUEUE_SIZE: int = Field(
+        default=8,
+        description="Maximum number of generations waiting for an LLM slot before rejecting with 503"
+    )
+
+    LLM_QUEUE_TIMEOUT_SECONDS: float = Field(
+        default=30.0,
+        description="Maximum time a generation waits for an LLM slot"
+    )
+
+    BATCH_CONCURRENCY: int = Field(
+        default=2,
+        description="Maximum concurrent generations of a batch recommendation job"
+    )
+
+    BATCH_LOAD_CHUNK_SIZE: int = Field(
+        default=500,
+        description="Number of users loaded per set-based query in batch jobs"
+    )
+
+    ADMIN_USERNAMES: List[str] = Field(
+        default=[],
+        description="Usernames allowed to call admin endpoints"
+    )
+
+    RECOMMENDATION_STORE_ENABLED: bool = Field(
+        default=True,
+        description="Serve recommendations from the precomputed recommendations table"
+    )
+
+    RECOMMENDATION_MAX_AGE_SECONDS: float = Field(
+        default=86400.0,
+        description="Age after which stored recommendations are refreshed even if history did not change"
+    )
+
+    RECOMMENDATION_CACHE_ENABLED: bool = Field(
+        default=True,
+        description="Cache generated recommendations per user history"
+    )
+
+    RECOMMENDATION_CACHE_BACKEND: Literal["memory", "redis"] = Field(
+        default="memory",
+        description="Recommendation cache backend"
+    )
+
+    RECOMMENDATION_CACHE_TTL_SECONDS: float = Field(
+        default=3600.0,
+        description="Time to live of a cached recommendation entry"
+    )
+
+    RECOMMENDATION_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Maximum number of users kept in the in-memory recommendation cache (LRU)"
+    )
+
+    REDIS_URL: str = Field(
+        default="redis://localhost:6379/0",
+        description="Redis-compatible server URL used by the redis cache backend"
+    )
+
+    DB_POOL_SIZE: int = Field(
+        default=10,
+        description="Number of persistent connections kept by the database pool"
+    )
+
+    DB_MAX_OVERFLOW: int = Field(
+        default=20,
+        description="Extra connections the database pool may open above DB_POOL_SIZE under load"
+    )
+
+    LOG_LEVEL: str = Field(
+        default="INFO",
+        description="Root log level"
+    )
+
+    LOG_LEVELS: Dict[str, str] = Field(
+        default={"crewai": "WARNING", "httpx": "WARNING"},
+        description="Per-logger level overrides, e.g. {\"app.agents.recommendation_agent\": \"DEBUG\"}"
+    )
+
+    LOG_FORMAT: Literal["json", "text"] = Field(
+        default="json",
+        description="Log output format"
+    )
+
+    LOG_SAMPLING: Dict[str, float] = Field(
+        default={},
+        description="Fraction of DEBUG/INFO records kept per logger prefix (warnings and errors are always kept)"
+    )
+
+    AGENT_VERBOSE: bool = Field(
+        default=False,
+        description="Run the CrewAI Agent/Crew in verbose mode"
+    )
+
+    DB_CREATE_TABLES_ON_STARTUP: bool = Field(
+        default=True,
+        description="Create missing tables when each worker starts (one table-listing query when the schema exists); disable when the schema is managed with 'alembic upgrade head'"
+    )
+
     DB_ECHO_LOGS: bool = Field(
         default=False,
         description="Enable SQLAlchemy logs"
@@ -0,0 +1,225 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Base das métricas: nome, ajuda, rótulos e valores por combinação de rótulos."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera os rótulos {self.labelnames}, recebeu {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type_name}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Metric):
+    """Valor instantâneo; pode ser lido de uma função no momento da coleta (`set_function`)."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def value(self) -> float:
+        return float(self._function()) if self._function is not None else self._value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.value())}"]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[index] += 1
+            totals[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        item = self._values.get(self._key(labels))
+        return sum(item[0]) if item else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), totals[0])) for key, (counts, totals) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas do processo, exportado no formato de texto do Prometheus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica já registrada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = MetricsRegistry()
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota", ("method", "route", "status")
+)
+DB_QUERY_DURATION = REGISTRY.histogram(
+    "db_query_duration_seconds", "Tempo de execução das consultas ao banco", ("operation",), buckets=DB_BUCKETS
+)
+LLM_QUEUE_WAIT = REGISTRY.histogram(
+    "llm_queue_wait_seconds", "Tempo de espera por um slot do LLM"
+)
+LLM_GENERATION_DURATION = REGISTRY.histogram(
+    "llm_generation_seconds", "Tempo de geração do LLM (kickoff do CrewAI ou chamada direta)", ("engine",)
+)
+LLM_PARSE_DURATION = REGISTRY.histogram(
+    "llm_parse_seconds", "Tempo de análise da saída do LLM", ("engine",), buckets=DB_BUCKETS
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens consumidos pelo LLM", ("engine", "kind")
+)
+LLM_QUEUE_DEPTH = REGISTRY.gauge("llm_queue_depth", "Gerações aguardando um slot do LLM")
+LLM_ACTIVE = REGISTRY.gauge("llm_active_generations", "Gerações do LLM em execução")
+RECOMMENDATION_GENERATIONS = REGISTRY.counter(
+    "recommendation_generations_total", "Gerações de recomendações por resultado", ("engine", "outcome")
+)
+RECOMMENDATION_LINES = REGISTRY.counter(
+    "recommendation_parsed_lines_total", "Recomendações da lista final por origem (llm, candidate, fallback)", ("source",)
+)
+LLM_OUTPUT_PARSES = REGISTRY.counter(
+    "llm_output_parses_total", "Análises da saída do LLM por formato e resultado (ok, repaired, partial, failed)", ("format", "outcome")
+)
+RECOMMENDATION_FALLBACKS = REGISTRY.counter(
+    "recommendation_fallbacks_total", "Vezes em que as recomendações genéricas de fallback foram usadas"
+)
+LLM_BACKEND_REQUESTS = REGISTRY.counter(
+    "llm_backend_requests_total", "Gerações por instância do Ollama e resultado (ok, error)", ("backend", "outcome")
+)
+LLM_BACKEND_EJECTIONS = REGISTRY.counter(
+    "llm_backend_ejections_total", "Afastamentos de instâncias do Ollama por motivo (failures, probe)", ("backend", "reason")
+)
+LLM_HEDGED_REQUESTS = REGISTRY.counter(
+    "llm_hedged_requests_total", "Gerações repetidas em uma segunda instância, pela resposta que venceu (primary, hedge)", ("winner",)
+)
+LLM_CALL_TIMEOUTS = REGISTRY.counter(
+    "llm_call_timeouts_total", "Chamadas ao LLM interrompidas por LLM_CALL_TIMEOUT_SECONDS", ("engine",)
+)
+LLM_CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "llm_circuit_breaker_transitions_total", "Transições de estado do disjuntor do LLM", ("from_state", "to_state")
+)
+LLM_CIRCUIT_STATE = REGISTRY.gauge(
+    "llm_circuit_breaker_state", "Estado do disjuntor do LLM (0 = fechado, 1 = meio-aberto, 2 = aberto)"
+)
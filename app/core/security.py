@@ -1,26 +1,78 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone 
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.models import User as UserModel
+from app.schemas import User
+from app.core.cache import TTLCache
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# min/max iguais ao custo configurado: hashes com outro custo são regerados no próximo login.
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__rounds=settings.PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=settings.PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/token")
 
+# Token bruto -> payload já verificado, e username -> projeção do usuário.
+# As entradas nunca sobrevivem ao `exp` do token que as gerou.
+_token_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_ENTRIES, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+_user_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_ENTRIES, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
 def verify_password(plain_password, hashed_password):
-    print(f"DEBUG_VERIFY: plain_password='{plain_password}', hashed_password='{hashed_password}'") 
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    print(f"DEBUG_HASH: password='{password}'") 
     return pwd_context.hash(password)
 
+# O PBKDF2 do hashlib libera o GIL, então um pool de threads executa os hashes em paralelo
+# sem bloquear o event loop; `max_workers` limita quantos rodam ao mesmo tempo.
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_MAX_CONCURRENCY, thread_name_prefix="password-hash"
+        )
+    return _hash_executor
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+async def hash_password(password: str) -> str:
+    """Versão assíncrona de `get_password_hash`, executada no pool de hashing."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica a senha no pool de hashing. Se o hash usa um custo diferente do configurado,
+    retorna também o novo hash a ser gravado.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -28,42 +80,102 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY.get_secret_value(), algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, username: str, password: str):
-    print(f"DEBUG: Tentativa de autenticação para username: '{username}'") 
-    user = db.query(UserModel).filter(UserModel.username == username).first()
-    
+def _cache_ttl(payload: Dict[str, Any]) -> float:
+    exp = payload.get("exp")
+    if exp is None:
+        return settings.AUTH_CACHE_TTL_SECONDS
+    return min(settings.AUTH_CACHE_TTL_SECONDS, exp - time.time())
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Decodifica e verifica o JWT, reaproveitando a verificação enquanto o token for válido."""
+    if settings.AUTH_CACHE_ENABLED:
+        payload = _token_cache.get(token)
+        if payload is not None:
+            return payload
+    payload = jwt.decode(token, settings.SECRET_KEY.get_secret_value(), algorithms=[settings.ALGORITHM])
+    ttl = _cache_ttl(payload)
+    if settings.AUTH_CACHE_ENABLED and ttl > 0:
+        _token_cache.set(token, payload, ttl=ttl)
+    return payload
+
+def invalidate_cached_user(username: Optional[str]) -> None:
+    """Remove o usuário do cache de autenticação (chamar quando for criado ou alterado)."""
+    if username is not None:
+        _user_cache.pop(username)
+
+def clear_auth_caches() -> None:
+    _token_cache.clear()
+    _user_cache.clear()
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[UserModel]:
+    result = await db.execute(select(UserModel).where(UserModel.username == username))
+    return result.scalar_one_or_none()
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user_by_username(db, username)
     if not user:
-        print("DEBUG: Usuário não encontrado.")
+        logger.info("Falha de autenticação: usuário não encontrado.", extra={"username": username})
         return None
-    
-    print(f"DEBUG: Usuário encontrado: '{user.username}'") 
-    print(f"DEBUG: Senha fornecida (plain): '{password}'") 
-    print(f"DEBUG: Senha hasheada no DB: '{user.hashed_password}'") 
-    
-    if not verify_password(password, user.hashed_password):
-        print("DEBUG: Senha incorreta.") 
+
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
+        logger.info("Falha de autenticação: senha incorreta.", extra={"username": username})
         return None
-    
-    print("DEBUG: Senha correta. Autenticação bem-sucedida.")
+
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
+        logger.info("Hash de senha atualizado para o custo configurado.", extra={"username": username})
+
+    logger.debug("Autenticação bem-sucedida.", extra={"username": username})
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(UserModel).filter(UserModel.username == username).first()
-    if user is None:
+
+    if settings.AUTH_CACHE_ENABLED:
+        cached = _user_cache.get(username)
+        if cached is not None:
+            return cached
+
+    user_model = await get_user_by_username(db, username)
+    if user_model is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    user = User.model_validate(user_model)
+    ttl = _cache_ttl(payload)
+    if settings.AUTH_CACHE_ENABLED and ttl > 0:
+        _user_cache.set(username, user, ttl=ttl)
+    return user
+
+async def get_current_admin_user(current_user: User = Depends(get_current_user)):
+    if current_user.username not in settings.ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return current_user
+
+@event.listens_for(UserModel, "before_update")
+def _invalidate_updated_user(mapper, connection, target: UserModel):
+    # O username antigo pode não estar carregado na sessão; lê o valor gravado.
+    previous = connection.execute(select(UserModel.username).where(UserModel.id == target.id)).scalar()
+    invalidate_cached_user(previous)
+    invalidate_cached_user(target.username)
+
+@event.listens_for(UserModel, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target: UserModel):
+    invalidate_cached_user(target.username)
@@ -1,9 +1,19 @@
-from sqlalchemy import create_engine
+import logging
+import time
+from typing import List, Optional
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.core.config import settings
+from app.core.metrics import DB_QUERY_DURATION
 import os
 
+logger = logging.getLogger(__name__)
+
 TESTING = os.getenv("TESTING", "False").lower() in ("true", "1", "t")
 
 if TESTING:
@@ -11,10 +21,47 @@ if TESTING:
 else:
     SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> URL:
+    """Converte a URL síncrona para o driver assíncrono equivalente (asyncpg/aiosqlite)."""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+
+def shared_memory_url(url: str) -> URL:
+    """
+    Cada conexão a `sqlite:///:memory:` abre um banco próprio, então a engine síncrona
+    (que cria o esquema em `ensure_schema`) e a assíncrona (endpoints) veriam bancos
+    diferentes. Troca por um banco em memória de cache compartilhado, visível às duas
+    engines do processo; as demais URLs ficam como estão.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database not in (None, "", ":memory:"):
+        return parsed
+    return parsed.set(database="file:app_memory_db", query={"mode": "memory", "cache": "shared", "uri": "true"})
+
+def _pool_options(url: URL) -> dict:
+    if url.get_backend_name() != "sqlite":
+        return {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+    if url.query.get("mode") == "memory":
+        # Uma conexão fixa por engine mantém o banco em memória vivo; ela é usada por
+        # várias threads (tarefas em `asyncio.to_thread`).
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    return {}
+
+# Engine síncrona: scripts de linha de comando e tarefas executadas em threads.
+SYNC_DATABASE_URL = shared_memory_url(SQLALCHEMY_DATABASE_URL)
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,  
-    echo=settings.DB_ECHO_LOGS 
+    SYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    echo=settings.DB_ECHO_LOGS,
+    **_pool_options(SYNC_DATABASE_URL)
 )
 
 SessionLocal = sessionmaker(
@@ -24,18 +71,78 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+# Engine assíncrona: usada pelos endpoints, sem bloquear o event loop.
+ASYNC_DATABASE_URL = async_database_url(SYNC_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    echo=settings.DB_ECHO_LOGS,
+    **_pool_options(ASYNC_DATABASE_URL)
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+def _statement_operation(statement: str) -> str:
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    return operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+def instrument_engine(sync_engine: Engine) -> None:
+    """Registra o tempo de cada consulta no histograma `db_query_duration_seconds`."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, operation=_statement_operation(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(context):
+        starts = context.connection.info.get("query_start_time") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
+def ensure_schema(bind: Optional[Engine] = None) -> List[str]:
+    """
+    Cria as tabelas ausentes com uma única consulta de verificação (chamado no startup de
+    cada worker, se DB_CREATE_TABLES_ON_STARTUP). Ao contrário de `create_tables`, que
+    verifica tabela por tabela, lista as tabelas existentes uma vez e só emite DDL para
+    as que faltam. Alterações de esquema em bancos existentes ficam com `alembic upgrade head`.
+    """
+    bind = bind or engine
+    with bind.connect() as connection:
+        existing = set(inspect(connection).get_table_names())
+    missing = [table for table in Base.metadata.sorted_tables if table.name not in existing]
+    if not missing:
+        return []
+    try:
+        Base.metadata.create_all(bind=bind, tables=missing, checkfirst=False)
+    except Exception as e:
+        # Outro worker pode ter criado as mesmas tabelas ao mesmo tempo.
+        logger.warning(f"Criação do esquema concorrente ({str(e)}); verificando tabela por tabela.")
+        Base.metadata.create_all(bind=bind, tables=missing)
+    return [table.name for table in missing]
+
 def drop_tables():
     Base.metadata.drop_all(bind=engine)
 
@@ -46,4 +153,4 @@ def get_test_db():
         yield db
     finally:
         transaction.rollback()
-        db.close()
\ No newline at end of file
+        db.close()
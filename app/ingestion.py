@@ -0,0 +1,326 @@
+"""
+Ingestão em massa de usuários e produtos a partir de arquivos CSV ou JSONL.
+
+A entrada é lida em streaming, em blocos de `chunk_size` registros. Para cada bloco,
+uma única consulta por tabela descobre o que já existe; os registros novos são
+inseridos em lote (`COPY` no PostgreSQL, `executemany` nos demais bancos) e os
+existentes são atualizados em lote (`upsert=True`) ou ignorados. Cada bloco é uma
+transação; depois do commit, o número de registros consumidos é gravado no arquivo
+de checkpoint, e uma execução interrompida retoma a partir dele. Reprocessar o
+último bloco após uma queda é seguro, pois a existência é verificada de novo.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import bindparam, select, tuple_, update
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+from app.core.security import get_password_hash
+from app.models import Product, User, UserProductInteraction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+@dataclass
+class IngestionStats:
+    read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+    chunks: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def reject(self, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < 100:
+            self.errors.append(reason)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["rows_per_second"] = self.rows_per_second
+        data["errors"] = self.errors[:20]
+        return data
+
+
+def read_records(path: str, format: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """Lê um arquivo CSV (com cabeçalho) ou JSONL registro a registro, sem carregá-lo inteiro."""
+    format = format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def chunked(records: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Checkpoint:
+    """Quantos registros de uma fonte já foram gravados, persistido em JSON a cada bloco."""
+
+    def __init__(self, path: Optional[str], source: str, kind: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.kind = kind
+        self.offset = 0
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("source") == self.source and data.get("kind") == kind:
+                self.offset = data.get("offset", 0)
+
+    def save(self, offset: int, stats: IngestionStats) -> None:
+        self.offset = offset
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "kind": self.kind, "offset": offset, "stats": stats.to_dict()}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _last_by_key(rows: Iterable[dict], key: Callable[[dict], object]) -> List[dict]:
+    """Remove duplicados dentro do bloco, mantendo a última ocorrência (a mais nova)."""
+    return list({key(row): row for row in rows}.values())
+
+
+def _copy_rows(connection: Connection, table: str, columns: List[str], rows: List[dict]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_rows(connection: Connection, model, columns: List[str], rows: List[dict], use_copy: bool) -> None:
+    if not rows:
+        return
+    if use_copy and connection.dialect.name == "postgresql":
+        _copy_rows(connection, model.__tablename__, columns, rows)
+    else:
+        connection.execute(model.__table__.insert(), [{c: row[c] for c in columns} for row in rows])
+
+
+def _update_rows(connection: Connection, model, columns: List[str], rows: List[dict]) -> None:
+    if not rows:
+        return
+    statement = (
+        update(model.__table__)
+        .where(model.__table__.c.id == bindparam("_id"))
+        .values({c: bindparam(c) for c in columns})
+    )
+    connection.execute(statement, [{"_id": row["_id"], **{c: row[c] for c in columns}} for row in rows])
+
+
+def _owner_id(value) -> Optional[int]:
+    """`user_id` do registro como inteiro, ou None se não for um número."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _insert_owner_interactions(connection: Connection, keys: List[tuple]) -> None:
+    """Registra a interação do dono para os produtos recém-inseridos (identificados por (dono, nome))."""
+    if not keys:
+        return
+    created_at = datetime.now(timezone.utc)
+    connection.execute(UserProductInteraction.__table__.insert(), [
+        {"user_id": user_id, "product_id": product_id, "event_type": "purchase", "created_at": created_at}
+        for product_id, user_id in connection.execute(
+            select(Product.id, Product.user_id).where(tuple_(Product.user_id, Product.name).in_(keys)).order_by(Product.id)
+        )
+    ])
+
+
+def _ingest(
+    engine: Engine,
+    records: Iterable[dict],
+    process_chunk: Callable[[Connection, List[dict], IngestionStats], None],
+    chunk_size: int,
+    checkpoint: Optional[Checkpoint],
+    progress: Optional[Callable[[IngestionStats], None]],
+) -> IngestionStats:
+    stats = IngestionStats()
+    offset = checkpoint.offset if checkpoint else 0
+    records = islice(records, offset, None)
+    started = time.perf_counter()
+    for chunk in chunked(records, chunk_size):
+        with engine.begin() as connection:
+            process_chunk(connection, chunk, stats)
+        offset += len(chunk)
+        stats.read += len(chunk)
+        stats.chunks += 1
+        stats.elapsed = time.perf_counter() - started
+        if checkpoint:
+            checkpoint.save(offset, stats)
+        if progress:
+            progress(stats)
+    stats.elapsed = time.perf_counter() - started
+    logger.info(
+        "Ingestão concluída: %d registros (%d inseridos, %d atualizados, %d ignorados, %d rejeitados) em %.1fs.",
+        stats.read, stats.inserted, stats.updated, stats.skipped, stats.rejected, stats.elapsed,
+    )
+    return stats
+
+
+def ingest_users(
+    engine: Engine,
+    records: Iterable[dict],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    upsert: bool = False,
+    checkpoint: Optional[Checkpoint] = None,
+    use_copy: bool = True,
+    progress: Optional[Callable[[IngestionStats], None]] = None,
+) -> IngestionStats:
+    """
+    Registros com `username`, `email` e `password` (ou `hashed_password` já calculado).
+
+    As senhas em texto são transformadas em hash em paralelo, no mesmo número de threads
+    do pool de hashing da API (PASSWORD_HASH_MAX_CONCURRENCY).
+    """
+    hasher = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_MAX_CONCURRENCY, thread_name_prefix="ingest-hash")
+    columns = ["username", "email", "hashed_password"]
+
+    def process_chunk(connection: Connection, chunk: List[dict], stats: IngestionStats) -> None:
+        rows = []
+        for record in chunk:
+            if not record.get("username") or not record.get("email") or not (record.get("password") or record.get("hashed_password")):
+                stats.reject(f"registro incompleto: {record.get('username')!r}")
+                continue
+            rows.append(record)
+        rows = _last_by_key(rows, lambda r: r["username"])
+
+        usernames = [r["username"] for r in rows]
+        emails = [r["email"] for r in rows]
+        existing = dict(connection.execute(select(User.username, User.id).where(User.username.in_(usernames))).all())
+        email_owner = dict(connection.execute(select(User.email, User.username).where(User.email.in_(emails))).all())
+
+        new_rows, changed_rows, seen_emails = [], [], set()
+        for row in rows:
+            owner = email_owner.get(row["email"])
+            if (owner is not None and owner != row["username"]) or row["email"] in seen_emails:
+                stats.reject(f"e-mail já usado por outro usuário: {row['email']!r}")
+                continue
+            seen_emails.add(row["email"])
+            if row["username"] in existing:
+                if upsert:
+                    changed_rows.append({**row, "_id": existing[row["username"]]})
+                else:
+                    stats.skipped += 1
+            else:
+                new_rows.append(row)
+
+        pending = [r for r in new_rows + changed_rows if not r.get("hashed_password")]
+        for row, hashed in zip(pending, hasher.map(get_password_hash, [r["password"] for r in pending])):
+            row["hashed_password"] = hashed
+
+        _insert_rows(connection, User, columns, new_rows, use_copy)
+        _update_rows(connection, User, columns, changed_rows)
+        stats.inserted += len(new_rows)
+        stats.updated += len(changed_rows)
+
+    try:
+        return _ingest(engine, records, process_chunk, chunk_size, checkpoint, progress)
+    finally:
+        hasher.shutdown()
+
+
+def ingest_products(
+    engine: Engine,
+    records: Iterable[dict],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    upsert: bool = False,
+    checkpoint: Optional[Checkpoint] = None,
+    use_copy: bool = True,
+    progress: Optional[Callable[[IngestionStats], None]] = None,
+) -> IngestionStats:
+    """
+    Registros com `name`, `description` (opcional) e o dono: `username` ou `user_id`.
+
+    Um produto é identificado pelo par (dono, nome); com `upsert`, a descrição dos
+    existentes é atualizada. Cada produto novo também gera uma interação "purchase"
+    do dono em `user_product_interactions`, como acontece pelo ORM.
+    """
+    columns = ["name", "description", "user_id"]
+
+    def process_chunk(connection: Connection, chunk: List[dict], stats: IngestionStats) -> None:
+        usernames = {r["username"] for r in chunk if r.get("username") and not r.get("user_id")}
+        user_ids = dict(
+            connection.execute(select(User.username, User.id).where(User.username.in_(usernames))).all()
+        ) if usernames else {}
+        # IDs de dono vindos do arquivo também são conferidos: um único ID inexistente
+        # quebraria a chave estrangeira e desfaria o bloco inteiro.
+        given_ids = {_owner_id(r["user_id"]) for r in chunk if r.get("user_id")} - {None}
+        known_ids = set(
+            connection.execute(select(User.id).where(User.id.in_(given_ids))).scalars()
+        ) if given_ids else set()
+
+        rows = []
+        for record in chunk:
+            owner = _owner_id(record["user_id"]) if record.get("user_id") else user_ids.get(record.get("username"))
+            if not record.get("name") or owner is None:
+                stats.reject(f"produto sem nome ou dono conhecido: {record.get('name')!r}")
+                continue
+            if record.get("user_id") and owner not in known_ids:
+                stats.reject(f"dono inexistente (user_id={record['user_id']!r}): {record['name']!r}")
+                continue
+            rows.append({"name": record["name"], "description": record.get("description") or None, "user_id": owner})
+        rows = _last_by_key(rows, lambda r: (r["user_id"], r["name"]))
+
+        keys = [(r["user_id"], r["name"]) for r in rows]
+        existing = {
+            (user_id, name): product_id
+            for product_id, user_id, name in connection.execute(
+                select(Product.id, Product.user_id, Product.name).where(tuple_(Product.user_id, Product.name).in_(keys))
+            )
+        } if keys else {}
+
+        new_rows, changed_rows = [], []
+        for row in rows:
+            product_id = existing.get((row["user_id"], row["name"]))
+            if product_id is None:
+                new_rows.append(row)
+            elif upsert:
+                changed_rows.append({**row, "_id": product_id})
+            else:
+                stats.skipped += 1
+
+        _insert_rows(connection, Product, columns, new_rows, use_copy)
+        _insert_owner_interactions(connection, [(r["user_id"], r["name"]) for r in new_rows])
+        _update_rows(connection, Product, ["description"], changed_rows)
+        stats.inserted += len(new_rows)
+        stats.updated += len(changed_rows)
+
+    return _ingest(engine, records, process_chunk, chunk_size, checkpoint, progress)
@@ -1,14 +1,46 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.api.endpoints import recommendations, users, auth 
+from app.agents.fast_recommender import get_fast_recommender
+from app.agents.recommendation_agent import get_recommendation_agent
+from app.agents.retrieval import get_product_index, get_product_index_loader
 from app.core.app_logging import setup_logging 
-from app.database import create_tables
-import sys
+from app.core.config import settings
+from app.core.metrics import HTTP_REQUEST_DURATION, REGISTRY
+from app.core.security import shutdown_hash_executor
+from app.database import ensure_schema
 
-__import__('pysqlite3')
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada disso roda no import: importar o app (workers, testes, benchmarks) fica barato.
+    setup_logging()
+    if settings.DB_CREATE_TABLES_ON_STARTUP:
+        await asyncio.to_thread(ensure_schema)
+    # O índice de produtos e o recomendador rápido leem o catálogo inteiro: ambos são
+    # construídos em segundo plano, e o worker atende desde já (sem candidatos e com o
+    # fallback estático até ficarem prontos).
+    index_loader = get_product_index_loader()
+    if settings.RETRIEVAL_ENABLED:
+        await index_loader.start()
+    fast_recommender = get_fast_recommender()
+    if settings.FAST_RECOMMENDER_ENABLED:
+        await fast_recommender.start()
+    agent = get_recommendation_agent()
+    # Aquece o modelo em segundo plano: a aplicação sobe sem esperar a carga do Ollama.
+    await agent.start(warm_up=settings.OLLAMA_WARMUP_ON_STARTUP)
+    try:
+        yield
+    finally:
+        await agent.stop()
+        await fast_recommender.stop()
+        await index_loader.stop()
+        shutdown_hash_executor()
 
-app = FastAPI(title="IA Recommendation System")
+app = FastAPI(title="IA Recommendation System", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,10 +50,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-setup_logging()
-
-create_tables()
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Usa o template da rota (ex.: /api/v1/recommendations/) para não explodir a cardinalidade.
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status),
+        )
 
 app.include_router(recommendations.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
-app.include_router(auth.router, prefix="/api/v1")
\ No newline at end of file
+app.include_router(auth.router, prefix="/api/v1")
+
+@app.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness():
+    agent = get_recommendation_agent()
+    if not agent.is_ready:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "ollama": False})
+    return {"status": "ok", "ollama": True}
+
+@app.get("/health/catalog")
+async def catalog_readiness():
+    """Estruturas construídas em segundo plano a partir do catálogo (prontas ou não)."""
+    index = get_product_index()
+    fast_recommender = get_fast_recommender()
+    return {
+        "retrieval": {
+            "ready": not settings.RETRIEVAL_ENABLED or index.is_ready,
+            "products": len(index),
+        },
+        "fast_recommender": {
+            "ready": not settings.FAST_RECOMMENDER_ENABLED or fast_recommender.is_ready,
+            "items": len(fast_recommender.model) if fast_recommender.model is not None else 0,
+        },
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
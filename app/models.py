@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -10,7 +12,19 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
 
+    # Histórico recente (ver `app.agents.history.load_recent_history`), anexado pelas
+    # rotas e pelos lotes antes da geração; None quando não foi carregado.
+    recent_history = None
+
     products = relationship("Product", back_populates="user")
+    # Sempre lido por `load_recent_history`: o acesso preguiçoso falha em vez de carregar o histórico inteiro.
+    interactions = relationship("UserProductInteraction", back_populates="user", lazy="raise")
+    recommendations = relationship(
+        "StoredRecommendation",
+        back_populates="user",
+        order_by="StoredRecommendation.position",
+        cascade="all, delete-orphan",
+    )
 
 class Product(Base):
     __tablename__ = "products"
@@ -18,6 +32,54 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+
+    user = relationship("User", back_populates="products")
+
+class UserProductInteraction(Base):
+    """Evento de um usuário com um produto (compra, visualização...), base do histórico."""
+    __tablename__ = "user_product_interactions"
+    __table_args__ = (
+        Index("ix_user_product_interactions_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True, nullable=False)
+    event_type = Column(String, nullable=False, default="purchase")
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    user = relationship("User", back_populates="interactions")
+    product = relationship("Product")
+
+@event.listens_for(Product, "after_insert")
+def _record_owner_interaction(mapper, connection, target):
+    """Produtos criados já com dono (modelo antigo) também entram no histórico de interações."""
+    if target.user_id is not None:
+        connection.execute(
+            UserProductInteraction.__table__.insert().values(
+                user_id=target.user_id,
+                product_id=target.id,
+                event_type="purchase",
+                created_at=datetime.now(timezone.utc),
+            )
+        )
+
+class StoredRecommendation(Base):
+    """Última lista de recomendações gerada para um usuário (pré-computada)."""
+    __tablename__ = "recommendations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "position", name="uq_recommendations_user_id_position"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    position = Column(Integer, nullable=False)
+    product_id = Column(Integer, nullable=True)
+    product_name = Column(String, nullable=False)
+    reason = Column(String, nullable=False)
+    history_fingerprint = Column(String, nullable=False)
+    model_version = Column(String, nullable=False)
+    generated_at = Column(DateTime(timezone=True), nullable=False)
 
-    user = relationship("User", back_populates="products")
\ No newline at end of file
+    user = relationship("User", back_populates="recommendations")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, model_validator
 from typing import List, Optional
 
 class UserBase(BaseModel):
@@ -24,4 +24,32 @@ class TokenData(BaseModel):
 class Recommendation(BaseModel):
     product_id: Optional[int] = None 
     product_name: str
-    reason: str
\ No newline at end of file
+    reason: str
+
+class RecommendationList(BaseModel):
+    """Saída estruturada (JSON) pedida ao LLM."""
+    recommendations: List[Recommendation] = Field(min_length=3, max_length=3)
+
+class RecommendationResult(BaseModel):
+    recommendations: List[Recommendation]
+    degraded: bool = False
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: Optional[List[int]] = None
+    start_id: Optional[int] = None
+    end_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if self.user_ids is None and (self.start_id is None or self.end_id is None):
+            raise ValueError("Informe 'user_ids' ou o intervalo 'start_id'/'end_id'")
+        if self.user_ids is None and self.start_id > self.end_id:
+            raise ValueError("'start_id' deve ser menor ou igual a 'end_id'")
+        return self
+
+class BatchRecommendationResult(BaseModel):
+    user_id: int
+    username: str
+    recommendations: List[Recommendation]
+    fallback: bool = False
+    error: Optional[str] = None
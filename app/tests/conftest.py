@@ -1,15 +1,20 @@
 import sys
 import os
-from unittest.mock import patch, MagicMock
+import tempfile
+from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import NullPool
 from typing import Generator, Any
 
 sys.modules['chromadb'] = MagicMock()
 sys.modules['chromadb.api'] = MagicMock()
 sys.modules['chromadb.api.types'] = MagicMock()
+sys.modules['chromadb.errors'] = MagicMock()
+sys.modules['chromadb.config'] = MagicMock()
 
 try:
     import pysqlite3
@@ -26,7 +31,9 @@ def pytest_configure(config):
     else:
         print("\nUsando configurações padrão para testes")
 
-TEST_DATABASE_URL = "sqlite:///:memory:"
+# Arquivo (e não memória) para que a sessão síncrona dos testes e a assíncrona dos endpoints vejam os mesmos dados.
+TEST_DATABASE_PATH = os.path.join(tempfile.gettempdir(), f"ia_recommendation_test_{os.getpid()}.db")
+TEST_DATABASE_URL = f"sqlite:///{TEST_DATABASE_PATH}"
 engine = create_engine(
     TEST_DATABASE_URL,
     connect_args={"check_same_thread": False},
@@ -34,6 +41,12 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+from app.database import instrument_engine
+instrument_engine(async_engine.sync_engine)
+
 @pytest.fixture(scope="session")
 def setup_test_database():
     """Configura o banco de dados de teste"""
@@ -41,20 +54,36 @@ def setup_test_database():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+    if os.path.exists(TEST_DATABASE_PATH):
+        os.remove(TEST_DATABASE_PATH)
 
 @pytest.fixture
 def db_session(setup_test_database) -> Generator[Session, None, None]:
-    """Sessão do banco de dados para testes"""
-    connection = engine.connect()
-    transaction = connection.begin()
-    session = TestingSessionLocal(bind=connection)
+    """Sessão do banco de dados para testes (as tabelas são esvaziadas ao final de cada teste)"""
+    from app.database import Base
+    session = TestingSessionLocal()
     
     try:
         yield session
     finally:
         session.close()
-        transaction.rollback()
-        connection.close()
+        with engine.begin() as connection:
+            for table in reversed(Base.metadata.sorted_tables):
+                connection.execute(table.delete())
+
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    """Evita que usuários em cache de um teste vazem para o próximo"""
+    from app.core.security import clear_auth_caches
+    clear_auth_caches()
+    yield
+    clear_auth_caches()
+
+@pytest.fixture
+def async_session_factory(db_session):
+    """Fábrica de sessões assíncronas sobre o mesmo banco de testes"""
+    return TestingAsyncSessionLocal
 
 @pytest.fixture
 def client(db_session: Session):
@@ -63,11 +92,9 @@ def client(db_session: Session):
     from app.database import get_db
     from fastapi.testclient import TestClient
     
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            db_session.rollback()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
     
     app.dependency_overrides[get_db] = override_get_db
     with TestClient(app) as test_client:
@@ -107,9 +134,19 @@ def mock_recommendation_agent():
             Product ID: 103, Name: E-reader, Reason: Leitura confortável
         """)
         
-        with patch('app.api.endpoints.recommendations.RecommendationAgent') as mock_agent:
-            mock_instance = mock_agent.return_value
-            mock_instance.generate_recommendations.return_value = [
-                {"product_id": 101, "product_name": "Mocked", "reason": "Test"}
-            ]
-            yield mock_instance
\ No newline at end of file
+        from app.main import app
+        from app.agents.recommendation_agent import get_recommendation_agent
+
+        from app.schemas import Recommendation, RecommendationResult
+
+        mocked_recommendations = [Recommendation(product_id=101, product_name="Mocked", reason="Test")]
+        mock_instance = MagicMock()
+        mock_instance.cache_version = "mock"
+        mock_instance.circuit_open = False
+        mock_instance.generate_recommendations = AsyncMock(return_value=mocked_recommendations)
+        mock_instance.generate = AsyncMock(return_value=RecommendationResult(recommendations=mocked_recommendations))
+        app.dependency_overrides[get_recommendation_agent] = lambda: mock_instance
+        try:
+            yield mock_instance
+        finally:
+            app.dependency_overrides.pop(get_recommendation_agent, None)
@@ -0,0 +1,66 @@
+import json
+import logging
+import random
+import sys
+
+from sqlalchemy.orm import Session
+
+from app.core.app_logging import JsonFormatter, SamplingFilter, _NonBlockingQueueHandler
+from app.core.security import get_password_hash
+from app.models import User as UserModel
+
+
+def _record(name="app.test", level=logging.INFO, msg="mensagem %s", args=("x",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_emits_one_object_with_extra_fields():
+    try:
+        raise ValueError("falhou")
+    except ValueError:
+        record = _record(username="ana")
+        record.exc_info = sys.exc_info()
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["message"] == "mensagem x"
+    assert payload["level"] == "INFO"
+    assert payload["logger"] == "app.test"
+    assert payload["username"] == "ana"
+    assert "ValueError: falhou" in payload["exception"]
+
+
+def test_sampling_filter_uses_longest_prefix_and_keeps_warnings():
+    sampling = SamplingFilter({"app": 1.0, "app.agents": 0.0}, rng=random.Random(0))
+
+    assert sampling.filter(_record("app.api"))
+    assert not sampling.filter(_record("app.agents.recommendation_agent"))
+    assert sampling.filter(_record("app.agents.recommendation_agent", level=logging.WARNING))
+
+
+def test_queue_handler_redacts_secrets_without_touching_the_original_record():
+    handler = _NonBlockingQueueHandler(None)
+    record = _record(password="segredo", username="ana")
+
+    prepared = handler.prepare(record)
+
+    assert prepared.password == "***"
+    assert prepared.username == "ana"
+    assert prepared.msg == "mensagem x" and prepared.args is None
+    assert record.password == "segredo"
+
+
+def test_login_does_not_write_secrets_to_stdout_or_logs(client, db_session: Session, capsys, caplog):
+    hashed = get_password_hash("segredo")
+    db_session.add(UserModel(username="fabio", email="fabio@example.com", hashed_password=hashed))
+    db_session.commit()
+
+    with caplog.at_level(logging.DEBUG, logger="app.core.security"):
+        assert client.post("/api/v1/token", data={"username": "fabio", "password": "segredo"}).status_code == 200
+        assert client.post("/api/v1/token", data={"username": "fabio", "password": "errada"}).status_code == 401
+
+    output = capsys.readouterr().out + caplog.text
+    assert "segredo" not in output and "errada" not in output and hashed not in output
+    assert "Falha de autenticação: senha incorreta." in caplog.text
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.core import security
+from app.core.security import create_access_token, decode_access_token, get_current_user
+from app.models import User as UserModel
+
+
+def test_decoded_token_is_reused_until_it_expires():
+    token = create_access_token({"sub": "ana"})
+
+    with patch.object(security.jwt, "decode", wraps=security.jwt.decode) as decode:
+        assert decode_access_token(token)["sub"] == "ana"
+        assert decode_access_token(token)["sub"] == "ana"
+    assert decode.call_count == 1
+
+    short_lived = create_access_token({"sub": "ana"}, expires_delta=timedelta(seconds=2))
+    assert security._cache_ttl(decode_access_token(short_lived)) <= 2
+
+
+def test_current_user_is_fetched_once_per_username(monkeypatch):
+    user = UserModel(id=7, username="bruno", email="bruno@example.com", hashed_password="x")
+    lookup = AsyncMock(return_value=user)
+    monkeypatch.setattr(security, "get_user_by_username", lookup)
+    token = create_access_token({"sub": "bruno"})
+
+    first = asyncio.run(get_current_user(token, db=None))
+    second = asyncio.run(get_current_user(create_access_token({"sub": "bruno", "jti": "outro"}), db=None))
+
+    assert (first.id, first.username) == (7, "bruno")
+    assert second == first
+    lookup.assert_awaited_once()
+
+
+def test_unknown_user_is_not_cached(monkeypatch):
+    lookup = AsyncMock(return_value=None)
+    monkeypatch.setattr(security, "get_user_by_username", lookup)
+    token = create_access_token({"sub": "fantasma"})
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            asyncio.run(get_current_user(token, db=None))
+    assert lookup.await_count == 2
+
+
+def test_updating_a_user_invalidates_the_cached_projection(db_session: Session):
+    user = UserModel(username="celia", email="celia@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    security._user_cache.set("celia", object())
+
+    user.username = "celia2"
+    db_session.commit()
+
+    assert security._user_cache.get("celia") is None
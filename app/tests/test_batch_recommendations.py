@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.agents.batch import generate_batch, load_users_with_products
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models import Product, User as UserModel
+from app.schemas import Recommendation, RecommendationResult
+
+
+class FakeAgent:
+    cache = None
+
+    async def generate(self, user_model, user_products_info):
+        if user_model.username.endswith("0"):
+            raise RuntimeError("falha simulada")
+        await asyncio.sleep(0)
+        return RecommendationResult(recommendations=[
+            Recommendation(product_id=1, product_name=user_products_info, reason="Teste")
+        ])
+
+    def fast_recommendations(self, user_model):
+        return [Recommendation(product_id=901, product_name="Fallback", reason="Teste")]
+
+
+def _create_users(db_session: Session, count: int):
+    users = [UserModel(username=f"batch{i}", email=f"batch{i}@example.com", hashed_password="x") for i in range(count)]
+    db_session.add_all(users)
+    db_session.flush()
+    for user in users:
+        db_session.add_all([Product(name=f"{user.username}-p{j}", description="", user_id=user.id) for j in range(3)])
+    db_session.commit()
+    return users
+
+
+def test_load_users_with_products_uses_set_based_queries(db_session: Session):
+    user_ids = [u.id for u in _create_users(db_session, 12)]
+    db_session.expunge_all()
+
+    statements = []
+    connection = db_session.connection()
+    event.listen(connection, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    loaded = load_users_with_products(db_session, start_id=user_ids[0], end_id=user_ids[-1], chunk_size=5)
+
+    assert [u.id for u in loaded] == user_ids
+    assert all(len(u.recent_history) == 3 for u in loaded)
+    assert len(statements) == 6
+
+
+def test_generate_batch_falls_back_per_user():
+    users = [UserModel(id=i, username=f"batch{i}", email=f"batch{i}@example.com") for i in range(1, 12)]
+    for user in users:
+        user.products = []
+
+    async def collect():
+        return [r async for r in generate_batch(FakeAgent(), users, concurrency=3)]
+
+    results = asyncio.run(collect())
+
+    assert sorted(r.user_id for r in results) == list(range(1, 12))
+    failed = [r for r in results if r.fallback]
+    assert [r.username for r in failed] == ["batch10"]
+    assert failed[0].recommendations[0].product_id == 901
+
+
+def _admin_request(client, db_session: Session):
+    from app.agents.recommendation_agent import get_recommendation_agent
+
+    user_ids = [u.id for u in _create_users(db_session, 3)]
+    admin = UserModel(username="campaigns", email="campaigns@example.com", hashed_password="x")
+    db_session.add(admin)
+    db_session.commit()
+    client.app.dependency_overrides[get_recommendation_agent] = lambda: FakeAgent()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'campaigns'})}"}
+    return client.post("/api/v1/recommendations/batch", json={"user_ids": user_ids}, headers=headers)
+
+
+def test_batch_endpoint_requires_admin(client, db_session: Session):
+    assert _admin_request(client, db_session).status_code == 403
+
+
+def test_batch_endpoint_streams_results(client, db_session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_USERNAMES", ["campaigns"])
+    response = _admin_request(client, db_session)
+
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["username"] for r in results) == ["batch0", "batch1", "batch2"]
+    assert [r["fallback"] for r in results if r["username"] == "batch0"] == [True]
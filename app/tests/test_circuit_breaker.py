@@ -0,0 +1,107 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+from app.agents.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.agents.recommendation_agent import RecommendationAgent
+from app.core.metrics import LLM_CIRCUIT_STATE, LLM_CIRCUIT_TRANSITIONS
+from app.models import User as UserModel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers_through_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+    opened = LLM_CIRCUIT_TRANSITIONS.value(from_state=CLOSED, to_state=OPEN)
+    closed = LLM_CIRCUIT_TRANSITIONS.value(from_state=HALF_OPEN, to_state=CLOSED)
+
+    for success in (False, False, True, False, False):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == CLOSED
+
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == HALF_OPEN
+    # No meio-aberto passa apenas uma chamada de teste por vez.
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+
+    assert breaker.state == CLOSED
+    assert breaker.stats() == {"state": CLOSED, "consecutive_failures": 0, "short_circuited": 2}
+    assert LLM_CIRCUIT_TRANSITIONS.value(from_state=CLOSED, to_state=OPEN) == opened + 1
+    assert LLM_CIRCUIT_TRANSITIONS.value(from_state=HALF_OPEN, to_state=CLOSED) == closed + 1
+
+
+def test_failed_or_abandoned_trial_in_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record(False)
+
+    clock.now = 5
+    assert breaker.allow()
+    # Chamada sem resultado (fila cheia, cancelamento): libera a vaga de teste.
+    breaker.record(None)
+    assert breaker.state == HALF_OPEN and breaker.allow()
+
+    breaker.record(False)
+    assert breaker.state == OPEN
+    clock.now = 9
+    assert not breaker.allow()
+    clock.now = 10
+    assert breaker.state == HALF_OPEN
+
+
+def test_open_breaker_answers_degraded_without_calling_the_llm(monkeypatch):
+    from app.agents import recommendation_agent as agent_module
+
+    monkeypatch.setattr(agent_module.settings, "CIRCUIT_BREAKER_FAILURE_THRESHOLD", 2)
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    agent.engine = "direct"
+    agent._run_direct = AsyncMock(side_effect=TimeoutError("Chamada ao LLM (direct) excedeu 120s"))
+    agent.fast_recommendations = lambda user: agent._get_fallback_recommendations()
+    user = UserModel(id=1, username="ana", email="ana@example.com")
+
+    async def scenario():
+        failures = [await agent.generate(user, f"Produto {i}") for i in range(2)]
+        started = time.perf_counter()
+        result = await agent.generate(user, "Produto 3")
+        return failures, result, time.perf_counter() - started
+
+    failures, result, elapsed = asyncio.run(scenario())
+
+    assert all(f.degraded for f in failures)
+    assert agent.circuit_open and LLM_CIRCUIT_STATE.value() == 2
+    assert result.degraded and len(result.recommendations) == 3
+    assert agent._run_direct.await_count == 2
+    assert elapsed < 0.05
+
+
+def test_degraded_generation_is_flagged_in_response_header(client, db_session, mock_recommendation_agent):
+    from app.core.security import create_access_token
+    from app.schemas import Recommendation, RecommendationResult
+
+    db_session.add(UserModel(username="degradado", email="degradado@example.com", hashed_password="x"))
+    db_session.commit()
+    fallback = [Recommendation(product_id=901, product_name="Fallback", reason="Popular")]
+    mock_recommendation_agent.generate.return_value = RecommendationResult(recommendations=fallback, degraded=True)
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'degradado'})}"}
+    response = client.get("/api/v1/recommendations/", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["x-recommendation-degraded"] == "true"
+    assert [r["product_id"] for r in response.json()] == [901]
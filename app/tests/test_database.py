@@ -0,0 +1,95 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from sqlalchemy import create_engine, event, inspect, make_url
+from sqlalchemy.orm import Session
+
+from app.agents import precompute
+from app.core.security import get_password_hash
+from app.database import Base, async_database_url, ensure_schema, shared_memory_url
+from app.models import Product, User as UserModel
+from app.schemas import Recommendation, RecommendationResult
+
+
+def test_async_database_url_uses_async_drivers():
+    assert async_database_url("postgresql://u:p@db:5432/app").drivername == "postgresql+asyncpg"
+    assert async_database_url("postgresql+psycopg2://u:p@db/app").drivername == "postgresql+asyncpg"
+    assert str(async_database_url("sqlite:///./test.db")) == "sqlite+aiosqlite:///./test.db"
+
+
+def test_in_memory_database_is_shared_by_the_sync_and_async_engines():
+    assert shared_memory_url("sqlite:///./test.db") == make_url("sqlite:///./test.db")
+    assert shared_memory_url("sqlite:///:memory:").query["mode"] == "memory"
+
+    # O esquema criado pela engine síncrona precisa ser visto pelos endpoints (engine assíncrona).
+    code = "\n".join([
+        "import asyncio, app.models",
+        "from sqlalchemy import text",
+        "from app.database import async_engine, ensure_schema",
+        "async def count():",
+        "    async with async_engine.connect() as connection:",
+        "        return (await connection.execute(text('SELECT COUNT(*) FROM users'))).scalar()",
+        "ensure_schema()",
+        "print(asyncio.run(count()))",
+    ])
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "DATABASE_URL": "sqlite:///:memory:", "TESTING": "false"},
+        capture_output=True, text=True,
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "0"
+
+
+def test_ensure_schema_creates_missing_tables_and_then_costs_one_query(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    created = ensure_schema(engine)
+    statements.clear()
+    again = ensure_schema(engine)
+
+    assert again == [] and len(statements) == 1
+    assert set(created) == set(Base.metadata.tables)
+    assert set(inspect(engine).get_table_names()) >= set(created)
+    engine.dispose()
+
+
+def test_login_and_current_user_use_the_async_session(client, db_session: Session):
+    db_session.add(UserModel(username="carla", email="carla@example.com", hashed_password=get_password_hash("segredo")))
+    db_session.commit()
+
+    response = client.post("/api/v1/token", data={"username": "carla", "password": "segredo"})
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+
+    me = client.get("/api/v1/users/me/", headers={"Authorization": f"Bearer {token}"})
+    assert me.status_code == 200
+    assert me.json()["username"] == "carla"
+    assert client.post("/api/v1/token", data={"username": "carla", "password": "errada"}).status_code == 401
+
+
+def test_background_refresh_reads_and_writes_through_async_session(db_session: Session, async_session_factory):
+    user = UserModel(username="davi", email="davi@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    db_session.add(Product(name="Caderno", description="", user_id=user.id))
+    db_session.commit()
+    user_id = user.id
+
+    class FakeAgent:
+        cache_version = "modelo:v1"
+
+        async def generate(self, user_model, user_products_info):
+            return RecommendationResult(recommendations=[
+                Recommendation(product_id=1, product_name="Caneta", reason=user_products_info)
+            ])
+
+    asyncio.run(precompute.refresh_user_recommendations(FakeAgent(), user_id, session_factory=async_session_factory))
+
+    rows = precompute.get_stored_recommendations(db_session, user_id)
+    assert [(r.product_name, r.reason) for r in rows] == [("Caneta", "Caderno")]
@@ -0,0 +1,302 @@
+import asyncio
+import socket
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import httpx
+
+from app.agents.recommendation_agent import RecommendationAgent
+from app.agents.retrieval import Candidate
+from app.models import User as UserModel
+from benchmarks.fake_ollama import FakeOllamaServer, build_completion
+from benchmarks.stats import summarize
+
+
+def _agent_for(base_url: str) -> RecommendationAgent:
+    # Motor direto: evita que o `start` importe o CrewAI em segundo plano durante os testes.
+    with patch("app.agents.recommendation_agent.settings.OLLAMA_BASE_URL", base_url), \
+            patch("app.agents.recommendation_agent.settings.RECOMMENDATION_ENGINE", "direct"):
+        return RecommendationAgent(cache=None)
+
+
+def test_completion_is_deterministic_and_uses_candidates():
+    prompt = "Produtos candidatos:\n- ID 11: Caneta\n- ID 12: Lápis\n- ID 13: Borracha\n- ID 14: Régua\n"
+
+    completion = build_completion(prompt, seed=7)
+
+    assert completion == build_completion(prompt, seed=7)
+    lines = completion.splitlines()
+    assert len(lines) == 3
+    assert all(line.startswith("Product ID: 1") for line in lines)
+
+
+def test_direct_generation_against_fake_server():
+    candidates = [Candidate(product_id=100 + i, name=f"Produto {i}", description="", score=1.0) for i in range(5)]
+    user = UserModel(id=1, username="ana", email="ana@example.com")
+
+    with FakeOllamaServer(latency=0.01, tokens_per_second=0) as server:
+        agent = _agent_for(server.base_url)
+        recommendations = asyncio.run(agent._run_direct(user, "Caderno", candidates))
+        streamed = asyncio.run(_collect(agent, user))
+        tags = httpx.get(f"{server.base_url}/api/tags").json()
+        requests = server.app.state.requests
+
+    assert len(recommendations) == 3
+    assert {r.product_id for r in recommendations} <= {c.product_id for c in candidates}
+    assert agent.token_usage["direct"]["completion_tokens"] > 0
+    assert len(streamed) == 3
+    assert tags["models"][0]["name"] == agent.model_name
+    assert requests == 2
+
+
+async def _collect(agent: RecommendationAgent, user: UserModel):
+    with patch.object(agent, "_retrieve_candidates", return_value=[]):
+        return [r async for r in agent.stream_recommendations(user, "Caderno")]
+
+
+def test_summarize_reports_error_rate_and_percentiles():
+    summary = summarize([0.1, 0.2, 0.3, 0.4], errors=1, elapsed=2.0)
+
+    assert summary["requests"] == 5
+    assert summary["error_rate"] == 0.2
+    assert summary["throughput_rps"] == 2.5
+    assert summary["latency_p50_s"] in (0.2, 0.3)
+    assert summary["latency_p99_s"] == 0.4
+
+
+def test_json_mode_against_fake_server():
+    user = UserModel(id=2, username="bia", email="bia@example.com")
+
+    with FakeOllamaServer() as server:
+        agent = _agent_for(server.base_url)
+        agent.output_format = "json"
+        recommendations = asyncio.run(agent._run_direct(user, "Caderno"))
+        requests = server.app.state.requests
+
+    assert len(recommendations) == 3
+    assert all(r.product_id not in (901, 902, 903) for r in recommendations)
+    assert requests == 1
+
+
+def test_warm_up_loads_model_and_primes_static_prefix(monkeypatch):
+    from app.agents import recommendation_agent as agent_module
+
+    monkeypatch.setattr(agent_module.settings, "OLLAMA_KEEP_ALIVE", "-1")
+    monkeypatch.setattr(agent_module.settings, "OLLAMA_NUM_PREDICT", 128)
+    user = UserModel(id=3, username="caio", email="caio@example.com")
+
+    with FakeOllamaServer() as server:
+        agent = _agent_for(server.base_url)
+        assert asyncio.run(agent.warm_up())
+        asyncio.run(agent._run_direct(user, "Caderno"))
+        loads = server.app.state.loads
+        warm_body, request_body = server.app.state.bodies
+
+    assert loads == 1
+    assert warm_body["keep_alive"] == -1
+    assert warm_body["options"]["num_predict"] == 1
+    assert request_body["options"]["num_predict"] == 128
+    # O prefixo estático (sistema + instruções) é idêntico no aquecimento e na requisição.
+    warm_user = warm_body["messages"][1]["content"]
+    real_user = request_body["messages"][1]["content"]
+    prefix = real_user.split("**Usuário:**")[0]
+    assert len(prefix) > 500 and warm_user.startswith(prefix)
+    assert warm_body["messages"][0] == request_body["messages"][0]
+
+
+def test_keep_warm_loop_pings_model_after_warm_up(monkeypatch):
+    from app.agents import recommendation_agent as agent_module
+
+    monkeypatch.setattr(agent_module.settings, "OLLAMA_KEEP_WARM_INTERVAL_SECONDS", 0.05)
+
+    async def scenario(agent, server):
+        await agent.start(warm_up=True)
+        # A primeira geração do processo pode demorar; espera os pings em vez de um tempo fixo.
+        deadline = time.monotonic() + 5
+        while server.app.state.loads < 3 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await agent.stop()
+
+    with FakeOllamaServer() as server:
+        agent = _agent_for(server.base_url)
+        asyncio.run(scenario(agent, server))
+        loads, generations = server.app.state.loads, server.app.state.requests
+
+    assert agent.is_ready
+    assert generations == 1
+    assert loads >= 3
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _servers(stack: ExitStack, *options):
+    return [stack.enter_context(FakeOllamaServer(**opts)) for opts in options]
+
+
+def test_pool_routes_concurrent_generations_to_the_least_loaded_backend():
+    user = UserModel(id=4, username="duda", email="duda@example.com")
+
+    async def scenario(agent):
+        return await asyncio.gather(*[agent._run_direct(user, "Caderno") for _ in range(4)])
+
+    with ExitStack() as stack:
+        servers = _servers(stack, dict(latency=0.2), dict(latency=0.2))
+        agent = _agent_for(",".join(s.base_url for s in servers))
+        results = asyncio.run(scenario(agent))
+        requests = [s.app.state.requests for s in servers]
+
+    assert len(agent.pool.backends) == 2 and agent.scheduler.max_concurrency == 2
+    assert all(len(r) == 3 for r in results)
+    assert requests == [2, 2]
+
+
+def test_pool_ejects_failing_backend_and_reinstates_it(monkeypatch):
+    from app.agents import ollama_pool
+
+    monkeypatch.setattr(ollama_pool.settings, "OLLAMA_BACKEND_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(ollama_pool.settings, "OLLAMA_BACKEND_EJECTION_SECONDS", 0.3)
+    user = UserModel(id=5, username="edu", email="edu@example.com")
+
+    async def generate(agent, count):
+        outcomes = []
+        for _ in range(count):
+            try:
+                await agent._run_direct(user, "Caderno")
+                outcomes.append("ok")
+            except Exception:
+                outcomes.append("error")
+        return outcomes
+
+    with ExitStack() as stack:
+        broken, healthy = _servers(stack, dict(error_rate=1.0), dict())
+        agent = _agent_for(f"{broken.base_url},{healthy.base_url}")
+        first = asyncio.run(generate(agent, 6))
+        ejected = agent.pool.stats()["backends"][0]["ejected"]
+        time.sleep(0.35)
+        asyncio.run(generate(agent, 1))
+        broken_requests, healthy_requests = broken.app.state.requests, healthy.app.state.requests
+
+    # Alterna entre as duas até a segunda falha seguida; depois só a saudável responde.
+    assert first == ["error", "ok", "error", "ok", "ok", "ok"]
+    assert ejected
+    # Passado o afastamento, a instância volta a ser tentada (e é afastada de novo).
+    assert broken_requests == 3 and healthy_requests == 4
+    assert agent.pool.backends[0].ejections == 2
+
+
+def test_active_health_check_takes_backend_out_and_brings_it_back():
+    port = _free_port()
+    user = UserModel(id=6, username="fabi", email="fabi@example.com")
+
+    with FakeOllamaServer() as healthy:
+        agent = _agent_for(f"http://127.0.0.1:{port},{healthy.base_url}")
+        assert asyncio.run(agent.check_connection())
+        assert [b.healthy for b in agent.pool.backends] == [False, True]
+        asyncio.run(agent._run_direct(user, "Caderno"))
+        asyncio.run(agent._run_direct(user, "Caderno"))
+        assert healthy.app.state.requests == 2
+
+        with FakeOllamaServer(port=port) as revived:
+            asyncio.run(agent.check_connection())
+            asyncio.run(agent._run_direct(user, "Caderno"))
+            revived_requests = revived.app.state.requests
+
+    assert [b.healthy for b in agent.pool.backends] == [True, True]
+    assert revived_requests == 1
+
+
+def test_slow_generation_is_hedged_to_a_second_backend(monkeypatch):
+    from app.agents import ollama_pool
+
+    monkeypatch.setattr(ollama_pool.settings, "OLLAMA_HEDGE_ENABLED", True)
+    monkeypatch.setattr(ollama_pool.settings, "OLLAMA_HEDGE_MIN_DELAY_SECONDS", 0.05)
+    user = UserModel(id=7, username="gabi", email="gabi@example.com")
+
+    with ExitStack() as stack:
+        slow, fast = _servers(stack, dict(latency=2.0), dict(latency=0.01))
+        agent = _agent_for(f"{slow.base_url},{fast.base_url}")
+        agent.pool.latencies.extend([0.1] * ollama_pool.HEDGE_MIN_SAMPLES)
+        started = time.perf_counter()
+        recommendations = asyncio.run(agent._run_direct(user, "Caderno"))
+        elapsed = time.perf_counter() - started
+        stats = agent.pool.stats()
+
+    assert len(recommendations) == 3
+    assert elapsed < 1.5
+    assert stats["hedge_delay_s"] == 0.1
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    # O pedido perdedor é cancelado sem contar como falha da instância lenta.
+    assert [b["failures"] for b in stats["backends"]] == [0, 0]
+
+
+def test_slow_llm_call_times_out_and_falls_back(monkeypatch):
+    from app.agents import recommendation_agent as agent_module
+    from app.core.metrics import LLM_CALL_TIMEOUTS
+
+    monkeypatch.setattr(agent_module.settings, "LLM_CALL_TIMEOUT_SECONDS", 0.2)
+    timeouts = LLM_CALL_TIMEOUTS.value(engine="direct")
+    user = UserModel(id=8, username="hugo", email="hugo@example.com")
+
+    with FakeOllamaServer(latency=2.0) as server:
+        agent = _agent_for(server.base_url)
+        agent.fast_recommendations = lambda user: agent._get_fallback_recommendations()
+        started = time.perf_counter()
+        result = asyncio.run(agent.generate(user, "Caderno"))
+        elapsed = time.perf_counter() - started
+
+    assert result.degraded and len(result.recommendations) == 3
+    assert elapsed < 1.0
+    assert LLM_CALL_TIMEOUTS.value(engine="direct") == timeouts + 1
+    assert agent.breaker.stats()["consecutive_failures"] == 1
+
+
+def test_timeouts_count_as_backend_failures_and_eject_hung_backends(monkeypatch):
+    from app.agents import ollama_pool
+    from app.agents import recommendation_agent as agent_module
+
+    monkeypatch.setattr(agent_module.settings, "LLM_CALL_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(ollama_pool.settings, "OLLAMA_BACKEND_FAILURE_THRESHOLD", 2)
+    user = UserModel(id=9, username="iara", email="iara@example.com")
+
+    async def generate(agent, count):
+        for _ in range(count):
+            try:
+                await agent._run_direct(user, "Caderno")
+            except TimeoutError:
+                pass
+
+    with ExitStack() as stack:
+        hung = _servers(stack, dict(latency=2.0), dict(latency=2.0))
+        agent = _agent_for(",".join(s.base_url for s in hung))
+        asyncio.run(generate(agent, 4))
+        stats = agent.pool.stats()
+
+    assert [b["failures"] for b in stats["backends"]] == [2, 2]
+    assert [b["ejections"] for b in stats["backends"]] == [1, 1]
+
+
+def test_trickling_stream_hits_the_overall_deadline(monkeypatch):
+    from app.agents import recommendation_agent as agent_module
+    from app.core.metrics import LLM_CALL_TIMEOUTS
+
+    monkeypatch.setattr(agent_module.settings, "LLM_CALL_TIMEOUT_SECONDS", 0.3)
+    timeouts = LLM_CALL_TIMEOUTS.value(engine="stream")
+    user = UserModel(id=10, username="ivo", email="ivo@example.com")
+
+    # Um token a cada 0,1s: cada leitura HTTP termina a tempo, mas o fluxo inteiro não.
+    with FakeOllamaServer(latency=0.01, tokens_per_second=10) as server:
+        agent = _agent_for(server.base_url)
+        started = time.perf_counter()
+        streamed = asyncio.run(_collect(agent, user))
+        elapsed = time.perf_counter() - started
+
+    assert [r.product_id for r in streamed] == [901, 902, 903]
+    assert elapsed < 1.0
+    assert LLM_CALL_TIMEOUTS.value(engine="stream") == timeouts + 1
+    assert agent.breaker.stats()["consecutive_failures"] == 1
+    assert agent.pool.stats()["backends"][0]["failures"] == 1
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+from sqlalchemy.orm import Session
+
+from app.agents import fast_recommender as fast_module, recommendation_agent as agent_module
+from app.agents.fast_recommender import FastRecommender, FastRecommenderModel, item_key, load_product_rows
+from app.agents.retrieval import HashingEmbedder
+from app.agents.recommendation_agent import RecommendationAgent
+from app.core.security import create_access_token
+from app.models import Product, User as UserModel
+
+# (product_id, name, description, user_id): o mesmo produto aparece em várias linhas, uma por usuário.
+ROWS = [
+    (1, "Tênis de Corrida", "Tênis esportivo", 1),
+    (2, "Garrafa Térmica", "Garrafa para água", 1),
+    (3, "tenis de corrida", "", 2),
+    (4, "Garrafa Térmica", "", 2),
+    (5, "Tênis de Corrida", "", 3),
+    (6, "Relógio GPS", "Relógio para corrida", 3),
+    (7, "Cafeteira Expresso", "Máquina de café", 4),
+    (8, "Cafeteira Expresso", "", 5),
+    (9, "Cafeteira Expresso", "", 6),
+]
+
+
+def _model(rows=ROWS):
+    return FastRecommenderModel(rows, HashingEmbedder(128), neighbors=5)
+
+
+def test_rows_with_the_same_normalized_name_are_one_item():
+    model = _model()
+
+    assert item_key(" Tênis  de CORRIDA ") == "tenis de corrida"
+    assert len(model) == 4
+    assert model.product_ids[0] == 1
+    assert model.popular_items[:2] == [0, 3]
+
+
+def test_recommend_ranks_co_purchased_items_and_excludes_history():
+    recommendations = _model().recommend(["Tênis de Corrida"])
+
+    assert [r.product_id for r in recommendations] == [2, 6, 7]
+    assert "Tênis de Corrida" in recommendations[0].reason
+    assert recommendations[2].reason.startswith("Um dos produtos mais populares")
+
+
+def test_recommend_without_history_returns_most_popular():
+    recommendations = _model().recommend([])
+
+    assert [r.product_id for r in recommendations] == [1, 7, 2]
+
+
+def test_model_is_built_from_the_products_table(db_session: Session):
+    users = [UserModel(username=f"fast{i}", email=f"fast{i}@example.com", hashed_password="x") for i in range(2)]
+    db_session.add_all(users)
+    db_session.flush()
+    db_session.add_all([Product(name="Mouse", description="", user_id=u.id) for u in users])
+    db_session.add(Product(name="Teclado", description="", user_id=users[0].id))
+    db_session.commit()
+
+    model = FastRecommenderModel(load_product_rows(db_session, chunk_size=2), HashingEmbedder(64), neighbors=5)
+
+    assert [r.product_name for r in model.recommend(["mouse"])] == ["Teclado"]
+
+
+def test_llm_failure_falls_back_to_fast_recommender_then_generic():
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent()
+    user = UserModel(id=1, username="ana", email="ana@example.com")
+    user.products = [Product(id=1, name="Tênis de Corrida")]
+
+    with patch.object(agent_module, "get_fast_recommender") as get_fast:
+        get_fast.return_value.recommend.return_value = _model().recommend(["Tênis de Corrida"], k=2)
+        recommendations = agent.fast_recommendations(user)
+
+    assert [r.product_id for r in recommendations] == [2, 6, 901]
+
+
+def test_fast_mode_endpoint_skips_the_llm(client, db_session: Session, mock_recommendation_agent):
+    user = UserModel(username="rapido", email="rapido@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    mock_recommendation_agent.fast_recommendations.return_value = _model().recommend([])
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'rapido'})}"}
+    response = client.get("/api/v1/recommendations/?mode=fast", headers=headers)
+
+    assert response.status_code == 200
+    assert [r["product_id"] for r in response.json()] == [1, 7, 2]
+    mock_recommendation_agent.generate.assert_not_called()
+
+
+def test_content_neighbors_come_from_a_bounded_candidate_set(monkeypatch):
+    monkeypatch.setattr(fast_module, "CONTENT_POSTINGS_LIMIT", 5)
+    # "Camiseta" aparece em 40 itens; só os 5 mais populares entram na lista do termo.
+    rows = [(i, f"Camiseta Estampa {i}", "", None) for i in range(1, 41)]
+    rows += [(100, "Caneca Azul", "", 1), (101, "Caneca Vermelha", "", 2), (102, "Camiseta Estampa 1", "", 3)]
+
+    model = FastRecommenderModel(rows, HashingEmbedder(128), neighbors=2)
+
+    mug = model._index[item_key("Caneca Azul")]
+    assert [model.product_ids[n.item] for n in model.neighbors[mug]] == [101]
+    shirt = model._index[item_key("Camiseta Estampa 40")]
+    assert all(model.product_ids[n.item] <= 5 for n in model.neighbors[shirt])
+
+
+def test_start_builds_in_background_unless_asked_to_wait():
+    release = threading.Event()
+    recommender = FastRecommender()
+
+    def slow_refresh():
+        release.wait(5)
+        recommender.model = _model()
+
+    async def scenario():
+        with patch.object(recommender, "refresh", side_effect=slow_refresh):
+            await asyncio.wait_for(recommender.start(), timeout=1)
+            before = recommender.recommend(["Tênis de Corrida"])
+            release.set()
+            while not recommender.is_ready:
+                await asyncio.sleep(0.01)
+            after = recommender.recommend(["Tênis de Corrida"])
+            await recommender.stop()
+
+            waiting = FastRecommender()
+            with patch.object(waiting, "refresh", side_effect=lambda: setattr(waiting, "model", _model())):
+                await waiting.start(wait=True)
+                ready = waiting.is_ready
+                await waiting.stop()
+        return before, after, ready
+
+    before, after, ready = asyncio.run(scenario())
+
+    assert before == []
+    assert [r.product_id for r in after] == [2, 6, 7]
+    assert ready
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+
+from app.agents.history import (
+    EMPTY_HISTORY,
+    estimate_tokens,
+    format_user_products_info,
+    load_recent_histories,
+    load_recent_history,
+    select_history,
+    user_history,
+)
+from app.models import Product, User, UserProductInteraction
+
+
+def _products(*names):
+    return [SimpleNamespace(id=i + 1, name=name) for i, name in enumerate(names)]
+
+
+def test_estimate_tokens_counts_word_pieces_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Fone") == 1
+    assert estimate_tokens("Camiseta, azul") == 4
+
+
+def test_select_history_prefers_recent_distinct_and_diverse_items():
+    products = _products("Livro Antigo", "Camiseta Azul", "camiseta  azul", "Camiseta Verde", "Fone Sem Fio")
+
+    names, omitted = select_history(products, max_items=3)
+
+    # "camiseta azul" repete o tipo de "Camiseta Verde" e fica atrás do "Livro Antigo".
+    assert names == ["Livro Antigo", "Camiseta Verde", "Fone Sem Fio"]
+    assert omitted == 1
+
+
+def test_format_user_products_info_respects_token_budget():
+    products = _products(*[f"Produto Número {i}" for i in range(200)])
+
+    info = format_user_products_info(products, max_items=0, token_budget=40)
+
+    selected, _, suffix = info.partition(" (e mais ")
+    assert estimate_tokens(selected) <= 40
+    assert selected.endswith("Produto Número 199")
+    assert suffix.endswith("produtos)")
+    assert format_user_products_info([], max_items=0, token_budget=40) == EMPTY_HISTORY
+
+
+def _user_with_interactions(db_session: Session, username: str, count: int) -> User:
+    user = User(username=username, email=f"{username}@example.com", hashed_password="x")
+    products = [Product(name=f"{username} item {i}", description="longa " * 50) for i in range(count)]
+    db_session.add_all([user, *products])
+    db_session.flush()
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    db_session.add_all([
+        # Dois eventos por instante, para exercitar o desempate pelo ID no cursor.
+        UserProductInteraction(user_id=user.id, product_id=p.id, event_type="view", created_at=start + timedelta(minutes=i // 2))
+        for i, p in enumerate(products)
+    ])
+    db_session.commit()
+    return user
+
+
+def test_load_recent_history_pages_by_keyset_newest_first(db_session: Session):
+    user = _user_with_interactions(db_session, "keyset", 9)
+
+    pages, before = [], None
+    while True:
+        page = load_recent_history(db_session, user.id, limit=4, before=before)
+        if not page:
+            break
+        pages.append([item.name for item in page])
+        before = page[-1].cursor
+
+    assert [len(p) for p in pages] == [4, 4, 1]
+    assert sum(pages, []) == [f"keyset item {i}" for i in reversed(range(9))]
+    assert page == [] and load_recent_history(db_session, user.id, limit=2)[0].event_type == "view"
+
+
+def test_recent_histories_are_capped_per_user_in_one_query(db_session: Session):
+    first, second = [_user_with_interactions(db_session, name, count).id for name, count in (("lote_a", 5), ("lote_b", 2))]
+    statements = []
+    event.listen(db_session.connection(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    histories = load_recent_histories(db_session, [first, second, 0], limit=3)
+
+    assert len(statements) == 1
+    assert [item.name for item in histories[first]] == ["lote_a item 4", "lote_a item 3", "lote_a item 2"]
+    assert len(histories[second]) == 2 and histories[0] == []
+
+
+def test_user_history_is_chronological_and_products_with_owner_become_interactions(db_session: Session):
+    user = User(username="dono", email="dono@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    db_session.add_all([Product(name=name, user_id=user.id) for name in ("Livro", "Caneca")])
+    db_session.commit()
+
+    user.recent_history = load_recent_history(db_session, user.id)
+
+    assert [item.name for item in user_history(user)] == ["Livro", "Caneca"]
+    assert format_user_products_info(user_history(user)) == "Livro, Caneca"
+    # O histórico só é lido explicitamente; o relacionamento não carrega nada por acidente.
+    with pytest.raises(InvalidRequestError):
+        user.interactions
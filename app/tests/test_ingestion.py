@@ -0,0 +1,104 @@
+import json
+
+from sqlalchemy.orm import Session
+
+from app.core.security import verify_password
+from app.ingestion import Checkpoint, ingest_products, ingest_users, read_records
+from app.models import Product, User as UserModel
+
+
+def _engine(db_session: Session):
+    return db_session.get_bind()
+
+
+def test_ingest_users_inserts_skips_and_upserts(db_session: Session):
+    engine = _engine(db_session)
+    first = ingest_users(engine, [
+        {"username": "ana", "email": "ana@example.com", "password": "a"},
+        {"username": "bia", "email": "bia@example.com", "hashed_password": "hash-pronto"},
+        {"username": "ana", "email": "ana@example.com", "password": "nova"},
+        {"username": "sem-email", "password": "x"},
+    ], chunk_size=10)
+
+    assert (first.inserted, first.rejected, first.read) == (2, 1, 4)
+    ana = db_session.query(UserModel).filter_by(username="ana").one()
+    assert verify_password("nova", ana.hashed_password)
+
+    second = ingest_users(engine, [
+        {"username": "bia", "email": "bia@example.com", "hashed_password": "outro-hash"},
+        {"username": "caio", "email": "ana@example.com", "password": "c"},
+    ])
+    assert (second.inserted, second.skipped, second.rejected) == (0, 1, 1)
+
+    third = ingest_users(engine, [{"username": "bia", "email": "bia@example.com", "hashed_password": "outro-hash"}], upsert=True)
+    db_session.expire_all()
+    assert third.updated == 1
+    assert db_session.query(UserModel).filter_by(username="bia").one().hashed_password == "outro-hash"
+
+
+def test_ingest_products_resolves_owners_in_bulk_and_upserts(db_session: Session):
+    engine = _engine(db_session)
+    ingest_users(engine, [{"username": "ana", "email": "ana@example.com", "hashed_password": "x"}])
+    records = [
+        {"name": "Caneca", "description": "Branca", "username": "ana"},
+        {"name": "Caderno", "description": "", "username": "ana"},
+        {"name": "Lápis", "username": "desconhecido"},
+    ]
+
+    first = ingest_products(engine, records, chunk_size=2)
+    second = ingest_products(engine, [{"name": "Caneca", "description": "Azul", "username": "ana"}], upsert=True)
+
+    assert (first.inserted, first.rejected, first.chunks) == (2, 1, 2)
+    assert second.updated == 1
+    products = {p.name: p.description for p in db_session.query(Product).all()}
+    assert products == {"Caneca": "Azul", "Caderno": None}
+
+
+def test_ingest_products_rejects_unknown_owner_ids_without_losing_the_chunk(db_session: Session):
+    engine = _engine(db_session)
+    ingest_users(engine, [{"username": "bia", "email": "bia@example.com", "hashed_password": "x"}])
+    owner_id = db_session.query(UserModel.id).filter_by(username="bia").scalar()
+    records = [
+        {"name": "Mochila", "user_id": str(owner_id)},
+        {"name": "Garrafa", "user_id": "999999"},
+        {"name": "Boné", "user_id": "abc"},
+        {"name": "Caneta", "user_id": str(owner_id)},
+    ]
+
+    stats = ingest_products(engine, records, chunk_size=10)
+
+    assert (stats.inserted, stats.rejected) == (2, 2)
+    assert any("999999" in error for error in stats.errors)
+    assert {p.name for p in db_session.query(Product).all()} == {"Mochila", "Caneta"}
+
+
+def test_ingestion_resumes_from_checkpoint(db_session: Session, tmp_path):
+    source = tmp_path / "users.jsonl"
+    source.write_text("\n".join(
+        json.dumps({"username": f"u{i}", "email": f"u{i}@example.com", "hashed_password": "x"}) for i in range(10)
+    ) + "\n")
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    engine = _engine(db_session)
+
+    def stop_after_first_chunk(stats):
+        if stats.chunks == 1:
+            raise KeyboardInterrupt
+
+    try:
+        ingest_users(engine, read_records(str(source)), chunk_size=4,
+                     checkpoint=Checkpoint(checkpoint_path, str(source), "users"), progress=stop_after_first_chunk)
+    except KeyboardInterrupt:
+        pass
+    checkpoint = Checkpoint(checkpoint_path, str(source), "users")
+    resumed = ingest_users(engine, read_records(str(source)), chunk_size=4, checkpoint=checkpoint)
+
+    assert checkpoint.offset == 10
+    assert resumed.read == 6 and resumed.inserted == 6
+    assert db_session.query(UserModel).count() == 10
+
+
+def test_read_records_parses_csv(tmp_path):
+    source = tmp_path / "products.csv"
+    source.write_text("name,description,username\nCaneca,\"Branca, 300ml\",ana\n", encoding="utf-8")
+
+    assert list(read_records(str(source))) == [{"name": "Caneca", "description": "Branca, 300ml", "username": "ana"}]
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.agents.llm_scheduler import LLMQueueFullError, LLMQueueTimeoutError, LLMScheduler
+
+
+def test_run_limits_concurrency():
+    scheduler = LLMScheduler(max_concurrency=2, max_queue_size=10, queue_timeout=5)
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def kickoff():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        return "ok"
+
+    async def scenario():
+        return await asyncio.gather(*[scheduler.run(kickoff) for _ in range(6)])
+
+    assert asyncio.run(scenario()) == ["ok"] * 6
+    assert peak == 2
+    assert scheduler.stats()["completed"] == 6
+    scheduler.shutdown()
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue_size=1, queue_timeout=5)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(LLMQueueFullError) as exc_info:
+            async with scheduler.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+    assert error.retry_after >= 1
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_queue_deadline_expires():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue_size=5, queue_timeout=5)
+
+    async def scenario():
+        async with scheduler.slot():
+            with pytest.raises(LLMQueueTimeoutError):
+                async with scheduler.slot(timeout=0.01):
+                    pass
+
+    asyncio.run(scenario())
+    stats = scheduler.stats()
+    assert stats["timed_out"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_abandoned_executor_run_keeps_its_slot_until_the_thread_finishes():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue_size=5, queue_timeout=5)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            async with scheduler.slot():
+                await asyncio.wait_for(scheduler.run_in_executor(release.wait, 5), 0.05)
+        abandoned = scheduler.stats()["abandoned_running"]
+
+        # A thread ainda ocupa o único worker: nenhuma chamada nova é admitida.
+        with pytest.raises(LLMQueueTimeoutError):
+            async with scheduler.slot(timeout=0.05):
+                pass
+
+        release.set()
+        result = await scheduler.run(lambda: "ok", timeout=1)
+        return abandoned, result
+
+    assert asyncio.run(scenario()) == (1, "ok")
+    assert scheduler.stats()["abandoned_running"] == 0
+    scheduler.shutdown()
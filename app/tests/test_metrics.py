@@ -0,0 +1,84 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.orm import Session
+
+from app.agents.recommendation_agent import RecommendationAgent
+from app.core.metrics import (
+    DB_QUERY_DURATION,
+    HTTP_REQUEST_DURATION,
+    LLM_GENERATION_DURATION,
+    LLM_PARSE_DURATION,
+    LLM_TOKENS,
+    RECOMMENDATION_FALLBACKS,
+    MetricsRegistry,
+)
+from app.core.security import create_access_token
+from app.models import User as UserModel
+
+
+def test_registry_renders_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requisições", ("route",))
+    latency = registry.histogram("latency_seconds", "Latência", buckets=(0.1, 1.0))
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/a\\"b"} 3.0' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_count 3" in text
+    assert "latency_seconds_sum 5.55" in text
+
+
+def test_metrics_endpoint_exposes_route_and_db_latency(client, db_session: Session):
+    db_session.add(UserModel(username="gil", email="gil@example.com", hashed_password="x"))
+    db_session.commit()
+    db_selects = DB_QUERY_DURATION.count(operation="SELECT")
+    # Conforme a versão do FastAPI, o template da rota inclui ou não o prefixo do router.
+    def me_requests():
+        return sum(HTTP_REQUEST_DURATION.count(method="GET", route=route, status="200")
+                   for route in ("/api/v1/users/me/", "/users/me/"))
+    before = me_requests()
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'gil'})}"}
+    assert client.get("/api/v1/users/me/", headers=headers).status_code == 200
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert me_requests() == before + 1
+    assert 'users/me/",status="200"}' in response.text
+    assert DB_QUERY_DURATION.count(operation="SELECT") > db_selects
+    assert "llm_queue_depth" in response.text
+
+
+def test_direct_generation_records_stage_latency_tokens_and_fallbacks():
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    agent.engine = "direct"
+    agent.ollama_llm_instance.ainvoke = AsyncMock(return_value=MagicMock(
+        content="Product ID: 1, Name: Caneta, Reason: Escrita",
+        response_metadata={"prompt_eval_count": 120, "eval_count": 30},
+    ))
+    user = UserModel(id=3, username="hugo", email="hugo@example.com")
+    before = (
+        LLM_GENERATION_DURATION.count(engine="direct"),
+        LLM_PARSE_DURATION.count(engine="direct"),
+        LLM_TOKENS.value(engine="direct", kind="prompt"),
+        RECOMMENDATION_FALLBACKS.value(),
+    )
+
+    recommendations = asyncio.run(agent._run_engine(user, "Caderno"))
+
+    assert len(recommendations) == 3
+    assert LLM_GENERATION_DURATION.count(engine="direct") == before[0] + 1
+    assert LLM_PARSE_DURATION.count(engine="direct") == before[1] + 1
+    assert LLM_TOKENS.value(engine="direct", kind="prompt") == before[2] + 120
+    assert RECOMMENDATION_FALLBACKS.value() == before[3] + 1
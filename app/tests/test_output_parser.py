@@ -0,0 +1,71 @@
+import time
+
+from app.agents.output_parser import RecommendationStreamParser, parse_recommendation_line, parse_recommendations
+
+
+def test_parse_recommendation_line():
+    recommendation = parse_recommendation_line("Product ID: 7, Name: Café, Torrado, Reason: Intenso, encorpado")
+
+    assert recommendation.product_id == 7
+    assert recommendation.product_name == "Café, Torrado"
+    assert recommendation.reason == "Intenso, encorpado"
+    assert parse_recommendation_line("Aqui estão as recomendações:") is None
+
+
+def test_stream_parser_emits_each_line_when_complete():
+    parser = RecommendationStreamParser()
+    text = (
+        "Product ID: 1, Name: Livro, Reason: Leitura\n"
+        "Product ID: 2, Name: Fone, Reason: Música\n"
+        "Product ID: 3, Name: Planta, Reason: Decoração"
+    )
+    emitted = []
+    for i in range(0, len(text), 5):
+        emitted.append([r.product_id for r in parser.feed(text[i:i + 5])])
+
+    flat = [pid for batch in emitted for pid in batch]
+    assert flat == [1, 2]
+    assert [r.product_id for r in parser.close()] == [3]
+
+
+def test_parser_tolerates_bullets_numbering_and_markdown():
+    text = (
+        "Claro! Aqui estão minhas sugestões:\n\n"
+        "1. **Product ID:** 10, **Name:** Caneca, Reason: Para o café da manhã\n"
+        "- Product ID: 11 | Name: `Caderno` | Reason: Anotações  \n"
+        "* product id #12; name: Lápis; reason: Desenho\n"
+        "Espero ter ajudado!"
+    )
+
+    recommendations = parse_recommendations(text)
+
+    assert [(r.product_id, r.product_name, r.reason) for r in recommendations] == [
+        (10, "Caneca", "Para o café da manhã"),
+        (11, "Caderno", "Anotações"),
+        (12, "Lápis", "Desenho"),
+    ]
+
+
+def test_parser_drops_repeated_product_ids():
+    text = (
+        "Product ID: 5, Name: Livro, Reason: Leitura\n"
+        "Product ID: 5, Name: Livro, Reason: Repetido\n"
+        "Product ID: 6, Name: Fone, Reason: Música\n"
+    )
+
+    assert [r.reason for r in parse_recommendations(text)] == ["Leitura", "Música"]
+    assert len(parse_recommendations(text, dedupe=False)) == 3
+
+
+def test_parser_handles_long_rambling_output_in_linear_time():
+    rambling = "Product ID: 1, Name: " + "bla, " * 50_000 + "\n"
+    # Longas sequências de espaços no nome, com e sem rótulo "Reason" no fim.
+    whitespace = "Product ID: 3, Name: a" + " " * 200_000 + "x\n"
+    whitespace += "Product ID: 4, Name: a" + " " * 200_000 + "- " * 50_000 + "x\n"
+    text = rambling * 4 + whitespace + "Product ID: 2, Name: Fone, Reason: Música\n"
+
+    started = time.perf_counter()
+    recommendations = parse_recommendations(text)
+
+    assert [r.product_id for r in recommendations] == [2]
+    assert time.perf_counter() - started < 1.0
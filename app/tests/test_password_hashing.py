@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+from passlib.context import CryptContext
+from sqlalchemy.orm import Session
+
+from app.core import security
+from app.core.config import settings
+from app.models import User as UserModel
+
+
+def test_hashing_runs_off_the_event_loop_thread(monkeypatch):
+    threads = []
+    real_hash = security.get_password_hash
+
+    def recording_hash(password):
+        threads.append(threading.current_thread().name)
+        return real_hash(password)
+
+    monkeypatch.setattr(security, "get_password_hash", recording_hash)
+
+    async def scenario():
+        hashed = await security.hash_password("segredo")
+        return hashed, await security.verify_and_update_password("segredo", hashed)
+
+    hashed, (valid, new_hash) = asyncio.run(scenario())
+
+    assert threads[0].startswith("password-hash")
+    assert hashed.startswith(f"$pbkdf2-sha256${settings.PASSWORD_HASH_ROUNDS}$")
+    assert (valid, new_hash) == (True, None)
+
+
+def test_login_rehashes_passwords_stored_with_another_cost(client, db_session: Session):
+    old_context = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=1000)
+    user = UserModel(username="eva", email="eva@example.com", hashed_password=old_context.hash("segredo"))
+    db_session.add(user)
+    db_session.commit()
+    user_id = user.id
+
+    response = client.post("/api/v1/token", data={"username": "eva", "password": "segredo"})
+
+    assert response.status_code == 200
+    db_session.expire_all()
+    stored = db_session.get(UserModel, user_id).hashed_password
+    assert stored.startswith(f"$pbkdf2-sha256${settings.PASSWORD_HASH_ROUNDS}$")
+    assert security.verify_password("segredo", stored)
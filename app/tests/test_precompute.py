@@ -0,0 +1,151 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.agents import precompute
+from app.agents.history import format_user_products_info, history_fingerprint
+from app.core.security import create_access_token
+from app.models import Product, StoredRecommendation, User as UserModel
+from app.schemas import Recommendation, RecommendationResult
+
+VERSION = "modelo:v1"
+
+
+class FakeAgent:
+    cache = None
+    cache_version = VERSION
+
+    def __init__(self):
+        self.generated = []
+
+    async def generate(self, user_model, user_products_info):
+        self.generated.append(user_model.id)
+        return RecommendationResult(recommendations=[
+            Recommendation(product_id=1, product_name="Novo", reason=user_products_info)
+        ])
+
+
+def _user_with_products(db_session: Session, username: str, names):
+    user = UserModel(username=username, email=f"{username}@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    db_session.add_all([Product(name=name, description="", user_id=user.id) for name in names])
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+def _store_current(db_session: Session, user: UserModel):
+    info = format_user_products_info(user.products)
+    precompute.store_recommendations(
+        db_session, user.id,
+        [Recommendation(product_id=9, product_name="Gravado", reason="Teste")],
+        history_fingerprint(info, VERSION), VERSION,
+    )
+
+
+def test_stored_rows_become_stale_when_history_changes(db_session: Session):
+    user = _user_with_products(db_session, "ana", ["Livro"])
+    _store_current(db_session, user)
+
+    rows = precompute.get_stored_recommendations(db_session, user.id)
+    assert [r.product_name for r in rows] == ["Gravado"]
+    assert not precompute.is_stale(rows, history_fingerprint("Livro", VERSION), VERSION)
+    assert precompute.is_stale(rows, history_fingerprint("Livro, Caneta", VERSION), VERSION)
+    assert precompute.is_stale(rows, history_fingerprint("Livro", VERSION), "modelo:v2")
+
+
+def test_store_replaces_rows_and_reads_at_most_three(db_session: Session):
+    user = _user_with_products(db_session, "davi", ["Livro"])
+    recommendations = [Recommendation(product_id=i, product_name=f"Produto {i}", reason="Teste") for i in range(5)]
+    fingerprint = history_fingerprint("Livro", VERSION)
+    precompute.store_recommendations(db_session, user.id, recommendations, fingerprint, VERSION)
+    precompute.store_recommendations(db_session, user.id, recommendations[2:], fingerprint, VERSION)
+
+    assert db_session.query(StoredRecommendation).filter_by(user_id=user.id).count() == 3
+    precompute.store_recommendations(db_session, user.id, recommendations, fingerprint, VERSION)
+    rows = precompute.get_stored_recommendations(db_session, user.id)
+    assert [r.product_id for r in rows] == [0, 1, 2]
+
+    # Uma segunda gravação da mesma posição sem passar pela troca é recusada pelo banco.
+    db_session.add(StoredRecommendation(
+        user_id=user.id, position=0, product_name="Duplicada", reason="Teste",
+        history_fingerprint=fingerprint, model_version=VERSION, generated_at=rows[0].generated_at,
+    ))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+
+def test_refresh_only_regenerates_changed_users(db_session: Session):
+    unchanged = _user_with_products(db_session, "bia", ["Tênis"])
+    changed = _user_with_products(db_session, "caio", ["Relógio"])
+    _store_current(db_session, unchanged)
+    _store_current(db_session, changed)
+    changed_id, unchanged_id = changed.id, unchanged.id
+    db_session.add(Product(name="Pulseira", description="", user_id=changed_id))
+    db_session.commit()
+
+    agent = FakeAgent()
+    stats = asyncio.run(precompute.refresh_stale_recommendations(agent, session_factory=lambda: db_session))
+
+    assert changed_id in agent.generated
+    assert unchanged_id not in agent.generated
+    assert stats["refreshed"] == stats["stale"]
+    rows = precompute.get_stored_recommendations(db_session, changed_id)
+    assert rows[0].reason == "Relógio, Pulseira"
+
+
+def test_stale_users_are_preselected_in_sql_and_paged_by_key(db_session: Session, monkeypatch):
+    users = [_user_with_products(db_session, f"pag{i}", [f"Produto {i}"]) for i in range(5)]
+    for user in users:
+        _store_current(db_session, user)
+    ids = [u.id for u in users]
+    # Um usuário sem recomendações e dois com uma interação nova desde a geração.
+    db_session.query(StoredRecommendation).filter_by(user_id=ids[0]).delete()
+    db_session.add_all([Product(name="Novo", description="", user_id=ids[i]) for i in (2, 4)])
+    db_session.commit()
+
+    loaded = []
+    load = precompute.load_users_with_products
+
+    def recording_load(db, user_ids):
+        loaded.extend(user_ids)
+        return load(db, user_ids=user_ids)
+
+    monkeypatch.setattr(precompute, "load_users_with_products", recording_load)
+
+    first, after_id = precompute.find_stale_users(db_session, VERSION, after_id=ids[0] - 1, limit=2)
+    second, last = precompute.find_stale_users(db_session, VERSION, after_id=after_id, limit=2)
+
+    assert [u.id for u in first] == [ids[0], ids[2]] and after_id == ids[2]
+    assert [u.id for u in second] == [ids[4]] and last is None
+    # Os históricos dos usuários em dia nem chegam a ser carregados.
+    assert loaded == [ids[0], ids[2], ids[4]]
+
+
+def test_endpoint_serves_stored_rows_and_schedules_refresh_when_stale(client, db_session: Session, monkeypatch):
+    from app.agents.recommendation_agent import get_recommendation_agent
+    from app.api.endpoints import recommendations as endpoint
+
+    user = _user_with_products(db_session, "duda", ["Mochila"])
+    _store_current(db_session, user)
+    user_id = user.id
+    db_session.add(Product(name="Garrafa", description="", user_id=user_id))
+    db_session.commit()
+
+    agent = FakeAgent()
+    client.app.dependency_overrides[get_recommendation_agent] = lambda: agent
+    refresh = AsyncMock()
+    monkeypatch.setattr(endpoint, "refresh_user_recommendations", refresh)
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'duda'})}"}
+    response = client.get("/api/v1/recommendations/", headers=headers)
+
+    assert response.status_code == 200
+    assert [r["product_name"] for r in response.json()] == ["Gravado"]
+    assert agent.generated == []
+    refresh.assert_awaited_once_with(agent, user_id)
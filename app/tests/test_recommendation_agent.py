@@ -0,0 +1,305 @@
+import asyncio
+import os
+import subprocess
+import sys
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.agents import recommendation_agent as agent_module
+from app.agents.recommendation_agent import RecommendationAgent, get_recommendation_agent
+from app.models import User as UserModel
+
+_RealAsyncClient = httpx.AsyncClient
+
+
+def _mock_tags_client(models):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/tags"
+        return httpx.Response(200, json={"models": [{"name": name} for name in models]})
+
+    def factory(*args, **kwargs):
+        kwargs["transport"] = httpx.MockTransport(handler)
+        return _RealAsyncClient(*args, **kwargs)
+
+    return factory
+
+
+def test_agent_init_does_not_call_llm():
+    with patch("app.agents.recommendation_agent.ChatOllama") as mock_ollama:
+        agent = RecommendationAgent()
+
+    mock_ollama.return_value.invoke.assert_not_called()
+    assert agent.is_ready is False
+
+
+def test_get_recommendation_agent_is_singleton(monkeypatch):
+    monkeypatch.setattr(agent_module, "_recommendation_agent", None)
+    with patch("app.agents.recommendation_agent.ChatOllama") as mock_ollama:
+        first = get_recommendation_agent()
+        second = get_recommendation_agent()
+
+    assert first is second
+    assert mock_ollama.call_count == 1
+
+
+def test_check_connection_ready_when_model_is_pulled(monkeypatch):
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent()
+
+    monkeypatch.setattr(agent_module.httpx, "AsyncClient", _mock_tags_client([agent.model_name]))
+    assert asyncio.run(agent.check_connection()) is True
+    assert agent.is_ready is True
+
+    monkeypatch.setattr(agent_module.httpx, "AsyncClient", _mock_tags_client(["outro-modelo:latest"]))
+    assert asyncio.run(agent.check_connection()) is False
+    assert agent.is_ready is False
+
+
+def test_concurrent_calls_share_a_single_generation():
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    agent.cache = None
+
+    calls = 0
+
+    async def slow_crew(user_model, user_products_info, candidates=()):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return agent._get_fallback_recommendations()
+
+    agent._run_crew = slow_crew
+    user = UserModel(id=7, username="carol", email="carol@example.com")
+
+    async def scenario():
+        return await asyncio.gather(*[agent.generate_recommendations(user, "Livro") for _ in range(5)])
+
+    results = asyncio.run(scenario())
+
+    assert calls == 1
+    assert all(r == results[0] for r in results)
+    assert agent._single_flight.coalesced == 4
+
+
+def test_cancelled_waiter_does_not_cancel_shared_generation():
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    agent.cache = None
+
+    async def slow_crew(user_model, user_products_info, candidates=()):
+        await asyncio.sleep(0.05)
+        return agent._get_fallback_recommendations()[:2]
+
+    agent._run_crew = slow_crew
+    user = UserModel(id=8, username="dave", email="dave@example.com")
+
+    async def scenario():
+        first = asyncio.create_task(agent.generate_recommendations(user, "Fone"))
+        second = asyncio.create_task(agent.generate_recommendations(user, "Fone"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+
+    assert first.cancelled()
+    assert [r.product_id for r in result] == [901, 902, 903]
+
+
+def test_fallback_fill_skips_ids_already_in_the_list():
+    from app.agents.retrieval import Candidate
+    from app.schemas import Recommendation
+
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    partial = [Recommendation(product_id=902, product_name="Fone", reason="Do LLM")]
+    candidate = Candidate(product_id=7, name="Caneta", description="", score=1.0)
+
+    assert [r.product_id for r in agent._complete_with_fallbacks(partial, [])] == [902, 901, 903]
+    assert [r.product_id for r in agent._complete_with_fallbacks([], [candidate])] == [7, 901, 902]
+    assert [r.product_id for r in agent._fill_with_fallbacks(list(partial))] == [902, 901, 903]
+
+
+def test_grounding_runs_before_fallbacks_are_counted():
+    from app.agents.retrieval import Candidate
+    from app.core.metrics import RECOMMENDATION_FALLBACKS, RECOMMENDATION_LINES
+    from app.schemas import Recommendation
+
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    candidates = [Candidate(product_id=pid, name=f"Produto {pid}", description="", score=1.0) for pid in (5, 6, 7)]
+    llm_output = [Recommendation(product_id=6, product_name="Produto 6", reason="Do LLM")]
+    before = (
+        RECOMMENDATION_FALLBACKS.value(),
+        RECOMMENDATION_LINES.value(source="fallback"),
+        RECOMMENDATION_LINES.value(source="llm"),
+        RECOMMENDATION_LINES.value(source="candidate"),
+    )
+
+    recommendations = agent._complete_with_fallbacks(llm_output, candidates)
+
+    # A lista é completada pelos candidatos: nenhum fallback genérico chega ao usuário.
+    assert [r.product_id for r in recommendations] == [6, 5, 7]
+    assert RECOMMENDATION_FALLBACKS.value() == before[0]
+    assert RECOMMENDATION_LINES.value(source="fallback") == before[1]
+    assert RECOMMENDATION_LINES.value(source="llm") == before[2] + 1
+    assert RECOMMENDATION_LINES.value(source="candidate") == before[3] + 2
+
+
+def test_direct_engine_calls_llm_once_and_parses_output():
+    from langchain_core.messages import AIMessage
+
+    with patch("app.agents.recommendation_agent.ChatOllama") as mock_ollama:
+        agent = RecommendationAgent()
+    agent.cache = None
+    agent.engine = "direct"
+    mock_ollama.return_value.ainvoke = AsyncMock(return_value=AIMessage(
+        content=(
+            "Product ID: 101, Name: Smartwatch, Reason: Ótimo para saúde\n"
+            "Product ID: 102, Name: Fone, Reason: Qualidade de áudio\n"
+            "Product ID: 103, Name: E-reader, Reason: Leitura confortável"
+        ),
+        response_metadata={"prompt_eval_count": 250, "eval_count": 60},
+    ))
+    user = UserModel(id=9, username="erin", email="erin@example.com")
+
+    recommendations = asyncio.run(agent.generate_recommendations(user, "Livro de Ficção Científica"))
+
+    assert [r.product_id for r in recommendations] == [101, 102, 103]
+    mock_ollama.return_value.ainvoke.assert_awaited_once()
+    prompt = mock_ollama.return_value.ainvoke.await_args.args[0][1].content
+    assert "Livro de Ficção Científica" in prompt
+    assert agent.token_usage["direct"] == {"calls": 1, "prompt_tokens": 250, "completion_tokens": 60}
+
+
+def test_stream_recommendations_yields_incrementally_and_fills_fallbacks():
+    from langchain_core.messages import AIMessageChunk
+
+    with patch("app.agents.recommendation_agent.ChatOllama") as mock_ollama:
+        agent = RecommendationAgent()
+    agent.cache = None
+
+    async def astream(messages):
+        for token in ["Product ID: 11, Name: Mochila,", " Reason: Viagens\nProduct", " ID: 12, Name: Garrafa, Reason: Hidratação"]:
+            yield AIMessageChunk(content=token)
+
+    mock_ollama.return_value.astream = astream
+    user = UserModel(id=10, username="frank", email="frank@example.com")
+
+    async def collect():
+        return [r async for r in agent.stream_recommendations(user, "Barraca")]
+
+    recommendations = asyncio.run(collect())
+
+    assert [r.product_id for r in recommendations] == [11, 12, 901]
+
+
+def test_generation_is_grounded_in_retrieved_candidates(monkeypatch):
+    from app.agents.retrieval import HashingEmbedder, ProductIndex
+    from app.models import Product
+
+    index = ProductIndex(HashingEmbedder(128))
+    index.upsert_many([
+        (1, "Tênis de Corrida", "Tênis leve para corrida"),
+        (2, "Meia de Corrida", "Meia para tênis de corrida"),
+        (3, "Bermuda de Corrida", "Bermuda leve para corrida"),
+        (4, "Boné de Corrida", "Boné leve para corrida"),
+    ])
+    monkeypatch.setattr(agent_module, "get_product_index", lambda: index)
+
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent()
+    agent.cache = None
+    agent.engine = "direct"
+    agent._run_direct = AsyncMock(return_value=[
+        agent._get_fallback_recommendations()[0].model_copy(update={"product_id": 3}),
+        agent._get_fallback_recommendations()[1].model_copy(update={"product_id": 777}),
+    ])
+    user = UserModel(id=11, username="gabi", email="gabi@example.com")
+    user.products = [Product(id=1, name="Tênis de Corrida")]
+
+    recommendations = asyncio.run(agent.generate_recommendations(user, "Tênis de Corrida"))
+
+    candidates = agent._run_direct.await_args.args[2]
+    assert {c.product_id for c in candidates} == {2, 3, 4}
+    assert recommendations[0].product_id == 3
+    assert {r.product_id for r in recommendations} <= {2, 3, 4}
+    assert len(recommendations) == 3
+
+
+def test_structured_output_repairs_invalid_json_once(monkeypatch):
+    from langchain_core.messages import AIMessage
+
+    from app.core.metrics import LLM_OUTPUT_PARSES
+
+    monkeypatch.setattr(agent_module.settings, "STRUCTURED_OUTPUT_REPAIR_ATTEMPTS", 1)
+    with patch("app.agents.recommendation_agent.ChatOllama") as mock_ollama:
+        agent = RecommendationAgent(cache=None)
+    agent.output_format = "schema"
+    valid = '{"recommendations": [' + ", ".join(
+        f'{{"product_id": {i}, "product_name": "Produto {i}", "reason": "Motivo"}}' for i in (1, 2, 3)
+    ) + "]}"
+    mock_ollama.return_value.ainvoke = AsyncMock(side_effect=[
+        AIMessage(content='{"recommendations": [{"product_id": 1}]}'),
+        AIMessage(content=valid),
+    ])
+    repaired = LLM_OUTPUT_PARSES.value(format="schema", outcome="repaired")
+    user = UserModel(id=4, username="iris", email="iris@example.com")
+
+    recommendations = asyncio.run(agent._run_direct(user, "Caderno"))
+
+    assert [r.product_id for r in recommendations] == [1, 2, 3]
+    assert LLM_OUTPUT_PARSES.value(format="schema", outcome="repaired") == repaired + 1
+    first_call, second_call = mock_ollama.return_value.ainvoke.await_args_list
+    assert first_call.kwargs["format"]["properties"]["recommendations"]["maxItems"] == 3
+    assert "não é válida" in second_call.args[0][-1].content
+
+
+def test_structured_output_falls_back_to_line_parser_after_budget(monkeypatch):
+    from langchain_core.messages import AIMessage
+
+    from app.core.metrics import LLM_OUTPUT_PARSES
+
+    monkeypatch.setattr(agent_module.settings, "STRUCTURED_OUTPUT_REPAIR_ATTEMPTS", 1)
+    with patch("app.agents.recommendation_agent.ChatOllama") as mock_ollama:
+        agent = RecommendationAgent(cache=None)
+    agent.engine = "direct"
+    agent.output_format = "json"
+    mock_ollama.return_value.ainvoke = AsyncMock(return_value=AIMessage(
+        content="Product ID: 7, Name: Caneca, Reason: Café"
+    ))
+    failed = LLM_OUTPUT_PARSES.value(format="json", outcome="failed")
+    user = UserModel(id=5, username="joao", email="joao@example.com")
+
+    recommendations = asyncio.run(agent._run_engine(user, "Caderno"))
+
+    assert mock_ollama.return_value.ainvoke.await_count == 2
+    assert mock_ollama.return_value.ainvoke.await_args.kwargs["format"] == "json"
+    assert [r.product_id for r in recommendations] == [7, 901, 902]
+    assert LLM_OUTPUT_PARSES.value(format="json", outcome="failed") == failed + 1
+
+
+def test_importing_the_app_does_not_load_crewai_or_touch_the_database(tmp_path):
+    database = tmp_path / "import.db"
+    code = (
+        "import sys, app.main; "
+        "print(sorted(m for m in ('crewai', 'litellm', 'langchain_community.chat_models.ollama') if m in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{database}"},
+        capture_output=True, text=True, check=True,
+    )
+
+    assert completed.stdout.strip() == "[]"
+    assert not database.exists()
+
+
+def test_lazy_chat_ollama_is_patchable_and_restored():
+    with patch("app.agents.recommendation_agent.ChatOllama") as mock_ollama:
+        agent = RecommendationAgent(cache=None)
+        assert agent.ollama_llm_instance is mock_ollama.return_value
+
+    assert agent_module.ChatOllama.__name__ == "ChatOllama"
@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy.orm import Session
+
+from app.agents.recommendation_cache import InMemoryCacheBackend, RecommendationCache, get_recommendation_cache
+from app.core.cache import TTLCache
+from app.models import Product, User as UserModel
+from app.schemas import Recommendation
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _recommendations():
+    return [Recommendation(product_id=i, product_name=f"Produto {i}", reason="Teste") for i in (1, 2, 3)]
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, timer=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+def test_recommendation_cache_hit_requires_same_history_and_version():
+    cache = RecommendationCache(InMemoryCacheBackend(max_entries=10, ttl=60), ttl=60)
+    cache.set(1, "Camiseta, Tênis", "v1", _recommendations())
+
+    assert cache.get(1, "Camiseta, Tênis", "v1") == _recommendations()
+    assert cache.get(1, "Camiseta, Tênis, Livro", "v1") is None
+    assert cache.get(1, "Camiseta, Tênis", "v2") is None
+    assert cache.get(2, "Camiseta, Tênis", "v1") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+
+
+def test_new_product_invalidates_user_entry(db_session: Session):
+    user = UserModel(username="cache_user", email="cache_user@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+
+    cache = get_recommendation_cache()
+    cache.set(user.id, "nenhum histórico de produtos relevante", "v1", _recommendations())
+
+    db_session.add(Product(name="Mochila", description="Mochila de viagem", user_id=user.id))
+    db_session.commit()
+
+    assert cache.get(user.id, "nenhum histórico de produtos relevante", "v1") is None
+
+
+def test_agent_serves_repeated_calls_from_cache():
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        from app.agents.recommendation_agent import RecommendationAgent
+        agent = RecommendationAgent(cache=RecommendationCache(InMemoryCacheBackend(max_entries=10, ttl=60), ttl=60))
+
+    user = UserModel(id=42, username="bob", email="bob@example.com")
+    agent._run_crew = AsyncMock(return_value=_recommendations())
+
+    first = asyncio.run(agent.generate_recommendations(user, "Smartwatch"))
+    second = asyncio.run(agent.generate_recommendations(user, "Smartwatch"))
+
+    assert first == second == _recommendations()
+    agent._run_crew.assert_awaited_once()
@@ -0,0 +1,61 @@
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core.security import create_access_token
+from app.models import User as UserModel
+from app.schemas import Recommendation
+
+
+class FakeStreamingAgent:
+    cache = None
+    circuit_open = False
+
+    async def stream_recommendations(self, user_model, user_products_info):
+        for product_id in (1, 2, 3):
+            yield Recommendation(product_id=product_id, product_name=f"Produto {product_id}", reason=user_products_info)
+
+
+def _auth_headers(db_session: Session) -> dict:
+    user = UserModel(username="streamer", email="streamer@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+
+
+def _override_agent(client: TestClient):
+    from app.agents.recommendation_agent import get_recommendation_agent
+    client.app.dependency_overrides[get_recommendation_agent] = lambda: FakeStreamingAgent()
+
+
+def test_stream_recommendations_ndjson(client: TestClient, db_session: Session):
+    _override_agent(client)
+    response = client.get("/api/v1/recommendations/stream", headers=_auth_headers(db_session))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["product_id"] for item in items] == [1, 2, 3]
+
+
+def test_stream_recommendations_sse(client: TestClient, db_session: Session):
+    _override_agent(client)
+    response = client.get("/api/v1/recommendations/stream?format=sse", headers=_auth_headers(db_session))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [json.loads(e).get("product_id") for e in events] == [1, 2, 3, None]
+
+
+def test_stream_marks_degraded_response_when_circuit_is_open(client: TestClient, db_session: Session):
+    from app.agents.recommendation_agent import get_recommendation_agent
+
+    agent = FakeStreamingAgent()
+    agent.circuit_open = True
+    client.app.dependency_overrides[get_recommendation_agent] = lambda: agent
+    response = client.get("/api/v1/recommendations/stream", headers=_auth_headers(db_session))
+
+    assert response.status_code == 200
+    assert response.headers["x-recommendation-degraded"] == "true"
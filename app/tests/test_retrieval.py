@@ -0,0 +1,160 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from app.agents.retrieval import HashingEmbedder, ProductIndex
+
+CATALOG = [
+    (1, "Tênis de Corrida Leve", "Tênis esportivo com amortecimento para corrida"),
+    (2, "Meia Esportiva para Corrida", "Meia respirável para tênis de corrida"),
+    (3, "Livro de Ficção Científica", "Romance sobre viagens no tempo"),
+    (4, "Box de Livros de Fantasia", "Coleção de livros de ficção e fantasia"),
+    (5, "Cafeteira Expresso", "Máquina de café compacta"),
+]
+
+
+def _index(dim=256):
+    index = ProductIndex(HashingEmbedder(dim))
+    index.upsert_many(CATALOG)
+    return index
+
+
+def test_embeddings_are_normalized_and_deterministic():
+    embedder = HashingEmbedder(128)
+    first = embedder.embed("Tênis de Corrida")
+    assert np.allclose(first, embedder.embed("tenis de corrida"))
+    assert np.isclose(np.linalg.norm(first), 1.0)
+
+
+def test_similar_to_history_excludes_history_and_ranks_by_similarity():
+    index = _index()
+
+    running = [pid for pid, _ in index.similar_to_history([1], k=2)]
+    books = [pid for pid, _ in index.similar_to_history([3], k=1)]
+
+    assert running[0] == 2
+    assert 1 not in running
+    assert books == [4]
+
+
+def test_repeated_history_ids_are_excluded_once():
+    index = _index()
+
+    # Um produto visto e depois comprado aparece duas vezes no histórico.
+    assert len(index.similar_to_history([1, 1, 1], k=3)) == 3
+    assert index.similar_to_history([1, 1, 1], k=3) == index.similar_to_history([1], k=3)
+
+
+def test_incremental_upsert_grows_and_updates_the_index():
+    index = ProductIndex(HashingEmbedder(64))
+    for product_id in range(1, 200):
+        index.upsert(product_id, f"Produto {product_id}", "")
+    assert len(index) == 199
+
+    index.upsert(5, "Cafeteira Italiana", "Café")
+    assert len(index) == 199
+    assert index.get(5) == ("Cafeteira Italiana", "Café")
+
+    index.upsert(500, "Moedor de Café", "Para cafeteira italiana")
+    candidates = index.candidates_for_history([5], k=1)
+    assert candidates[0].product_id == 500
+
+
+def test_index_picks_up_products_inserted_outside_the_orm(db_session, monkeypatch):
+    from app.agents import retrieval
+    from app.agents.recommendation_agent import RecommendationAgent
+    from app.models import Product
+
+    monkeypatch.setattr(retrieval, "_product_index", None)
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_ENABLED", True)
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    ungrounded_version = agent.cache_version
+
+    # INSERTs do Core (como os do ingest_data.py) não disparam o evento do ORM.
+    db_session.execute(Product.__table__.insert(), [{"name": name, "description": d} for _, name, d in CATALOG[:3]])
+    db_session.commit()
+    index = retrieval.load_product_index(lambda: db_session)
+    db_session.execute(Product.__table__.insert(), [{"name": name, "description": d} for _, name, d in CATALOG[3:]])
+    db_session.commit()
+
+    assert index.is_ready and len(index) == 3
+    assert agent.cache_version == f"{ungrounded_version}:grounded"
+    assert retrieval.refresh_product_index(lambda: db_session) == 2
+    assert retrieval.refresh_product_index(lambda: db_session) == 0
+    assert {index.get(pid)[0] for pid in index._rows} == {name for _, name, _ in CATALOG}
+
+
+def test_orm_writes_reach_the_index_only_after_commit(db_session, monkeypatch):
+    from app.agents import retrieval
+    from app.models import Product
+
+    monkeypatch.setattr(retrieval, "_product_index", ProductIndex(HashingEmbedder(64)))
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_ENABLED", True)
+    index = retrieval.get_product_index()
+
+    db_session.add(Product(name="Produto Fantasma", description="Desfeito"))
+    db_session.flush()
+    db_session.rollback()
+    assert len(index) == 0
+
+    product = Product(name="Cafeteira", description="Expresso")
+    db_session.add(product)
+    db_session.flush()
+    assert len(index) == 0
+    db_session.commit()
+    assert index.get(product.id) == ("Cafeteira", "Expresso")
+
+
+def test_candidates_are_retrieved_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    from app.agents import retrieval
+    from app.agents.recommendation_agent import RecommendationAgent
+    from app.models import Product, User
+
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_ENABLED", True)
+    with patch("app.agents.recommendation_agent.ChatOllama"):
+        agent = RecommendationAgent(cache=None)
+    user = User(id=1, username="ana", email="ana@example.com")
+    user.recent_history = [Product(id=1, name="Tênis"), Product(id=2, name="Meia"), Product(id=1, name="Tênis")]
+    calls = []
+
+    def candidates_for_history(history_ids, k):
+        calls.append((history_ids, threading.current_thread()))
+        return []
+
+    with patch.object(retrieval.get_product_index(), "candidates_for_history", side_effect=candidates_for_history):
+        asyncio.run(agent._retrieve_candidates(user))
+
+    assert calls[0][0] == [1, 2]
+    assert calls[0][1] is not threading.main_thread()
+
+
+def test_index_loader_does_not_block_startup(client, monkeypatch):
+    import asyncio
+    import threading
+
+    from app.agents import retrieval
+
+    release = threading.Event()
+
+    def slow_load(session_factory):
+        release.wait(5)
+        return retrieval.get_product_index()
+
+    async def scenario():
+        loader = retrieval.ProductIndexLoader()
+        with patch.object(retrieval, "load_product_index", side_effect=slow_load) as load:
+            # Retorna com a carga ainda em andamento, em segundo plano.
+            await asyncio.wait_for(loader.start(), timeout=1)
+            await asyncio.sleep(0.05)
+            loading = load.called and not release.is_set()
+            release.set()
+            await loader.stop()
+        return loading
+
+    assert asyncio.run(scenario())
+    catalog = client.get("/health/catalog").json()
+    assert set(catalog) == {"retrieval", "fast_recommender"}
@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.agents.batch import generate_batch, load_users_with_products, offline_agent
+from app.core.config import settings
+from app.database import SessionLocal
+
+
+async def run_batch(user_ids, start_id, end_id, concurrency, output):
+    db = SessionLocal()
+    try:
+        users = load_users_with_products(db, user_ids=user_ids, start_id=start_id, end_id=end_id)
+    finally:
+        db.close()
+    print(f"{len(users)} usuários carregados.", file=sys.stderr)
+
+    started = time.perf_counter()
+    done = failed = 0
+    async with offline_agent() as agent:
+        async for result in generate_batch(agent, users, concurrency=concurrency):
+            output.write(result.model_dump_json() + "\n")
+            output.flush()
+            done += 1
+            failed += result.fallback
+
+    elapsed = time.perf_counter() - started
+    print(f"Lote concluído: {done} usuários ({failed} com fallback) em {elapsed:.1f}s.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-computa recomendações para vários usuários (saída em JSONL).")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--user-ids", type=int, nargs="+", help="IDs dos usuários")
+    selection.add_argument("--range", type=int, nargs=2, metavar=("START_ID", "END_ID"), help="Intervalo inclusivo de IDs")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    parser.add_argument("--output", help="Arquivo JSONL de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    start_id, end_id = args.range if args.range else (None, None)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        asyncio.run(run_batch(args.user_ids, start_id, end_id, args.concurrency, output))
+    finally:
+        if args.output:
+            output.close()
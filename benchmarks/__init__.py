@@ -0,0 +1 @@
+"""Scripts de benchmark do sistema de recomendação (executar com `python -m benchmarks.<script>`)."""
@@ -0,0 +1,63 @@
+"""
+Compara latência e tokens dos motores de geração "crew" e "direct".
+
+Executa as duas implementações contra o Ollama configurado em OLLAMA_BASE_URL,
+com o cache desativado, e imprime um resumo em JSON:
+
+    python -m benchmarks.compare_engines --runs 5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.agents.recommendation_agent import RecommendationAgent
+from app.models import User as UserModel
+from benchmarks.stats import percentile
+
+SAMPLE_HISTORY = "Camiseta de Algodão, Calça Jeans Slim Fit, Livro de Ficção Científica"
+
+
+async def _bench_engine(agent: RecommendationAgent, engine: str, runs: int) -> dict:
+    user = UserModel(id=1, username="benchmark", email="benchmark@example.com")
+    run = agent._run_direct if engine == "direct" else agent._run_crew
+    latencies = []
+    parsed = 0
+    before = dict(agent.token_usage[engine])
+
+    for _ in range(runs):
+        started = time.perf_counter()
+        recommendations = await run(user, SAMPLE_HISTORY)
+        latencies.append(time.perf_counter() - started)
+        parsed += len(recommendations)
+
+    after = agent.token_usage[engine]
+    return {
+        "engine": engine,
+        "runs": runs,
+        "latency_mean_s": statistics.mean(latencies),
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "prompt_tokens_per_run": (after["prompt_tokens"] - before["prompt_tokens"]) / runs,
+        "completion_tokens_per_run": (after["completion_tokens"] - before["completion_tokens"]) / runs,
+        "recommendations_per_run": parsed / runs,
+    }
+
+
+async def main(runs: int, engines: list):
+    agent = RecommendationAgent()
+    agent.cache = None
+    try:
+        results = [await _bench_engine(agent, engine, runs) for engine in engines]
+    finally:
+        await agent.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--engines", nargs="+", choices=["crew", "direct"], default=["crew", "direct"])
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.engines))
@@ -0,0 +1,207 @@
+"""
+Servidor HTTP local que imita a API do Ollama para benchmarks e testes de carga.
+
+Responde `/api/tags`, `/api/chat` e `/api/generate` (com ou sem streaming NDJSON),
+com latência até o primeiro token e taxa de tokens configuráveis. A saída segue o
+formato `Product ID: ..., Name: ..., Reason: ...` (ou JSON, se a requisição trouxer
+`format`) e é determinística para o mesmo prompt; quando o prompt traz produtos
+candidatos (`- ID <n>: <nome>`), eles são usados.
+
+    python -m benchmarks.fake_ollama --port 11500 --latency 0.5 --tokens-per-second 40
+    OLLAMA_BASE_URL=http://localhost:11500 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_MODEL = "llama2:7b-chat-q2_K"
+
+CATALOG = [
+    ("Garrafa Térmica de Aço", "Mantém bebidas na temperatura certa por horas."),
+    ("Fone de Ouvido Bluetooth", "Boa autonomia de bateria para o dia a dia."),
+    ("Mochila Impermeável", "Protege os itens em deslocamentos diários."),
+    ("Luminária de Mesa LED", "Iluminação confortável para leitura e trabalho."),
+    ("Caderno Pontilhado", "Versátil para anotações e planejamento."),
+    ("Tênis de Corrida Leve", "Amortecimento adequado para treinos regulares."),
+    ("Cafeteira Italiana", "Café encorpado com preparo simples."),
+    ("Kindle Paperwhite", "Leitura confortável em qualquer ambiente."),
+]
+
+_CANDIDATE_PATTERN = re.compile(r"^- ID (\d+): ([^(\n]+)", re.MULTILINE)
+_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def build_completion(prompt: str, seed: int = 0, structured: bool = False) -> str:
+    """
+    Resposta determinística no formato esperado pelo parser do agente; com `structured`,
+    o JSON de `RecommendationList` (como no `format` do Ollama).
+    """
+    rng = random.Random(f"{seed}:{prompt}")
+    candidates = [(int(pid), name.strip()) for pid, name in _CANDIDATE_PATTERN.findall(prompt)]
+    if len(candidates) >= 3:
+        picks = [(pid, name, "Combina com os produtos do histórico do usuário.") for pid, name in rng.sample(candidates, 3)]
+    else:
+        picks = [(rng.randint(1000, 9999), name, reason) for name, reason in rng.sample(CATALOG, 3)]
+    if structured:
+        return json.dumps({"recommendations": [
+            {"product_id": pid, "product_name": name, "reason": reason} for pid, name, reason in picks
+        ]}, ensure_ascii=False)
+    return "\n".join(f"Product ID: {pid}, Name: {name}, Reason: {reason}" for pid, name, reason in picks)
+
+
+def _prompt_text(body: dict) -> str:
+    if "messages" in body:
+        return "\n".join(m.get("content", "") for m in body["messages"])
+    return body.get("prompt", "")
+
+
+def create_app(
+    latency: float = 0.0,
+    tokens_per_second: float = 0.0,
+    model: str = DEFAULT_MODEL,
+    seed: int = 0,
+    error_rate: float = 0.0,
+    prompt_tokens_per_second: float = 0.0,
+) -> FastAPI:
+    """
+    Cria a aplicação do servidor falso.
+
+    `latency` é o tempo até o primeiro token; `tokens_per_second` (0 = sem limite) controla
+    o ritmo dos tokens seguintes; `prompt_tokens_per_second` (0 = sem custo) soma à latência
+    o tempo de avaliação do prompt; `error_rate` é a fração de gerações que respondem 500.
+    """
+    app = FastAPI(title="Fake Ollama")
+    app.state.requests = 0
+    app.state.loads = 0
+    app.state.bodies = []
+    errors = random.Random(seed)
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model, "model": model}]}
+
+    async def _generate(request: Request, chat: bool):
+        body = await request.json()
+        if not chat and not body.get("prompt"):
+            # Sem prompt, o Ollama apenas carrega o modelo (e renova o keep_alive).
+            app.state.loads += 1
+            return {"model": body.get("model", model), "response": "", "done": True, "done_reason": "load"}
+        app.state.requests += 1
+        app.state.bodies.append(body)
+        if error_rate and errors.random() < error_rate:
+            return JSONResponse(status_code=500, content={"error": "falha simulada"})
+
+        prompt = _prompt_text(body)
+        completion = build_completion(prompt, seed, structured=bool(body.get("format")))
+        tokens: List[str] = _TOKEN_PATTERN.findall(completion)
+        prompt_tokens = len(prompt.split())
+        first_token = latency + (prompt_tokens / prompt_tokens_per_second if prompt_tokens_per_second else 0)
+
+        def chunk(text: str, done: bool, duration: Optional[float] = None) -> dict:
+            payload = {
+                "model": body.get("model", model),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "done": done,
+            }
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            if done:
+                payload.update({
+                    "done_reason": "stop",
+                    "total_duration": int((duration or 0) * 1e9),
+                    "prompt_eval_count": prompt_tokens,
+                    "eval_count": len(tokens),
+                })
+            return payload
+
+        async def stream() -> AsyncIterator[str]:
+            started = time.perf_counter()
+            await asyncio.sleep(first_token)
+            for token in tokens:
+                yield json.dumps(chunk(token, False)) + "\n"
+                if tokens_per_second:
+                    await asyncio.sleep(1 / tokens_per_second)
+            yield json.dumps(chunk("", True, time.perf_counter() - started)) + "\n"
+
+        if body.get("stream", True):
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+        started = time.perf_counter()
+        await asyncio.sleep(first_token + (len(tokens) / tokens_per_second if tokens_per_second else 0))
+        return chunk(completion, True, time.perf_counter() - started)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        return await _generate(request, chat=True)
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        return await _generate(request, chat=False)
+
+    return app
+
+
+class FakeOllamaServer:
+    """Executa o servidor falso em uma thread (para testes e benchmarks no mesmo processo)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **app_options):
+        self.app = create_app(**app_options)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("O servidor Ollama falso não iniciou")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.5, help="Segundos até o primeiro token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="0 = sem limite")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0, help="0 = avaliação do prompt sem custo")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(
+            args.latency, args.tokens_per_second, args.model, args.seed, args.error_rate, args.prompt_tokens_per_second
+        ),
+        host=args.host, port=args.port, log_level="warning",
+    )
@@ -0,0 +1,137 @@
+"""
+Teste de carga de ponta a ponta contra a aplicação em execução, via HTTP.
+
+Cada usuário virtual cria sua conta, faz login e pede recomendações
+`--requests-per-user` vezes; `--concurrency` usuários rodam em paralelo. O
+resultado (p50/p95/p99, vazão e taxa de erro por operação) é gravado em JSON,
+para comparar execuções antes e depois de uma mudança:
+
+    python -m benchmarks.fake_ollama --latency 0.5 --tokens-per-second 40 &
+    OLLAMA_BASE_URL=http://localhost:11500 uvicorn app.main:app &
+    python -m benchmarks.load_test --concurrency 50 --output depois.json
+    python -m benchmarks.load_test --compare antes.json depois.json
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.stats import summarize
+
+OPERATIONS = ("create_user", "login", "recommendations")
+
+
+class _Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, operation: str, request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await request
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.errors[operation] += 1
+            raise
+        self.latencies[operation].append(time.perf_counter() - started)
+        return response
+
+
+async def _virtual_user(client: httpx.AsyncClient, recorder: _Recorder, run_id: str, index: int, args) -> None:
+    username = f"load-{run_id}-{index}"
+    password = "senha-de-carga"
+    try:
+        await recorder.call("create_user", client.post(
+            "/api/v1/users/", json={"username": username, "email": f"{username}@example.com", "password": password}
+        ))
+        token = (await recorder.call("login", client.post(
+            "/api/v1/token", data={"username": username, "password": password}
+        ))).json()["access_token"]
+    except httpx.HTTPError:
+        return
+
+    headers = {"Authorization": f"Bearer {token}"}
+    if args.mode == "stream":
+        path, params = "/api/v1/recommendations/stream", {}
+    else:
+        path, params = "/api/v1/recommendations/", {"mode": args.mode}
+    for _ in range(args.requests_per_user):
+        try:
+            await recorder.call("recommendations", client.get(path, params=params, headers=headers))
+        except httpx.HTTPError:
+            continue
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+async def run(args) -> dict:
+    recorder = _Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(_virtual_user(client, recorder, run_id, i, args) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {op: summarize(recorder.latencies[op], recorder.errors[op], elapsed) for op in OPERATIONS}
+    results["total"] = summarize(
+        [value for op in OPERATIONS for value in recorder.latencies[op]], sum(recorder.errors.values()), elapsed
+    )
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "elapsed_s": elapsed,
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+
+
+def compare(before_path: str, after_path: str) -> dict:
+    """Variação relativa de cada métrica entre duas execuções (positivo = aumentou)."""
+    with open(before_path) as f:
+        before = json.load(f)["results"]
+    with open(after_path) as f:
+        after = json.load(f)["results"]
+    report = {}
+    for operation, metrics in after.items():
+        previous = before.get(operation, {})
+        report[operation] = {
+            key: {"before": previous[key], "after": value,
+                  "change": (value - previous[key]) / previous[key] if previous[key] else None}
+            for key, value in metrics.items() if key in previous
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--mode", choices=("llm", "fast", "stream"), default="llm")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"), help="Compara dois resultados salvos")
+    args = parser.parse_args()
+
+    report = compare(*args.compare) if args.compare else asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
@@ -0,0 +1,73 @@
+"""
+Mede a vazão de logins e o bloqueio do event loop durante uma rajada de logins.
+
+Compara a verificação de senha executada diretamente no event loop (o padrão
+anterior) com a verificação no pool de hashing (`verify_and_update_password`).
+Enquanto os logins rodam, uma tarefa mede o atraso do event loop, que é o tempo
+em que todas as outras requisições ficariam paradas:
+
+    python -m benchmarks.login_throughput --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.core.config import settings
+from app.core.security import pwd_context, shutdown_hash_executor, verify_and_update_password
+
+
+async def _verify_inline(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+async def _loop_lag_monitor(interval: float, lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def _bench(mode: str, hashed: str, logins: int, concurrency: int) -> dict:
+    verify = _verify_inline if mode == "inline" else verify_and_update_password
+    pending = iter(range(logins))
+    lags: list = []
+    stop = asyncio.Event()
+
+    async def worker():
+        for _ in pending:
+            valid, _ = await verify("segredo", hashed)
+            assert valid
+
+    monitor = asyncio.create_task(_loop_lag_monitor(0.005, lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    return {
+        "mode": mode,
+        "rounds": settings.PASSWORD_HASH_ROUNDS,
+        "workers": settings.PASSWORD_HASH_MAX_CONCURRENCY if mode == "pool" else 1,
+        "logins": logins,
+        "logins_per_second": logins / elapsed,
+        "max_event_loop_lag_s": max(lags, default=0.0),
+    }
+
+
+async def main(logins: int, concurrency: int):
+    hashed = pwd_context.hash("segredo")
+    try:
+        results = [await _bench(mode, hashed, logins, concurrency) for mode in ("inline", "pool")]
+    finally:
+        shutdown_hash_executor()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
@@ -0,0 +1,65 @@
+"""
+Compara o parser antigo (regex DOTALL com lookahead sobre o texto inteiro) com o
+parser de linhas de `app.agents.output_parser` em entradas normais e adversariais:
+
+    python -m benchmarks.parser_throughput --repeat 5 --size 2000
+
+`--size` controla o tamanho das entradas adversariais (número de trechos repetidos).
+"""
+import argparse
+import json
+import re
+import time
+
+from app.agents.output_parser import parse_recommendations
+
+LEGACY_PATTERN = r"Product ID:\s*(\d+)\s*,\s*Name:\s*(.+?)\s*,\s*Reason:\s*(.+?)\s*(?=\nProduct ID:|\Z|$)"
+
+
+def _legacy_parse(text: str) -> int:
+    # Recompilado a cada chamada, como no `_parse_crew_result` original.
+    pattern = re.compile(LEGACY_PATTERN, re.DOTALL | re.IGNORECASE)
+    return sum(1 for _ in pattern.finditer(text))
+
+
+def _inputs(size: int) -> dict:
+    well_formed = "\n".join(f"Product ID: {i}, Name: Produto {i}, Reason: Motivo {i}" for i in range(3))
+    return {
+        "well_formed": well_formed,
+        "chatty": "Claro! " + "Pensando nas preferências do usuário, " * size + "\n" + well_formed,
+        "name_without_reason": "Product ID: 1, Name: " + "item, " * size,
+        "many_headers_without_reason": "Product ID: 1, Name: x\n" * size,
+        "name_whitespace_run": "Product ID: 1, Name: a" + " " * (size * 20) + "x",
+        "markdown_list": "\n".join(
+            f"{i}. **Product ID:** {i}, **Name:** Produto {i}, **Reason:** Motivo" for i in range(size)
+        ),
+    }
+
+
+def _time(func, text: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = func(text)
+        timings.append(time.perf_counter() - started)
+    return {"best_s": min(timings), "found": found}
+
+
+def main(repeat: int, size: int):
+    results = []
+    for name, text in _inputs(size).items():
+        results.append({
+            "input": name,
+            "chars": len(text),
+            "legacy": _time(_legacy_parse, text, repeat),
+            "line_parser": _time(lambda t: len(parse_recommendations(t)), text, repeat),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.repeat, args.size)
@@ -0,0 +1,85 @@
+"""
+Mede o tamanho do prompt e a latência de geração para um usuário com histórico longo,
+antes (histórico completo, prompt "full") e depois (histórico limitado pelo orçamento,
+prompts "full" e "compact").
+
+Sem `--generate`, apenas estima os tokens localmente. Com `--generate`, chama o Ollama
+configurado em OLLAMA_BASE_URL (ou o servidor de `benchmarks.fake_ollama`) com o motor
+"direct" e reporta `prompt_eval_count` e a latência real:
+
+    python -m benchmarks.prompt_budget --history 300 --generate --runs 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from types import SimpleNamespace
+
+from app.agents.history import estimate_tokens, format_user_products_info
+from app.agents.recommendation_agent import PROMPTS, RecommendationAgent, _prompt_variables
+from app.models import User as UserModel
+from benchmarks.stats import percentile
+
+KINDS = ["Camiseta", "Calça", "Livro", "Tênis", "Fone", "Caneca", "Mochila", "Luminária", "Caderno", "Garrafa"]
+ADJECTIVES = ["Básica", "Premium", "Esportiva", "de Algodão", "Compacta", "Sem Fio", "Clássica", "Infantil"]
+
+
+def _history(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        SimpleNamespace(id=i + 1, name=f"{rng.choice(KINDS)} {rng.choice(ADJECTIVES)} {rng.randint(1, 500)}")
+        for i in range(size)
+    ]
+
+
+SCENARIOS = {
+    "before": dict(variant="full", max_items=0, token_budget=0),
+    "after_full": dict(variant="full", max_items=None, token_budget=None),
+    "after_compact": dict(variant="compact", max_items=None, token_budget=None),
+}
+
+
+async def main(history_size: int, generate: bool, runs: int):
+    user = UserModel(id=1, username="benchmark", email="benchmark@example.com")
+    products = _history(history_size)
+    agent = RecommendationAgent(cache=None) if generate else None
+    results = []
+
+    for name, scenario in SCENARIOS.items():
+        info = format_user_products_info(products, scenario["max_items"], scenario["token_budget"])
+        messages = PROMPTS[scenario["variant"], False].format_messages(**_prompt_variables(user, info))
+        result = {
+            "scenario": name,
+            "prompt_variant": scenario["variant"],
+            "history_chars": len(info),
+            "estimated_prompt_tokens": sum(estimate_tokens(m.content) for m in messages),
+        }
+        if agent is not None:
+            agent.prompt_variant = scenario["variant"]
+            before = dict(agent.token_usage["direct"])
+            latencies = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                await agent._run_direct(user, info)
+                latencies.append(time.perf_counter() - started)
+            after = agent.token_usage["direct"]
+            result.update({
+                "prompt_eval_count_mean": (after["prompt_tokens"] - before["prompt_tokens"]) / runs,
+                "latency_p50_s": percentile(latencies, 50),
+                "latency_max_s": max(latencies),
+            })
+        results.append(result)
+
+    if agent is not None:
+        await agent.stop()
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=300, help="Tamanho do histórico do usuário")
+    parser.add_argument("--generate", action="store_true", help="Chama o LLM e mede tokens e latência reais")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.history, args.generate, args.runs))
@@ -0,0 +1,183 @@
+"""
+Mede o custo de subir a API: o tempo de import de `app.main` (`python -X importtime`)
+e o tempo até a primeira requisição respondida por um worker uvicorn novo.
+
+    python -m benchmarks.startup --runs 3 --output startup.json
+
+O worker usa um banco SQLite temporário, semeado com `--products` produtos (e um usuário
+para cada cinco produtos), e não aquece o modelo, então o tempo medido é o de import +
+lifespan da aplicação sobre um catálogo realista. Também é medido o tempo até o índice de
+produtos e o recomendador rápido, construídos em segundo plano, ficarem prontos.
+`--top` lista os módulos de maior custo acumulado no import.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.stats import percentile
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)$")
+
+CATEGORIES = ["Tênis de Corrida", "Livro de Ficção", "Fone de Ouvido", "Cafeteira", "Camiseta", "Mochila"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _environment(database_path: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "OLLAMA_WARMUP_ON_STARTUP": "false",
+        "OLLAMA_KEEP_WARM_INTERVAL_SECONDS": "0",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def seed_catalog(database_path: str, products: int) -> None:
+    """Cria o esquema e grava `products` produtos com donos, pelo caminho de ingestão em massa."""
+    from sqlalchemy import create_engine
+
+    from app.database import Base
+    from app.ingestion import ingest_products, ingest_users
+
+    engine = create_engine(f"sqlite:///{database_path}")
+    try:
+        Base.metadata.create_all(engine)
+        users = max(1, products // 5)
+        ingest_users(engine, (
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"} for i in range(users)
+        ))
+        ingest_products(engine, (
+            {"name": f"{CATEGORIES[i % len(CATEGORIES)]} modelo {i}", "description": f"Descrição do produto {i}", "user_id": 1 + i % users}
+            for i in range(products)
+        ))
+    finally:
+        engine.dispose()
+
+
+def measure_imports(module: str, env: dict, top: int) -> dict:
+    """Roda `python -X importtime -c "import <module>"` e resume a saída."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - started
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append((match.group(2), int(match.group(1)) / 1e6))
+    total = next((seconds for name, seconds in modules if name == module), 0.0)
+    # Custo acumulado de cada pacote de primeiro nível (o maior entre os seus módulos).
+    packages = {}
+    for name, seconds in modules:
+        root = name.split(".", 1)[0]
+        if root != module.split(".", 1)[0]:
+            packages[root] = max(packages.get(root, 0.0), seconds)
+    return {
+        "wall_s": wall,
+        "import_s": total,
+        "heavy_packages_loaded": sorted(p for p in ("crewai", "litellm", "chromadb", "langchain_community") if p in packages),
+        "top_packages": sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+    }
+
+
+def _catalog_ready(response: httpx.Response) -> bool:
+    stats = response.json()
+    return stats["retrieval"]["ready"] and stats["fast_recommender"]["ready"]
+
+
+def measure_first_request(env: dict, path: str, timeout: float) -> dict:
+    """
+    Segundos entre iniciar um worker uvicorn e a primeira resposta 200 em `path`, e até o
+    índice de produtos e o recomendador rápido ficarem prontos (`/health/catalog`).
+    """
+    port = _free_port()
+    # Um só cliente, criado antes de medir: criar um por tentativa disputa a CPU com o worker.
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5.0)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {}
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn terminou com código {process.returncode}")
+            try:
+                if "first_request_s" not in result and client.get(path).status_code == 200:
+                    result["first_request_s"] = time.perf_counter() - started
+                if "first_request_s" in result and _catalog_ready(client.get("/health/catalog")):
+                    result["catalog_ready_s"] = time.perf_counter() - started
+                    return result
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+        raise TimeoutError(f"sem resposta em {timeout}s")
+    finally:
+        client.close()
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(module: str, runs: int, path: str, top: int, timeout: float, products: int, output: str = None):
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "startup.db")
+        seed_catalog(database_path, products)
+        env = _environment(database_path)
+        imports = [measure_imports(module, env, top) for _ in range(runs)]
+        workers = [measure_first_request(env, path, timeout) for _ in range(runs)]
+
+    import_times = [r["import_s"] for r in imports]
+    first_requests = [w["first_request_s"] for w in workers]
+    catalog_ready = [w["catalog_ready_s"] for w in workers]
+    result = {
+        "meta": {"module": module, "runs": runs, "path": path, "products": products, "python": sys.version.split()[0]},
+        "import": {
+            "p50_s": percentile(import_times, 50),
+            "max_s": max(import_times),
+            "heavy_packages_loaded": imports[-1]["heavy_packages_loaded"],
+            "top_packages": imports[-1]["top_packages"],
+        },
+        "time_to_first_request": {
+            "p50_s": percentile(first_requests, 50),
+            "max_s": max(first_requests),
+        },
+        "time_to_catalog_ready": {
+            "p50_s": percentile(catalog_ready, 50),
+            "max_s": max(catalog_ready),
+        },
+    }
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--path", default="/health/live", help="Rota usada como primeira requisição")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--products", type=int, default=50000, help="Produtos gravados no banco antes de subir o worker")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    main(args.module, args.runs, args.path, args.top, args.timeout, args.products, args.output)
@@ -0,0 +1,26 @@
+"""Estatísticas compartilhadas pelos benchmarks."""
+import statistics
+from typing import Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    """Resumo de uma operação: vazão, taxa de erro e percentis de latência (apenas das bem-sucedidas)."""
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "throughput_rps": total / elapsed if elapsed > 0 else 0.0,
+        "latency_mean_s": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+    }
@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import create_tables, engine
+from app.ingestion import DEFAULT_CHUNK_SIZE, Checkpoint, ingest_products, ingest_users, read_records
+
+INGESTERS = {"users": ingest_users, "products": ingest_products}
+
+
+def _print_progress(stats):
+    print(
+        f"{stats.read} registros ({stats.inserted} inseridos, {stats.updated} atualizados, "
+        f"{stats.skipped} ignorados, {stats.rejected} rejeitados) - {stats.rows_per_second:.0f} registros/s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Importa usuários ou produtos em massa de um arquivo CSV ou JSONL, em blocos e com checkpoint."
+    )
+    parser.add_argument("kind", choices=sorted(INGESTERS), help="O que importar")
+    parser.add_argument("path", help="Arquivo .csv (com cabeçalho) ou .jsonl")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Formato do arquivo (padrão: pela extensão)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--upsert", action="store_true", help="Atualiza os registros existentes em vez de ignorá-los")
+    parser.add_argument("--checkpoint", help="Arquivo de checkpoint para retomar uma importação interrompida")
+    parser.add_argument("--no-copy", action="store_true", help="Não usa COPY no PostgreSQL (apenas INSERT em lote)")
+    args = parser.parse_args()
+
+    create_tables()
+    stats = INGESTERS[args.kind](
+        engine,
+        read_records(args.path, args.format),
+        chunk_size=args.chunk_size,
+        upsert=args.upsert,
+        checkpoint=Checkpoint(args.checkpoint, args.path, args.kind) if args.checkpoint else None,
+        use_copy=not args.no_copy,
+        progress=_print_progress,
+    )
+    print(json.dumps(stats.to_dict(), indent=2, ensure_ascii=False))
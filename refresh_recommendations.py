@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.agents.batch import offline_agent
+from app.agents.precompute import refresh_stale_recommendations
+from app.core.config import settings
+
+
+async def run(loop: bool, interval: float, concurrency: int):
+    async with offline_agent() as agent:
+        while True:
+            started = time.perf_counter()
+            stats = await refresh_stale_recommendations(agent, concurrency=concurrency)
+            print(
+                f"Atualização concluída em {time.perf_counter() - started:.1f}s: "
+                f"{stats['stale']} desatualizados, {stats['refreshed']} atualizados, {stats['skipped']} ignorados (fallback)."
+            )
+            if not loop:
+                return
+            await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Regera as recomendações gravadas dos usuários cujo histórico mudou desde a última geração."
+    )
+    parser.add_argument("--loop", action="store_true", help="Executa continuamente, como worker")
+    parser.add_argument("--interval", type=float, default=300.0, help="Intervalo entre execuções no modo --loop (segundos)")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(run(args.loop, args.interval, args.concurrency))